@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Query, Request, status, Path,Depends,Body
-from typing import List,Annotated
+from typing import List,Annotated,Optional
 from core.routing_config import maps
 from core.admin_logger import log_what_admin_does
 from core.payments import PaymentService, get_payment_service
@@ -9,7 +9,9 @@ from schemas.driver_document import DocumentStatus, DriverDocumentUpdateStatus,
 from schemas.background_check import BackgroundStatus
 from schemas.background_provider import BackgroundProviderPayload
 from schemas.place import Location
-from schemas.response_schema import APIResponse
+from schemas.response_schema import APIResponse, PaginatedAPIResponse
+from core.pagination import next_cursor
+from schemas.driver_trail import DriverTrailOut
 from schemas.ride import RideBase, RideCreate, RideOut, RideUpdate
 from schemas.rider_schema import RiderOut, RiderUpdateAccountStatus
 from schemas.tokens_schema import accessTokenOut
@@ -48,7 +50,8 @@ from services.driver_document_service import set_driver_document_status, list_pe
 from services.background_check_service import record_background_result, list_background_checks, auto_link_documents_to_background
 from services.audit_log_service import record_audit_event
 from services.place_service import calculate_fare_using_vehicle_config_and_distance, get_place_details
-from services.ride_service import add_ride, add_ride_admin_func, retrieve_ride_by_ride_id, retrieve_rides_by_driver_id, retrieve_rides_by_user_id,update_ride_by_id_admin_func
+from services.trail_service import retrieve_ride_trail
+from services.ride_service import RIDE_HISTORY_PAGE_SIZE, add_ride, add_ride_admin_func, retrieve_ride_by_ride_id, retrieve_rides_by_driver_id, retrieve_rides_by_user_id,update_ride_by_id_admin_func
 from services.rider_service import (
     ban_riders,
     update_rider_by_id,
@@ -276,10 +279,10 @@ async def search_users_for_admin_autocomplete(
 # --------------- DRIVER MANAGEMENT -----------------
 # ---------------------------------------------------
 
-@router.get("/drivers/",response_model_exclude={"data": {"__all__": {"password"}}} ,response_model_exclude_none=True, response_model=APIResponse[List[DriverOut]] ,      dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)])
-async def list_of_drivers(start:int= 0, stop:int=100,token:accessTokenOut = Depends(verify_admin_token)):
-    items = await retrieve_drivers(start=start,stop=stop)
-    return APIResponse(status_code=200, data=items, detail="Fetched successfully")
+@router.get("/drivers/",response_model_exclude={"data": {"__all__": {"password"}}} ,response_model_exclude_none=True, response_model=PaginatedAPIResponse[List[DriverOut]] ,      dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)])
+async def list_of_drivers(start:int= 0, stop:int=100,cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),token:accessTokenOut = Depends(verify_admin_token)):
+    items = await retrieve_drivers(start=start,stop=stop,cursor=cursor)
+    return PaginatedAPIResponse(status_code=200, data=items, detail="Fetched successfully", next_cursor=next_cursor(items, stop - start))
 
 @router.get("/driver/{driverId}", response_model_exclude={"data": {"password"}} , response_model=APIResponse[DriverOut] ,  dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does)],response_model_exclude_none=True)
 async def get_a_particular_driver_details(driverId:str,token:accessTokenOut = Depends(verify_admin_token)):
@@ -563,22 +566,32 @@ async def create_a_ride_for_user(
 
 
 
-@router.get("/ride/{riderId}",dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)],response_model_exclude_none=True, response_model_exclude={"data": {"password"}},response_model=APIResponse[List[RideOut]])
+@router.get("/ride/{riderId}",dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)],response_model_exclude_none=True, response_model_exclude={"data": {"password"}},response_model=PaginatedAPIResponse[List[RideOut]])
 async def get_rides_for_a_particular_rider(
-    riderId:str 
+    riderId:str,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
  
-    rides = await retrieve_rides_by_user_id(user_id=riderId)
-    return APIResponse(data = rides, status_code=200, detail = f"Successfully retrieved Ride history for rider")
+    rides = await retrieve_rides_by_user_id(user_id=riderId, cursor=cursor, fields="admin")
+    return PaginatedAPIResponse(data = rides, status_code=200, detail = f"Successfully retrieved Ride history for rider", next_cursor=next_cursor(rides, RIDE_HISTORY_PAGE_SIZE))
 
 
-@router.get("/ride/{driverId}",dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)],response_model_exclude_none=True, response_model_exclude={"data": {"password"}},response_model=APIResponse[List[RideOut]])
+@router.get("/ride/{driverId}",dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)],response_model_exclude_none=True, response_model_exclude={"data": {"password"}},response_model=PaginatedAPIResponse[List[RideOut]])
 async def get_rides_for_a_particular_driver(
-    driverId:str 
+    driverId:str,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
  
-    rides = await retrieve_rides_by_driver_id(driver_id=driverId)
-    return APIResponse(status_code=200,data= rides, detail="Successfully Retrieved Ride history for driver")
+    rides = await retrieve_rides_by_driver_id(driver_id=driverId, cursor=cursor, fields="admin")
+    return PaginatedAPIResponse(status_code=200,data= rides, detail="Successfully Retrieved Ride history for driver", next_cursor=next_cursor(rides, RIDE_HISTORY_PAGE_SIZE))
+
+
+@router.get("/ride/{rideId}/trail",dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)],response_model_exclude_none=True,response_model=APIResponse[DriverTrailOut])
+async def get_location_trail_for_a_particular_ride(
+    rideId:str
+):
+    trail = await retrieve_ride_trail(ride_id=rideId)
+    return APIResponse(status_code=200,data=trail,detail="Successfully retrieved ride trail")
 
 
 @router.patch("/ride/{rideId}",dependencies=[Depends(verify_admin_token),Depends(log_what_admin_does),Depends(check_admin_account_status_and_permissions)],response_model_exclude_none=True, response_model_exclude={"data": {"password"}},response_model=APIResponse[RideOut])
@@ -5,9 +5,10 @@ from fastapi import APIRouter, Body, HTTPException, Query, Request, status, Path
 from typing import List, Optional
 from fastapi.responses import RedirectResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from schemas.imports import PayoutOptions, ResetPasswordConclusion, ResetPasswordInitiation, ResetPasswordInitiationResponse, RideStatus
+from schemas.imports import PayoutOptions, ResetPasswordConclusion, ResetPasswordInitiation, ResetPasswordInitiationResponse
 from schemas.rating import RatingBase, RatingCreate
-from schemas.response_schema import APIResponse
+from schemas.response_schema import APIResponse, PaginatedAPIResponse
+from core.pagination import next_cursor
 from core.staff_payment import get_staff_payment_service
 from schemas.tokens_schema import accessTokenOut
 from schemas.storage_upload import CloudflareUploadResponse
@@ -19,6 +20,8 @@ from schemas.payout import (
     PayoutBalanceOut,
     PayoutRequestIn,
 )
+from bson import ObjectId
+from repositories.ride import get_ride
 from repositories.tokens_repo import delete_access_token, delete_refresh_tokens_by_previous_access_token, get_access_tokens
 from services.payout_service import (
     add_payout,
@@ -35,11 +38,11 @@ from schemas.driver import (
     DriverUpdate,
     DriverRefresh,
     DriverUpdatePassword,
+    DriverLocationBatch,
     DriverLocationUpdate,
     DriverUpdateProfile,
     DriverVehicleUpdate,
 )
-from schemas.ride import RideUpdate
 from schemas.driver_document import DriverDocumentCreate, DriverDocumentOut, DocumentType, DocumentStatus
 from security.account_status_checks import check_driver_account_status
 from services.driver_service import (
@@ -53,6 +56,7 @@ from services.driver_service import (
     update_driver,
     update_driver_by_id,
     update_driver_location,
+    update_driver_location_batch,
     update_driver_vehicle,
     refresh_driver_tokens_reduce_number_of_logins,
     oauth
@@ -71,7 +75,7 @@ from core.antivirus import scan_bytes
 from security.auth import verify_token_to_refresh, verify_token_driver_role
 from security.encrypting_jwt import decode_jwt_token
 from services.rating_service import add_rating, retrieve_rating_by_user_id
-from services.ride_service import retrieve_rides_by_driver_id, retrieve_ride_by_ride_id, update_ride_by_id
+from services.ride_service import RIDE_HISTORY_PAGE_SIZE, accept_ride_for_driver, retrieve_rides_by_driver_id, retrieve_ride_by_ride_id
 
 
 router = APIRouter(prefix="/drivers", tags=["Drivers"])
@@ -144,10 +148,10 @@ async def auth_callback(request: Request):
 
 
 
-@router.get("/" ,response_model_exclude={"data": {"__all__": {"password"}}}, response_model=APIResponse[List[DriverOut]],response_model_exclude_none=True,dependencies=[Depends(verify_token_driver_role),Depends(check_driver_account_status)])
-async def list_drivers(start:int= 0, stop:int=100):
-    items = await retrieve_drivers(start=start,stop=stop)
-    return APIResponse(status_code=200, data=items, detail="Fetched successfully")
+@router.get("/" ,response_model_exclude={"data": {"__all__": {"password"}}}, response_model=PaginatedAPIResponse[List[DriverOut]],response_model_exclude_none=True,dependencies=[Depends(verify_token_driver_role),Depends(check_driver_account_status)])
+async def list_drivers(start:int= 0, stop:int=100, cursor: Optional[str] = Query(None, description="next_cursor from the previous page")):
+    items = await retrieve_drivers(start=start,stop=stop,cursor=cursor)
+    return PaginatedAPIResponse(status_code=200, data=items, detail="Fetched successfully", next_cursor=next_cursor(items, stop - start))
 
 
 @router.get("/me", response_model_exclude={"data": {"password"}},response_model=APIResponse[DriverOut],dependencies=[Depends(verify_token_driver_role)],response_model_exclude_none=True)
@@ -193,7 +197,9 @@ async def update_driver_profile(driver_details:DriverUpdateProfile,token:accessT
      
 
 
-@router.post("/location", response_model=APIResponse[bool], dependencies=[Depends(verify_token_driver_role),Depends(check_driver_account_status)])
+# Account status is checked by update_driver_location from the presence cache,
+# so frequent pings do not load the driver document.
+@router.post("/location", response_model=APIResponse[bool], dependencies=[Depends(verify_token_driver_role)])
 async def update_driver_current_location(
     payload: DriverLocationUpdate,
     token: accessTokenOut = Depends(verify_token_driver_role),
@@ -202,6 +208,15 @@ async def update_driver_current_location(
     return APIResponse(status_code=200, data=True, detail="Location updated")
 
 
+@router.post("/location/batch", response_model=APIResponse[bool], dependencies=[Depends(verify_token_driver_role)])
+async def update_driver_location_from_buffered_fixes(
+    payload: DriverLocationBatch,
+    token: accessTokenOut = Depends(verify_token_driver_role),
+):
+    await update_driver_location_batch(driver_id=token.userId, batch=payload)
+    return APIResponse(status_code=200, data=True, detail="Location updated")
+
+
 @router.put("/vehicle", response_model=APIResponse[DriverOut], dependencies=[Depends(verify_token_driver_role),Depends(check_driver_account_status)])
 async def update_driver_vehicle_details(
     payload: DriverVehicleUpdate,
@@ -449,17 +464,8 @@ async def accept_ride(
     ride_id: str,
     token: accessTokenOut = Depends(verify_token_driver_role), 
 ):
-    # Update ride to assign driver and change status to arrivingToPickup
-    ride_update = RideUpdate(
-        driverId=token.userId,
-        rideStatus=RideStatus.arrivingToPickup
-    )
-    
-    updated_ride = await update_ride_by_id(
-        ride_id=ride_id,
-        ride_data=ride_update,
-        driver_id=token.userId
-    )
+    # Assign driver and change status to arrivingToPickup in one atomic claim
+    updated_ride = await accept_ride_for_driver(ride_id=ride_id, driver_id=token.userId)
     
     return APIResponse(
         status_code=200,
@@ -473,7 +479,7 @@ async def retrieve_ride_details(
     ride_id: str,
     token: accessTokenOut = Depends(verify_token_driver_role), 
 ):
-    ride = await retrieve_ride_by_ride_id(id=ride_id)
+    ride = await retrieve_ride_by_ride_id(id=ride_id, fields="detail")
     
     if not ride:
         raise HTTPException(
@@ -489,9 +495,9 @@ async def retrieve_ride_details(
 
 
 @router.get("/ride/history",response_model_exclude_none=True,dependencies=[Depends(verify_token_driver_role),Depends(check_driver_account_status)])
-async def ride_history(token:accessTokenOut = Depends(verify_token_driver_role)):
-    rides = await retrieve_rides_by_driver_id(driver_id=token.userId)
-    return APIResponse(status_code=200,data= rides, detail="Successfully Retrieved Ride history for driver")
+async def ride_history(cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),token:accessTokenOut = Depends(verify_token_driver_role)):
+    rides = await retrieve_rides_by_driver_id(driver_id=token.userId, cursor=cursor)
+    return PaginatedAPIResponse(status_code=200,data= rides, detail="Successfully Retrieved Ride history for driver", next_cursor=next_cursor(rides, RIDE_HISTORY_PAGE_SIZE))
 
  
  
@@ -585,11 +591,12 @@ async def get_driver_payment_status(token: accessTokenOut = Depends(verify_token
 # List Payouts (with pagination)
 # ------------------------------
 
-@router.get("/payouts", response_model=APIResponse[List[PayoutOut]])
+@router.get("/payouts", response_model=PaginatedAPIResponse[List[PayoutOut]])
 async def list_previous_payouts(
     start: Optional[int] = Query(None, description="Start index for range-based pagination"),
     stop: Optional[int] = Query(None, description="Stop index for range-based pagination"),
     page_number: Optional[int] = Query(None, description="Page number for page-based pagination (0-indexed)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page for cursor-based pagination"),
     token: accessTokenOut = Depends(verify_token_driver_role)
 ):
     """
@@ -598,10 +605,19 @@ async def list_previous_payouts(
     Supports multiple pagination methods:
     - Range-based: ?start=0&stop=10
     - Page-based: ?page_number=0 (uses PAGE_SIZE=10)
+    - Cursor-based: ?cursor=<next_cursor> (uses PAGE_SIZE=10); deep pages
+      cost the same as the first one
     - Default: First 100 records
+
+    Every response carries next_cursor for fetching the following page.
     """
     PAGE_SIZE = 10
 
+    # Case 0: Cursor-based pagination
+    if cursor is not None:
+        items = await retrieve_payouts(driverId=token.userId, start=0, stop=PAGE_SIZE, cursor=cursor)
+        return PaginatedAPIResponse(status_code=200, data=items, detail="Fetched page successfully", next_cursor=next_cursor(items, PAGE_SIZE))
+
     # Case 1: Range-based pagination
     if start is not None and stop is not None:
         if start < 0 or stop <= start:
@@ -612,7 +628,7 @@ async def list_previous_payouts(
 
         # Pass filters to the service layer
         items = await retrieve_payouts(driverId=token.userId, start=start, stop=stop)
-        return APIResponse(status_code=200, data=items, detail=f"Fetched records {start} to {stop} successfully")
+        return PaginatedAPIResponse(status_code=200, data=items, detail=f"Fetched records {start} to {stop} successfully", next_cursor=next_cursor(items, stop - start))
 
     # Case 2: Page-based pagination
     elif page_number is not None:
@@ -623,7 +639,7 @@ async def list_previous_payouts(
         stop_index = start_index + PAGE_SIZE
         # Pass filters to the service layer
         items = await retrieve_payouts(driverId=token.userId, start=start_index, stop=stop_index)
-        return APIResponse(status_code=200, data=items, detail=f"Fetched page {page_number} successfully")
+        return PaginatedAPIResponse(status_code=200, data=items, detail=f"Fetched page {page_number} successfully", next_cursor=next_cursor(items, PAGE_SIZE))
 
     # Case 3: Default (no params)
     else:
@@ -631,7 +647,7 @@ async def list_previous_payouts(
         items = await retrieve_payouts(driverId=token.userId, start=0, stop=100)
         detail_msg = "Fetched first 100 records successfully"
 
-        return APIResponse(status_code=200, data=items, detail=detail_msg)
+        return PaginatedAPIResponse(status_code=200, data=items, detail=detail_msg, next_cursor=next_cursor(items, 100))
 
 
 # ------------------------------
@@ -763,8 +779,9 @@ async def record_ride_earnings(
     but can also be used for manual earnings recording.
     """
     # Verify the ride belongs to this driver
-    rides = await retrieve_rides_by_driver_id(driver_id=token.userId)
-    ride_found = next((r for r in rides if r.id == ride_id), None)
+    if not ObjectId.is_valid(ride_id):
+        raise HTTPException(status_code=400, detail="Invalid ride ID format")
+    ride_found = await get_ride({"_id": ObjectId(ride_id), "driverId": token.userId}, fields="summary")
 
     if not ride_found:
         raise HTTPException(status_code=404, detail="Ride not found or doesn't belong to this driver")
@@ -1,7 +1,7 @@
 import os
 from urllib.parse import urlencode
 from fastapi import APIRouter, HTTPException, Query, Request, status, Path,Depends
-from typing import List, Literal, Union
+from typing import List, Literal, Optional, Union
 from fastapi.responses import RedirectResponse
 from core.countries import ALLOWED_COUNTRIES
 from core.payments import PaymentService, get_payment_service
@@ -11,8 +11,9 @@ from schemas.address import AddressBase, AddressCreate, AddressOut, AddressUpdat
 from schemas.imports import ResetPasswordConclusion, ResetPasswordInitiation, ResetPasswordInitiationResponse, RideStatus
 from schemas.place import FareBetweenPlacesCalculationRequest, FareBetweenPlacesCalculationResponse, Location, PlaceBase
 from schemas.rating import RatingBase, RatingCreate
-from schemas.response_schema import APIResponse
-from schemas.ride import RideBase, RideCreate, RideOut, RideShareLinkOut, RideUpdate
+from schemas.response_schema import APIResponse, PaginatedAPIResponse
+from core.pagination import next_cursor
+from schemas.ride import RideBase, RideCreate, RideOut, RideShareLinkOut, RideSummaryOut, RideUpdate
 from schemas.tokens_schema import accessTokenOut
 from core.routing_config import maps
 from schemas.rider_schema import (
@@ -29,7 +30,7 @@ from security.account_status_checks import check_rider_account_status
 from services.address_service import add_address, remove_address, retrieve_address_by_user_id, update_address_by_id
 from services.place_service import calculate_fare_using_vehicle_config_and_distance, get_autocomplete, get_place_details, nearby_drivers
 from services.rating_service import add_rating, retrieve_rating_by_user_id
-from services.ride_service import add_ride, generate_public_ride_sharing_link_for_rider, retrieve_rides_by_user_id, retrieve_rides_by_user_id_and_ride_id, retrieve_shared_ride_by_share_id, update_ride_by_id
+from services.ride_service import RIDE_HISTORY_PAGE_SIZE, add_ride, generate_public_ride_sharing_link_for_rider, retrieve_rides_by_user_id, retrieve_rides_by_user_id_and_ride_id, retrieve_shared_ride_by_share_id, update_ride_by_id
 from services.rider_service import (
     add_rider,
     remove_rider,
@@ -308,10 +309,10 @@ async def calculate_fare_price(data:FareBetweenPlacesCalculationRequest):
 # ------- RIDE MANAGEMENT ------- 
 # -------------------------------
 
-@router.get("/ride/history" ,response_model_exclude_none=True,dependencies=[Depends(verify_token_rider_role)],response_model=APIResponse[List[RideOut]])
-async def ride_history(token:accessTokenOut = Depends(verify_token_rider_role)):
-    rides = await retrieve_rides_by_user_id(user_id=token.userId)
-    return APIResponse(data = rides, status_code=200, detail = "Successfully retrieved Ride history")
+@router.get("/ride/history" ,response_model_exclude_none=True,dependencies=[Depends(verify_token_rider_role)],response_model=PaginatedAPIResponse[List[RideSummaryOut]])
+async def ride_history(cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),token:accessTokenOut = Depends(verify_token_rider_role)):
+    rides = await retrieve_rides_by_user_id(user_id=token.userId, cursor=cursor)
+    return PaginatedAPIResponse(data = rides, status_code=200, detail = "Successfully retrieved Ride history", next_cursor=next_cursor(rides, RIDE_HISTORY_PAGE_SIZE))
 
  
 @router.post("/ride/request",  response_model_exclude_none=True,dependencies=[Depends(verify_token_rider_role)],response_model=APIResponse[RideOut])
@@ -369,7 +370,7 @@ async def cancel_a_requested_ride_before_ride_has_begun(rideId:str,token:accessT
 @router.get("/ride/{rideId}",  response_model_exclude_none=True,dependencies=[Depends(verify_token_rider_role),Depends(check_rider_account_status)],response_model=APIResponse[RideOut])
 async def view_ride_details(rideId:str,token:accessTokenOut = Depends(verify_token_rider_role)):
     
-    ride=await retrieve_rides_by_user_id_and_ride_id(user_id=token.userId,ride_id=rideId)
+    ride=await retrieve_rides_by_user_id_and_ride_id(user_id=token.userId,ride_id=rideId,fields="detail")
     return APIResponse(data =ride ,status_code=200,detail="Successfully Retrieved ride") 
 
 
@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
 from fastapi.responses import StreamingResponse
 
 from schemas.response_schema import APIResponse
@@ -18,6 +18,7 @@ async def stream_driver_events(
     request: Request,
     ride_id: Optional[str] = Query(default=None),
     event_types: Optional[List[SSEEventType]] = Query(default=None),
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
     token: accessTokenOut = Depends(verify_token_driver_role),
 ):
     allowed_types = [event_type.value for event_type in event_types] if event_types else None
@@ -28,6 +29,7 @@ async def stream_driver_events(
             user_id=token.userId,
             event_types=allowed_types,
             ride_id=ride_id,
+            last_event_id=last_event_id,
         ),
         media_type="text/event-stream",
     )
@@ -38,6 +40,7 @@ async def stream_rider_events(
     request: Request,
     ride_id: Optional[str] = Query(default=None),
     event_types: Optional[List[SSEEventType]] = Query(default=None),
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID"),
     token: accessTokenOut = Depends(verify_token_rider_role),
 ):
     allowed_types = [event_type.value for event_type in event_types] if event_types else None
@@ -48,6 +51,7 @@ async def stream_rider_events(
             user_id=token.userId,
             event_types=allowed_types,
             ride_id=ride_id,
+            last_event_id=last_event_id,
         ),
         media_type="text/event-stream",
     )
@@ -0,0 +1,260 @@
+"""
+SSE load benchmark against an in-process fake Redis.
+
+Opens N simulated subscribers on services.sse_service.stream_events, publishes
+events to them with publish_event and reports:
+
+* publish-to-yield latency percentiles,
+* Redis round-trips and commands per delivered event (a Lua script call
+  counts as one command),
+* Python heap growth per open connection.
+
+fakeredis runs in the same process and on the same event loop, so absolute
+numbers are pessimistic compared to a real Redis; compare runs against each
+other rather than against production.
+
+Usage:
+    python -m benchmarks.sse_benchmark --subscribers 1000 5000 20000
+    python -m benchmarks.sse_benchmark --mode stream --backlog 20
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import fakeredis
+
+import services.sse_service as sse_service
+from core.sse_hub import SSEHub
+
+
+class CountingRedis(fakeredis.aioredis.FakeRedis):
+    """Fake async client that counts round-trips and commands sent."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.round_trips = 0
+        self.commands = 0
+
+    async def execute_command(self, *args, **options):
+        self.round_trips += 1
+        self.commands += 1
+        return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super().pipeline(transaction=transaction, shard_hint=shard_hint)
+        execute = pipe.execute
+
+        async def counted_execute(raise_on_error: bool = True):
+            self.round_trips += 1
+            self.commands += len(pipe.command_stack)
+            return await execute(raise_on_error)
+
+        pipe.execute = counted_execute
+        return pipe
+
+
+class BenchRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+@dataclass
+class BenchResult:
+    mode: str
+    subscribers: int
+    events: int
+    delivered: int
+    connect_seconds: float
+    latency_ms: dict[str, float]
+    round_trips_per_event: float
+    commands_per_event: float
+    kib_per_connection: float
+
+    def row(self) -> str:
+        latency = self.latency_ms
+        return (
+            f"{self.mode:<6} {self.subscribers:>7} {self.delivered:>5}/{self.events:<5} "
+            f"{self.connect_seconds:>8.2f} "
+            f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+            f"{self.round_trips_per_event:>7.2f} {self.commands_per_event:>7.2f} "
+            f"{self.kib_per_connection:>8.1f}"
+        )
+
+
+HEADER = (
+    f"{'mode':<6} {'subs':>7} {'delivered':>11} {'conn(s)':>8} "
+    f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rt/evt':>7} {'cmd/evt':>7} "
+    f"{'KiB/conn':>8}"
+)
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return float("nan")
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[int(fraction * 100) - 1]
+
+
+async def _wait_or_fail(event: asyncio.Event, tasks: list[asyncio.Task], timeout: float) -> None:
+    """Wait for event, re-raising the first subscriber failure instead of timing out."""
+    waiter = asyncio.ensure_future(event.wait())
+    deadline = time.perf_counter() + timeout
+    pending = {waiter, *tasks}
+    try:
+        while not waiter.done():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task is not waiter and task.exception():
+                    raise task.exception()
+    finally:
+        waiter.cancel()
+
+
+def _event_seq(frame: str) -> int | None:
+    for line in frame.splitlines():
+        if line.startswith("data: "):
+            return json.loads(line[len("data: "):])["data"].get("seq")
+    return None
+
+
+async def run_benchmark(
+    subscribers: int,
+    events: int = 200,
+    mode: str = "list",
+    backlog: int = 0,
+    rate: float = 500.0,
+    user_type: str = "rider",
+    timeout: float = 60.0,
+) -> BenchResult:
+    server = fakeredis.FakeServer()
+    # Every subscriber can have a command in flight at once while connecting.
+    client = CountingRedis(server=server, decode_responses=True, max_connections=subscribers * 2 + 10)
+    hub = SSEHub(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), poll_seconds=0.05)
+    saved = (sse_service.async_redis, sse_service.sse_hub, sse_service.SSE_DELIVERY_MODE)
+    sse_service.async_redis = client
+    sse_service.sse_hub = hub
+    sse_service.SSE_DELIVERY_MODE = mode
+
+    published_at: dict[int, float] = {}
+    latencies: list[float] = []
+    connected = 0
+    all_connected = asyncio.Event()
+    all_delivered = asyncio.Event()
+
+    async def subscriber(user_id: str) -> None:
+        nonlocal connected
+        counted = False
+        stream = sse_service.stream_events(BenchRequest(), user_type, user_id)
+        try:
+            async for frame in stream:
+                if frame.startswith("retry:"):
+                    continue
+                if not counted:
+                    # The first keep-alive or event means delivery has started.
+                    counted = True
+                    connected += 1
+                    if connected == subscribers:
+                        all_connected.set()
+                seq = _event_seq(frame)
+                if seq is None or seq not in published_at:
+                    continue
+                latencies.append((time.perf_counter() - published_at.pop(seq)) * 1000)
+                event_id = frame.split("\n", 1)[0][len("id: "):]
+                await sse_service.ack_event(user_type, user_id, event_id)
+                if not published_at and len(latencies) == events:
+                    all_delivered.set()
+        finally:
+            await stream.aclose()
+
+    user_ids = [f"bench{n}" for n in range(subscribers)]
+    tasks: list[asyncio.Task] = []
+    try:
+        for user_id in user_ids:
+            for n in range(backlog):
+                await sse_service.publish_event(user_type, user_id, "chat_message", {"n": n})
+
+        tracemalloc.start()
+        heap_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(user_id)) for user_id in user_ids]
+        await _wait_or_fail(all_connected, tasks, timeout)
+        connect_seconds = time.perf_counter() - started
+        # Let backlog deliveries settle before taking the heap sample.
+        await asyncio.sleep(0.1)
+        heap_after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        round_trips, commands = client.round_trips, client.commands
+        interval = 1.0 / rate if rate > 0 else 0.0
+        for seq in range(events):
+            user_id = user_ids[seq % subscribers]
+            published_at[seq] = time.perf_counter()
+            await sse_service.publish_event(
+                user_type, user_id, "chat_message", {"rideId": f"ride{seq}", "seq": seq}
+            )
+            await asyncio.sleep(interval)
+        try:
+            await _wait_or_fail(all_delivered, tasks, timeout)
+        except asyncio.TimeoutError:
+            pass
+        delivered = len(latencies)
+        per_event = max(delivered, 1)
+        return BenchResult(
+            mode=mode,
+            subscribers=subscribers,
+            events=events,
+            delivered=delivered,
+            connect_seconds=connect_seconds,
+            latency_ms={
+                "p50": _percentile(latencies, 0.50),
+                "p95": _percentile(latencies, 0.95),
+                "p99": _percentile(latencies, 0.99),
+            },
+            round_trips_per_event=(client.round_trips - round_trips) / per_event,
+            commands_per_event=(client.commands - commands) / per_event,
+            kib_per_connection=(heap_after - heap_before) / subscribers / 1024,
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await hub.stop()
+        sse_service.async_redis, sse_service.sse_hub, sse_service.SSE_DELIVERY_MODE = saved
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(HEADER)
+    for subscribers in args.subscribers:
+        result = await run_benchmark(
+            subscribers=subscribers,
+            events=args.events,
+            mode=args.mode,
+            backlog=args.backlog,
+            rate=args.rate,
+            user_type=args.user_type,
+            timeout=args.timeout,
+        )
+        print(result.row(), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--events", type=int, default=200, help="events published per run")
+    parser.add_argument("--mode", choices=["list", "stream"], default="list")
+    parser.add_argument("--backlog", type=int, default=0, help="events queued per subscriber before connecting")
+    parser.add_argument("--rate", type=float, default=500.0, help="publishes per second")
+    parser.add_argument("--user-type", choices=["rider", "driver"], default="rider")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds to wait for connects and for deliveries")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,40 @@
+import math
+
+
+EARTH_RADIUS_M = 6_371_000
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in metres between two points given in degrees."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def route_leg_ends(
+    points: list[tuple[float, float]], leg_distances_m: list[float]
+) -> list[tuple[float, float]]:
+    """
+    Approximate end point of each leg of a route drawn by points: the first
+    point whose distance along the line reaches the leg's share of the route.
+    The last leg always ends at the last point.
+    """
+    if not points or not leg_distances_m:
+        return []
+    along = [0.0]
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+        along.append(along[-1] + haversine_m(lat1, lng1, lat2, lng2))
+    scale = along[-1] / (sum(leg_distances_m) or 1)
+
+    ends = []
+    target = 0.0
+    index = 0
+    for distance in leg_distances_m[:-1]:
+        target += distance * scale
+        while index < len(points) - 1 and along[index] < target:
+            index += 1
+        ends.append(points[index])
+    ends.append(points[-1])
+    return ends
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Iterable, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from core.database import db
+
+
+logger = logging.getLogger(__name__)
+
+# Every index the repositories rely on, by collection; every collection under
+# repositories/ has an entry. Indexes without an explicit name get MongoDB's
+# default one (e.g. "rideStatus_1_last_updated_1"), so indexes created before
+# this module existed are recognised as-is.
+INDEXES: dict[str, list[IndexModel]] = {
+    "rides": [
+        # Active-ride check: {userId, rideStatus: {$in}}.
+        IndexModel([("userId", ASCENDING), ("rideStatus", ASCENDING)]),
+        # Rider and driver history, paged by _id (see core/pagination.py).
+        IndexModel([("userId", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("driverId", ASCENDING), ("_id", ASCENDING)]),
+        # Expiry sweep: {rideStatus, last_updated: {$lt}}.
+        IndexModel([("rideStatus", ASCENDING), ("last_updated", ASCENDING)]),
+    ],
+    "driver_trails": [
+        IndexModel([("rideId", ASCENDING), ("bucket", ASCENDING), ("driverId", ASCENDING)], unique=True),
+    ],
+    "chats": [
+        IndexModel([("rideId", ASCENDING)]),
+    ],
+    "drivers": [
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("stripeAccountId", ASCENDING)], sparse=True),
+    ],
+    "Riders": [
+        IndexModel([("email", ASCENDING)]),
+        IndexModel([("accountStatus", ASCENDING)]),
+    ],
+    "admins": [
+        IndexModel([("email", ASCENDING)]),
+    ],
+    # Payments are only read and updated by _id, which MongoDB always
+    # indexes; the schema has no other lookup keys yet.
+    "payments": [],
+    "payouts": [
+        IndexModel([("driverId", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "addresss": [
+        IndexModel([("userId", ASCENDING)]),
+    ],
+    "ratings": [
+        IndexModel([("userId", ASCENDING)]),
+    ],
+    "audit_logs": [
+        IndexModel([("targetId", ASCENDING), ("targetType", ASCENDING)]),
+    ],
+    "background_checks": [
+        IndexModel([("driverId", ASCENDING)]),
+    ],
+    "driver_documents": [
+        IndexModel([("driverId", ASCENDING), ("documentType", ASCENDING), ("uploadedAt", DESCENDING)]),
+    ],
+    "accessToken": [
+        IndexModel([("userId", ASCENDING)]),
+    ],
+    "refreshToken": [
+        IndexModel([("userId", ASCENDING)]),
+        IndexModel([("previousAccessToken", ASCENDING)]),
+    ],
+    "stripe_events": [
+        IndexModel([("stripe_id", ASCENDING)], unique=True),
+    ],
+    "reset_tokens": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        IndexModel(
+            [("userId", ASCENDING)],
+            unique=True,
+            name="unique_active_reset_token",
+            partialFilterExpression={"expires_at": {"$exists": True}},
+        ),
+    ],
+}
+
+
+async def _reconcile_collection(database, collection: str, indexes: list[IndexModel]) -> list[str]:
+    if not indexes:
+        return []
+    try:
+        return await database[collection].create_indexes(indexes)
+    except OperationFailure as e:
+        # Usually an existing index with the same name or keys but different
+        # options; it has to be dropped by hand before it can be replaced.
+        logger.warning("Could not reconcile indexes on %s: %s", collection, e)
+        return []
+
+
+async def reconcile_indexes(database=None, indexes: Optional[dict[str, list[IndexModel]]] = None) -> dict[str, list[str]]:
+    """
+    Create every declared index that does not exist yet. Creating an index
+    that already exists with the same options is a no-op, so this is safe to
+    run on every startup. Collections are reconciled concurrently; a conflict
+    on one collection is reported and does not stop the others.
+
+    Returns the index names reconciled per collection.
+    """
+    database = db if database is None else database
+    indexes = INDEXES if indexes is None else indexes
+    collections = list(indexes)
+    results = await asyncio.gather(
+        *(_reconcile_collection(database, collection, indexes[collection]) for collection in collections)
+    )
+    return dict(zip(collections, results))
+
+
+def _filter_fields(query, prefix: str = "") -> set[str]:
+    """Field names a filter constrains, flattened through $and/$or/$nor."""
+    fields: set[str] = set()
+    if not isinstance(query, dict):
+        return fields
+    for key, value in query.items():
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            for clause in value:
+                fields |= _filter_fields(clause, prefix)
+        elif not key.startswith("$"):
+            fields.add(prefix + key)
+    return fields
+
+
+def _profiled_filter(entry: dict) -> dict:
+    command = entry.get("command") or {}
+    for field in ("filter", "q", "query"):
+        if isinstance(command.get(field), dict):
+            return command[field]
+    for stage in command.get("pipeline") or []:
+        if "$match" in stage:
+            return stage["$match"]
+    return {}
+
+
+def query_shape(entry: dict) -> tuple[str, tuple[str, ...]]:
+    """(namespace, sorted filter fields) of a system.profile entry."""
+    return entry.get("ns", ""), tuple(sorted(_filter_fields(_profiled_filter(entry))))
+
+
+def summarize_unindexed_queries(entries: Iterable[dict]) -> list[dict]:
+    """Collection scans grouped by query shape, most frequent first."""
+    shapes = Counter(query_shape(entry) for entry in entries)
+    return [
+        {"namespace": namespace, "fields": list(fields), "count": count}
+        for (namespace, fields), count in shapes.most_common()
+    ]
+
+
+async def report_unindexed_queries(database=None, limit: int = 1000) -> list[dict]:
+    """
+    Read the most recent collection scans from the slow log (system.profile)
+    and log each query shape that ran without an index. The profiler has to
+    be enabled on the database (profiling level 1) for anything to show up.
+    """
+    database = db if database is None else database
+    cursor = (
+        database["system.profile"]
+        .find({"planSummary": "COLLSCAN"}, {"ns": 1, "command": 1})
+        .sort("ts", DESCENDING)
+        .limit(limit)
+    )
+    shapes = summarize_unindexed_queries([entry async for entry in cursor])
+    for shape in shapes:
+        logger.warning(
+            "Unindexed query on %s filtering %s seen %d times",
+            shape["namespace"],
+            ", ".join(shape["fields"]) or "nothing",
+            shape["count"],
+        )
+    return shapes
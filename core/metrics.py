@@ -16,17 +16,35 @@ driver_rejects = Counter(
     "Count of driver rejects/timeouts",
 )
 
+ride_claim_conflicts = Counter(
+    "ride_claim_conflicts_total",
+    "Ride accepts lost to another driver, by where they were rejected (lock, database)",
+    ["stage"],
+)
+
 payment_failures = Counter(
     "ride_payment_failures_total",
     "Count of payment failures",
 )
 
+ride_request_first_notification_seconds = Histogram(
+    "ride_request_first_notification_seconds",
+    "Time from starting a ride request broadcast to the first driver notification",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
 sse_backlog = Histogram(
     "ride_sse_pending_events",
     "Pending SSE events length sampled",
     buckets=(0, 1, 5, 10, 20, 50, 100, 200),
 )
 
+sse_events_dropped = Counter(
+    "ride_sse_events_dropped_total",
+    "Pending SSE events dropped before delivery, by reason (coalesced, overflow)",
+    ["reason"],
+)
+
 av_scan_failures = Counter(
     "storage_av_scan_failures_total",
     "Count of AV scan failures",
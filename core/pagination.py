@@ -0,0 +1,45 @@
+import base64
+import binascii
+from typing import Optional, Sequence
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+
+# Keyset pagination: pages are ordered by _id (ObjectIds grow with creation
+# time, so this is also date_created order) and a page starts right after the
+# last _id of the previous one. Every page is one indexed range scan, however
+# deep it is, unlike .skip() which walks all the skipped documents.
+
+
+def encode_cursor(last_id: str) -> str:
+    """Opaque cursor pointing just after the document with this id."""
+    return base64.urlsafe_b64encode(ObjectId(last_id).binary).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return ObjectId(raw)
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor.",
+        )
+
+
+def keyset_filter(filter_dict: Optional[dict], cursor: Optional[str]) -> dict:
+    """filter_dict narrowed to documents after the cursor (all of them for no cursor)."""
+    filter_dict = filter_dict or {}
+    if not cursor:
+        return filter_dict
+    after = {"_id": {"$gt": decode_cursor(cursor)}}
+    return {"$and": [filter_dict, after]} if filter_dict else after
+
+
+def next_cursor(items: Sequence, page_size: int) -> Optional[str]:
+    """Cursor for the page after items, or None when items was the last page."""
+    if not items or len(items) < page_size:
+        return None
+    return encode_cursor(items[-1].id)
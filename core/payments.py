@@ -286,7 +286,6 @@ class StripePaymentProvider(PaymentProvider):
                     rider_id=rider_id,
                     driver_id=driver_id,
                     message="Payment confirmed, finding driver...",
-                    eta_minutes=14,
                 )
             except Exception:
                 pass
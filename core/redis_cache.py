@@ -29,5 +29,14 @@ cache_db = redis.Redis(
     socket_timeout=2,
 )
 
-
- 
+# Client for blocking reads (XREAD/XREADGROUP BLOCK, pub/sub listeners) that
+# must be allowed to wait longer than the regular socket timeout.
+async_redis_blocking = _async_redis.Redis(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    username=REDIS_USERNAME,
+    password=REDIS_PASSWORD,
+    decode_responses=True,
+    socket_timeout=None,
+)
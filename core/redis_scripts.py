@@ -0,0 +1,400 @@
+"""
+Server-side Lua scripts for multi-step Redis bookkeeping.
+
+Each script runs atomically and costs a single round-trip. Scripts are
+registered once and invoked with EVALSHA; redis-py reloads them transparently
+if the server has flushed its script cache. Callers pass their own client
+(``script(keys=..., args=..., client=...)``) so tests can point them at a fake.
+
+The SSE scripts touch event hashes and index lists whose keys are derived
+from their arguments, which is fine on a single Redis node but not
+cluster-safe.
+"""
+
+from core.redis_cache import async_redis
+
+
+# KEYS[1]: event hash, KEYS[2]: pending list, KEYS[3]: event-type index,
+# KEYS[4]: ride index (optional)
+# ARGV[1]: event id, ARGV[2]: event key prefix, ARGV[3]: TTL in seconds,
+# ARGV[4]: max backlog (0 for unbounded), ARGV[5]: event type to coalesce on
+# ('' to keep older events), ARGV[6]: notify channel, ARGV[7]: notify message,
+# ARGV[8..]: event hash field/value pairs
+# Pending events of the coalesced type for the same ride are dropped before the
+# new one is queued; afterwards the oldest events are dropped until the pending
+# list fits the max backlog.
+# Returns {coalesced, overflowed}
+PUBLISH_LIST_EVENT_LUA = """
+local function drop(id)
+    local key = ARGV[2] .. id
+    local record = redis.call('HMGET', key, 'event_type', 'ride_id')
+    redis.call('LREM', KEYS[2], 0, id)
+    if record[1] then
+        redis.call('LREM', KEYS[2] .. ':type:' .. record[1], 0, id)
+    end
+    if record[2] and record[2] ~= '' then
+        redis.call('LREM', KEYS[2] .. ':ride:' .. record[2], 0, id)
+    end
+    redis.call('DEL', key)
+end
+
+local ttl = tonumber(ARGV[3])
+local coalesced = 0
+if ARGV[5] ~= '' and KEYS[4] then
+    for _, id in ipairs(redis.call('LRANGE', KEYS[4], 0, -1)) do
+        if redis.call('HGET', ARGV[2] .. id, 'event_type') == ARGV[5] then
+            drop(id)
+            coalesced = coalesced + 1
+        end
+    end
+end
+
+local fields = {}
+for i = 8, #ARGV do
+    table.insert(fields, ARGV[i])
+end
+redis.call('HSET', KEYS[1], unpack(fields))
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('RPUSH', KEYS[2], ARGV[1])
+for i = 3, #KEYS do
+    redis.call('RPUSH', KEYS[i], ARGV[1])
+    redis.call('EXPIRE', KEYS[i], ttl)
+end
+
+local overflowed = 0
+local max_backlog = tonumber(ARGV[4])
+if max_backlog > 0 then
+    while redis.call('LLEN', KEYS[2]) > max_backlog do
+        drop(redis.call('LINDEX', KEYS[2], 0))
+        overflowed = overflowed + 1
+    end
+end
+
+redis.call('PUBLISH', ARGV[6], ARGV[7])
+return {coalesced, overflowed}
+"""
+
+# KEYS[1]: user stream, KEYS[2]: hash of ride id -> latest coalescable entry id
+# ARGV[1]: approximate max length, ARGV[2]: TTL in seconds,
+# ARGV[3]: ride id to coalesce on ('' to keep older entries),
+# ARGV[4]: notify channel, ARGV[5]: notify message, ARGV[6..]: entry field/value pairs
+# Returns {entry id, coalesced}
+PUBLISH_STREAM_EVENT_LUA = """
+local coalesced = 0
+if ARGV[3] ~= '' then
+    local previous = redis.call('HGET', KEYS[2], ARGV[3])
+    if previous then
+        coalesced = redis.call('XDEL', KEYS[1], previous)
+    end
+end
+
+local fields = {}
+for i = 6, #ARGV do
+    table.insert(fields, ARGV[i])
+end
+local entry_id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', unpack(fields))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[2], ARGV[3], entry_id)
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+
+redis.call('PUBLISH', ARGV[4], ARGV[5])
+return {entry_id, coalesced}
+"""
+
+# KEYS: pending lists to scan (the main list or one or more index lists)
+# ARGV[1]: event key prefix, ARGV[2]: user_type, ARGV[3]: user_id,
+# ARGV[4]: now, ARGV[5]: retry interval in seconds,
+# ARGV[6]: ride id filter ('' for none),
+# ARGV[7]: resume-after event id ('' for none), ARGV[8]: the user's main
+# pending list, ARGV[9..]: allowed event types
+# Ids queued at or before ARGV[7] in the main pending list were already seen by
+# the client; they are acknowledged (removed from the pending and index lists,
+# hash deleted) instead of being delivered. Position rather than id order is
+# used because ids are made by the publishing process before the event is
+# queued. When ARGV[7] is no longer pending nothing is skipped.
+# Events stored before frames were pre-rendered only have a JSON 'payload'
+# field; they are returned with the 'legacy' encoding.
+# Returns {backlog, stale_count, id1, encoding1, body1, id2, encoding2, body2, ...}
+CLAIM_DUE_EVENTS_LUA = """
+local ids = redis.call('LRANGE', KEYS[1], 0, -1)
+if #KEYS > 1 then
+    -- Index lists are disjoint and their ids sort in (roughly) publish order.
+    for i = 2, #KEYS do
+        for _, id in ipairs(redis.call('LRANGE', KEYS[i], 0, -1)) do
+            table.insert(ids, id)
+        end
+    end
+    table.sort(ids)
+end
+local allowed = nil
+if #ARGV > 8 then
+    allowed = {}
+    for i = 9, #ARGV do
+        allowed[ARGV[i]] = true
+    end
+end
+local now = tonumber(ARGV[4])
+local retry_after = tonumber(ARGV[5])
+local seen = {}
+if ARGV[7] ~= '' then
+    local queued = redis.call('LRANGE', ARGV[8], 0, -1)
+    for position, id in ipairs(queued) do
+        if id == ARGV[7] then
+            for i = 1, position do
+                seen[queued[i]] = true
+            end
+            break
+        end
+    end
+end
+local stale = 0
+local claimed = {}
+for _, id in ipairs(ids) do
+    if seen[id] then
+        local key = ARGV[1] .. id
+        local record = redis.call('HMGET', key, 'user_type', 'user_id', 'event_type', 'ride_id')
+        if record[1] == ARGV[2] and record[2] == ARGV[3] then
+            redis.call('LREM', ARGV[8], 0, id)
+            if record[3] then
+                redis.call('LREM', ARGV[8] .. ':type:' .. record[3], 0, id)
+            end
+            if record[4] and record[4] ~= '' then
+                redis.call('LREM', ARGV[8] .. ':ride:' .. record[4], 0, id)
+            end
+            redis.call('DEL', key)
+        end
+    else
+        local key = ARGV[1] .. id
+        local record = redis.call(
+            'HMGET', key, 'frame', 'user_type', 'user_id', 'last_sent_at', 'event_type', 'ride_id',
+            'encoding', 'payload'
+        )
+        local body = record[1]
+        local encoding = record[7] or ''
+        if not body and record[8] then
+            body = record[8]
+            encoding = 'legacy'
+        end
+        if not body then
+            stale = stale + 1
+        elseif record[2] == ARGV[2] and record[3] == ARGV[3]
+            and now - tonumber(record[4] or '0') >= retry_after
+            and (allowed == nil or allowed[record[5]])
+            and (ARGV[6] == '' or record[6] == ARGV[6]) then
+            redis.call('HSET', key, 'last_sent_at', ARGV[4])
+            table.insert(claimed, id)
+            table.insert(claimed, encoding)
+            table.insert(claimed, body)
+        end
+    end
+end
+table.insert(claimed, 1, stale)
+table.insert(claimed, 1, #ids)
+return claimed
+"""
+
+# KEYS[1]: event hash, KEYS[2]: pending list
+# ARGV[1]: user_type, ARGV[2]: user_id, ARGV[3]: event id
+# The id is also removed from the event-type and ride index lists, whose keys
+# extend the pending list key (see services.sse_service).
+# Returns 1 when the event belonged to the user and was removed, else 0.
+ACK_EVENT_LUA = """
+local record = redis.call('HMGET', KEYS[1], 'user_type', 'user_id', 'event_type', 'ride_id')
+if record[1] ~= ARGV[1] or record[2] ~= ARGV[2] then
+    return 0
+end
+redis.call('LREM', KEYS[2], 0, ARGV[3])
+if record[3] then
+    redis.call('LREM', KEYS[2] .. ':type:' .. record[3], 0, ARGV[3])
+end
+if record[4] and record[4] ~= '' then
+    redis.call('LREM', KEYS[2] .. ':ride:' .. record[4], 0, ARGV[3])
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+# KEYS: pending lists to clean
+# ARGV[1]: event key prefix
+# Returns the number of ids dropped because their event expired or has no body.
+PURGE_STALE_EVENTS_LUA = """
+local removed = 0
+for _, list_key in ipairs(KEYS) do
+    for _, id in ipairs(redis.call('LRANGE', list_key, 0, -1)) do
+        local key = ARGV[1] .. id
+        if redis.call('HEXISTS', key, 'frame') == 0 and redis.call('HEXISTS', key, 'payload') == 0 then
+            redis.call('LREM', list_key, 0, id)
+            redis.call('DEL', key)
+            removed = removed + 1
+        end
+    end
+end
+return removed
+"""
+
+# KEYS[1]: active session key
+# ARGV[1]: session id, ARGV[2]: TTL in seconds
+# Returns 1 and refreshes the TTL while the session still owns the key, else 0.
+REFRESH_SESSION_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS: driver GEO shards to search
+# ARGV[1]: presence hash key prefix, ARGV[2]: longitude, ARGV[3]: latitude,
+# ARGV[4]: radius in km, ARGV[5]: required vehicle type ('' for any),
+# ARGV[6]: now, ARGV[7]: max seconds since the driver was last seen,
+# ARGV[8]: max drivers to return (0 for all),
+# ARGV[9]: set of drivers to skip and add the result to ('' for none),
+# ARGV[10]: TTL in seconds for that set
+# Presence hashes store the vehicle type already normalized.
+# Shards only group drivers by vehicle and eligibility as of their last update,
+# so the presence fields are still checked.
+# Returns the ids of active, profile-complete drivers in range whose presence
+# is fresh and whose vehicle matches, nearest first.
+ELIGIBLE_DRIVERS_LUA = """
+local limit = tonumber(ARGV[8])
+local skip_key = ARGV[9]
+local search = {'FROMLONLAT', ARGV[2], ARGV[3], 'BYRADIUS', ARGV[4], 'km', 'ASC'}
+if limit > 0 then
+    -- Skipped drivers are the nearest ones, so read past them.
+    local skipped = 0
+    if skip_key ~= '' then
+        skipped = redis.call('SCARD', skip_key)
+    end
+    table.insert(search, 'COUNT')
+    table.insert(search, limit + skipped)
+end
+table.insert(search, 'WITHDIST')
+
+local candidates = {}
+for _, shard in ipairs(KEYS) do
+    for _, hit in ipairs(redis.call('GEOSEARCH', shard, unpack(search))) do
+        table.insert(candidates, {hit[1], tonumber(hit[2])})
+    end
+end
+if #KEYS > 1 then
+    table.sort(candidates, function(a, b) return a[2] < b[2] end)
+end
+
+local complete = {['1'] = true, ['true'] = true, ['True'] = true, ['TRUE'] = true}
+local now = tonumber(ARGV[6])
+local max_age = tonumber(ARGV[7])
+local eligible = {}
+for _, candidate in ipairs(candidates) do
+    if limit > 0 and #eligible >= limit then
+        break
+    end
+    local driver_id = candidate[1]
+    if skip_key == '' or redis.call('SISMEMBER', skip_key, driver_id) == 0 then
+        local meta = redis.call(
+            'HMGET', ARGV[1] .. driver_id,
+            'account_status', 'profile_complete', 'vehicle_type', 'latitude', 'longitude', 'last_seen'
+        )
+        local last_seen = tonumber(meta[6] or '')
+        if meta[1] == 'active'
+            and complete[meta[2] or '']
+            and (ARGV[5] == '' or meta[3] == ARGV[5])
+            and tonumber(meta[4] or '') and tonumber(meta[5] or '')
+            and last_seen and now - math.floor(last_seen) <= max_age then
+            table.insert(eligible, driver_id)
+        end
+    end
+end
+if skip_key ~= '' and #eligible > 0 then
+    redis.call('SADD', skip_key, unpack(eligible))
+    redis.call('EXPIRE', skip_key, ARGV[10])
+end
+return eligible
+"""
+
+# KEYS[1]: last-seen sorted set, KEYS[2..]: driver GEO index and shards
+# ARGV[1]: presence hash key prefix, ARGV[2]: last-seen cutoff (exclusive),
+# ARGV[3]: max drivers to remove
+# Drivers last seen before the cutoff are removed from every GEO key and the
+# last-seen set and their presence hash is deleted. Reading and removing in one
+# script means a driver reporting a location mid-sweep is never dropped.
+# Returns the number of drivers removed.
+SWEEP_STALE_DRIVERS_LUA = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[2], 'LIMIT', 0, ARGV[3])
+if #stale == 0 then
+    return 0
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZREM', key, unpack(stale))
+end
+for _, driver_id in ipairs(stale) do
+    redis.call('DEL', ARGV[1] .. driver_id)
+end
+return #stale
+"""
+
+# KEYS[1]: driver GEO index, KEYS[2]: last-seen sorted set, KEYS[3]: scan offset
+# ARGV[1]: presence hash key prefix, ARGV[2]: members to scan
+# Walks the GEO index one page per call, resuming from the stored offset and
+# starting over after the last page, and gives every member missing from the
+# last-seen set the last_seen of its presence hash, or 0 when it has none, so
+# the stale sweep can remove it. Returns the number of members added.
+BACKFILL_DRIVER_LAST_SEEN_LUA = """
+local offset = tonumber(redis.call('GET', KEYS[3]) or '0')
+local count = tonumber(ARGV[2])
+local members = redis.call('ZRANGE', KEYS[1], offset, offset + count - 1)
+if #members < count then
+    redis.call('SET', KEYS[3], 0)
+else
+    redis.call('SET', KEYS[3], offset + count)
+end
+local added = 0
+for _, driver_id in ipairs(members) do
+    if not redis.call('ZSCORE', KEYS[2], driver_id) then
+        local last_seen = redis.call('HGET', ARGV[1] .. driver_id, 'last_seen')
+        added = added + redis.call('ZADD', KEYS[2], 'NX', tonumber(last_seen) or 0, driver_id)
+    end
+end
+return added
+"""
+
+# KEYS[1]: timer sorted set
+# ARGV[1]: now, ARGV[2]: max timers to claim, ARGV[3]: lease deadline
+# Pushes due timers to the lease deadline and returns {member, ...}.
+CLAIM_DUE_TIMERS_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[3], member)
+end
+return due
+"""
+
+# KEYS[1]: timer sorted set
+# ARGV[1]: lease deadline, ARGV[2..]: members
+# Removes members still at the lease deadline; members a handler rescheduled
+# keep their new deadline.
+COMPLETE_TIMERS_LUA = """
+local removed = 0
+local lease = tonumber(ARGV[1])
+for i = 2, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) == lease then
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+
+
+publish_list_event_script = async_redis.register_script(PUBLISH_LIST_EVENT_LUA)
+publish_stream_event_script = async_redis.register_script(PUBLISH_STREAM_EVENT_LUA)
+claim_due_events_script = async_redis.register_script(CLAIM_DUE_EVENTS_LUA)
+ack_event_script = async_redis.register_script(ACK_EVENT_LUA)
+purge_stale_events_script = async_redis.register_script(PURGE_STALE_EVENTS_LUA)
+refresh_session_script = async_redis.register_script(REFRESH_SESSION_LUA)
+eligible_drivers_script = async_redis.register_script(ELIGIBLE_DRIVERS_LUA)
+sweep_stale_drivers_script = async_redis.register_script(SWEEP_STALE_DRIVERS_LUA)
+backfill_driver_last_seen_script = async_redis.register_script(BACKFILL_DRIVER_LAST_SEEN_LUA)
+claim_due_timers_script = async_redis.register_script(CLAIM_DUE_TIMERS_LUA)
+complete_timers_script = async_redis.register_script(COMPLETE_TIMERS_LUA)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from core.redis_cache import async_redis_blocking
+
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL_PREFIX = "sse:notify:"
+NOTIFY_EVENT = "event"
+HUB_QUEUE_SIZE = int(os.getenv("SSE_HUB_QUEUE_SIZE", "16"))
+HUB_RECONNECT_SECONDS = float(os.getenv("SSE_HUB_RECONNECT_SECONDS", "1"))
+HUB_POLL_SECONDS = float(os.getenv("SSE_HUB_POLL_SECONDS", "1"))
+
+
+def notify_channel(user_type: str, user_id: str) -> str:
+    return f"{NOTIFY_CHANNEL_PREFIX}{user_type}:{user_id}"
+
+
+class SSEHub:
+    """
+    Fans Redis pub/sub notifications out to the SSE connections of this process.
+
+    A single pattern subscription is shared by every open stream in the worker,
+    so a publish costs one Redis message regardless of how many local streams
+    exist. Each connection gets its own bounded asyncio.Queue keyed by
+    (user_type, user_id); notifications are only wake-ups, so when a queue is
+    full the oldest entry is dropped to make room for the newest.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        prefix: str = NOTIFY_CHANNEL_PREFIX,
+        queue_size: int = HUB_QUEUE_SIZE,
+        poll_seconds: float = HUB_POLL_SECONDS,
+    ):
+        self._redis = redis_client
+        self._prefix = prefix
+        self._queue_size = queue_size
+        self._poll_seconds = poll_seconds
+        self._queues: dict[tuple[str, str], set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._queues.values())
+
+    def subscribe(self, user_type: str, user_id: str) -> asyncio.Queue:
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        self._queues.setdefault((user_type, user_id), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_type: str, user_id: str, queue: asyncio.Queue) -> None:
+        key = (user_type, user_id)
+        queues = self._queues.get(key)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._queues[key]
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self) -> None:
+        # The listener checks the flag between reads instead of being
+        # cancelled, since a cancellation arriving inside a pub/sub read can
+        # be swallowed by the client and leave the task hanging.
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+
+    def dispatch(self, channel: str, data: str) -> None:
+        user_type, _, user_id = channel[len(self._prefix):].partition(":")
+        for queue in self._queues.get((user_type, user_id), ()):
+            self._offer(queue, data)
+
+    def _wake_all(self) -> None:
+        for queues in self._queues.values():
+            for queue in queues:
+                self._offer(queue, NOTIFY_EVENT)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, data: str) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(data)
+
+    async def _listen(self) -> None:
+        while not self._stopping:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self._prefix}*")
+                # Anything published before the subscription was active (or
+                # while reconnecting) would otherwise wait for the next timeout.
+                self._wake_all()
+                while not self._stopping:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True,
+                        timeout=self._poll_seconds,
+                    )
+                    if message and message["type"] == "pmessage":
+                        self.dispatch(message["channel"], message["data"])
+            except Exception:
+                logger.exception("SSE hub lost its Redis subscription, reconnecting")
+            finally:
+                await pubsub.aclose()
+            if not self._stopping:
+                await asyncio.sleep(HUB_RECONNECT_SECONDS)
+
+
+sse_hub = SSEHub(async_redis_blocking)
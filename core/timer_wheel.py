@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Optional
+
+from core.redis_cache import async_redis
+from core.redis_scripts import claim_due_timers_script, complete_timers_script
+
+
+logger = logging.getLogger(__name__)
+
+TIMER_KEY = os.getenv("TIMER_WHEEL_KEY", "timers:due")
+TIMER_POLL_SECONDS = float(os.getenv("TIMER_WHEEL_POLL_SECONDS", "1"))
+TIMER_BATCH_SIZE = int(os.getenv("TIMER_WHEEL_BATCH_SIZE", "500"))
+# A claimed timer whose handler crashes (or whose worker dies) fires again
+# after this long.
+TIMER_LEASE_SECONDS = float(os.getenv("TIMER_WHEEL_LEASE_SECONDS", "60"))
+
+TimerHandler = Callable[[list[str]], Awaitable[None]]
+
+
+class RedisTimerWheel:
+    """
+    Deadlines kept in one Redis sorted set (member "<kind>:<id>", score = due
+    time) and fired by a single async drainer per process.
+
+    Scheduling and cancelling are one ZADD/ZREM each. Every poll the drainer
+    claims up to batch_size due timers with a short Lua script, groups them by
+    kind and calls each kind's handler once with the list of ids. Claimed
+    timers are leased rather than removed, so a timer whose handler fails or
+    whose worker dies fires again once the lease runs out; handlers must
+    therefore be idempotent. A handler may reschedule any of its ids, which
+    replaces the lease.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        key: str = TIMER_KEY,
+        poll_seconds: float = TIMER_POLL_SECONDS,
+        batch_size: int = TIMER_BATCH_SIZE,
+        lease_seconds: float = TIMER_LEASE_SECONDS,
+    ):
+        self._redis = redis_client
+        self._key = key
+        self._poll_seconds = poll_seconds
+        self._batch_size = batch_size
+        self._lease_seconds = lease_seconds
+        self._handlers: dict[str, TimerHandler] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def register(self, kind: str, handler: TimerHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def schedule(self, kind: str, item_id: str, delay_seconds: float, nx: bool = False) -> None:
+        """
+        Fire the timer delay_seconds from now, replacing its deadline (or
+        lease). With nx, a timer that is already scheduled or leased is left
+        alone.
+        """
+        await self._redis.zadd(self._key, {f"{kind}:{item_id}": time.time() + delay_seconds}, nx=nx)
+
+    async def cancel(self, kind: str, item_id: str) -> None:
+        await self._redis.zrem(self._key, f"{kind}:{item_id}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self._drain_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping = True
+        await self._task
+        self._task = None
+
+    async def drain_once(self) -> int:
+        """Fire every timer due now, in batches. Returns how many fired."""
+        fired = 0
+        while True:
+            now = time.time()
+            lease = now + self._lease_seconds
+            members = await claim_due_timers_script(
+                keys=[self._key],
+                args=[now, self._batch_size, lease],
+                client=self._redis,
+            )
+            if not members:
+                return fired
+            fired += len(members)
+
+            by_kind: dict[str, list[str]] = defaultdict(list)
+            for member in members:
+                kind, _, item_id = member.partition(":")
+                by_kind[kind].append(item_id)
+
+            done = []
+            for kind, item_ids in by_kind.items():
+                handler = self._handlers.get(kind)
+                if handler is None:
+                    logger.warning("No handler registered for %s timers", kind)
+                    continue
+                try:
+                    await handler(item_ids)
+                except Exception:
+                    logger.exception("Timer handler for %s failed, retrying after lease", kind)
+                    continue
+                done.extend(f"{kind}:{item_id}" for item_id in item_ids)
+
+            if done:
+                await complete_timers_script(
+                    keys=[self._key],
+                    args=[lease, *done],
+                    client=self._redis,
+                )
+            if len(members) < self._batch_size:
+                return fired
+
+    async def _drain_forever(self) -> None:
+        while not self._stopping:
+            try:
+                await self.drain_once()
+            except Exception:
+                logger.exception("Timer wheel drain failed")
+            await asyncio.sleep(self._poll_seconds)
+
+
+timer_wheel = RedisTimerWheel(async_redis)
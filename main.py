@@ -14,7 +14,6 @@ import logging
 from logging.config import dictConfig
 from prometheus_fastapi_instrumentator import Instrumentator
 from middlewares.structured_logging_middleware import StructuredLoggingMiddleware
-from pymongo import ASCENDING
 from celery_worker import celery_app
 from contextlib import asynccontextmanager
 from core.scheduler import scheduler
@@ -22,11 +21,15 @@ from pymongo import MongoClient
 import redis
 from apscheduler.triggers.interval import IntervalTrigger
 from starlette.middleware.sessions import SessionMiddleware
-from core.database import db
 from security.encrypting_jwt import decode_jwt_token
 from redis_om import Migrator
 from starlette.concurrency import run_in_threadpool
 from services.sse_service import publish_ride_request, cleanup_stale_driver_locations
+from core.sse_hub import sse_hub
+from core.timer_wheel import timer_wheel
+from core.indexes import reconcile_indexes, report_unindexed_queries
+from services.ride_service import schedule_ride_expiry_sweep
+from apscheduler.jobstores.base import JobLookupError
 from middlewares.rate_limiting_middleware import RateLimitingMiddleware
 
 MONGO_URI = os.getenv("MONGO_URL")
@@ -34,6 +37,7 @@ REDIS_URI = f"redis://{os.getenv('REDIS_HOST', '127.0.0.1')}:{os.getenv('REDIS_P
 REDIS_HOST = os.getenv("REDIS_HOST", "127.0.0.1")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
+INDEX_REPORT_INTERVAL_SECONDS = int(os.getenv("INDEX_REPORT_INTERVAL_SECONDS", "3600"))
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
 # --- Heartbeat Function ---
 def apscheduler_heartbeat():
@@ -59,36 +63,33 @@ async def lifespan(app:FastAPI):
         name="Remove stale driver geo entries",
         replace_existing=True,
     )
+    scheduler.add_job(
+        report_unindexed_queries,
+        trigger=IntervalTrigger(seconds=INDEX_REPORT_INTERVAL_SECONDS),
+        id="unindexed_query_report",
+        name="Log query shapes the slow log shows running without an index",
+        replace_existing=True,
+    )
     
     Migrator().run()
     
-    await db.stripe_events.create_index(
-        [("stripe_id", 1)],
-        unique=True
-    )
-    
-    await db.chats.create_index(
-        [("rideId", 1)] 
-    )
-    await db.reset_tokens.create_index(
-        [("expires_at", ASCENDING)],
-        expireAfterSeconds=0
-    )
-    await db.reset_tokens.create_index(
-    [("userId", 1)],
-    unique=True,
-    name="unique_active_reset_token",
-    partialFilterExpression={
-        "expires_at": {"$exists": True}
-    }
-
-)
-
+    await reconcile_indexes()
 
     scheduler.start()
+    # The expiry sweep used to be an interval job in the persistent job store;
+    # it now runs as one leased timer on the timer wheel.
+    try:
+        scheduler.remove_job("ride_expiry_sweep")
+    except JobLookupError:
+        pass
+    await schedule_ride_expiry_sweep()
+    sse_hub.start()
+    timer_wheel.start()
     try:
         yield
     finally:
+        await timer_wheel.stop()
+        await sse_hub.stop()
         scheduler.shutdown()
     
 
@@ -13,6 +13,7 @@ from core.database import db
 from fastapi import HTTPException,status
 from typing import List,Optional
 from schemas.chat import ChatUpdate, ChatCreate, ChatOut
+from core.pagination import keyset_filter
 
 async def create_chat(chat_data: ChatCreate) -> ChatOut:
     chat_dict = chat_data.model_dump()
@@ -41,21 +42,23 @@ async def get_chat(filter_dict: dict) -> Optional[ChatOut]:
             detail=f"An error occurred while fetching chat: {str(e)}"
         )
     
-async def get_chats(filter_dict: Optional[dict] = None,start=0,stop=100) -> List[ChatOut]:
+async def get_chats(filter_dict: Optional[dict] = None,start=0,stop=100,cursor: Optional[str] = None) -> List[ChatOut]:
+    filter_dict = keyset_filter(filter_dict, cursor)
     try:
-        filter_dict = filter_dict or {}
         start = max(0, start or 0)
         if stop is None:
             stop = start + 100
         limit = max(0, stop - start)
 
-        cursor = (db.chats.find(filter_dict)
-        .skip(start)
+        docs = (db.chats.find(filter_dict)
+        .sort("_id", 1)
+        # A cursor replaces the offset: the page starts right after it.
+        .skip(0 if cursor else start)
         .limit(limit)
         )
         chat_list = []
 
-        async for doc in cursor:
+        async for doc in docs:
             chat_list.append(ChatOut(**doc))
 
         return chat_list
@@ -13,6 +13,7 @@ from core.database import db
 from fastapi import HTTPException,status
 from typing import List,Optional
 from schemas.driver import DriverUpdate, DriverCreate, DriverOut
+from core.pagination import keyset_filter
 
 async def create_driver(driver_data: DriverCreate) -> DriverOut:
     driver_dict = driver_data.model_dump()
@@ -41,21 +42,23 @@ async def get_driver(filter_dict: dict) -> Optional[DriverOut]:
             detail=f"An error occurred while fetching driver: {str(e)}"
         )
     
-async def get_drivers(filter_dict: Optional[dict] = None,start=0,stop=100) -> List[DriverOut]:
+async def get_drivers(filter_dict: Optional[dict] = None,start=0,stop=100,cursor: Optional[str] = None) -> List[DriverOut]:
+    filter_dict = keyset_filter(filter_dict, cursor)
     try:
-        filter_dict = filter_dict or {}
         start = max(0, start or 0)
         if stop is None:
             stop = start + 100
         limit = max(0, stop - start)
 
-        cursor = (db.drivers.find(filter_dict)
-        .skip(start)
+        docs = (db.drivers.find(filter_dict)
+        .sort("_id", 1)
+        # A cursor replaces the offset: the page starts right after it.
+        .skip(0 if cursor else start)
         .limit(limit)
         )
         driver_list = []
 
-        async for doc in cursor:
+        async for doc in docs:
             driver_list.append(DriverOut(**doc))
 
         return driver_list
@@ -0,0 +1,47 @@
+# ============================================================================
+# DRIVER TRAIL REPOSITORY
+# ============================================================================
+# Bucketed location trails: one document per driver, ride and time bucket,
+# appended to with $push so a fix costs one small update.
+# ============================================================================
+
+import time
+from pymongo import UpdateOne
+from core.database import db
+from fastapi import HTTPException,status
+from typing import List
+
+
+async def append_trail_points(driver_id: str, ride_id: str, buckets: dict[int, List[dict]]) -> None:
+    """Appends points to their bucket documents, creating them as needed, in one bulk write."""
+    if not buckets:
+        return
+    now = int(time.time())
+    operations = [
+        UpdateOne(
+            {"rideId": ride_id, "bucket": bucket, "driverId": driver_id},
+            {
+                "$push": {"points": {"$each": points}},
+                "$inc": {"count": len(points)},
+                "$setOnInsert": {"date_created": now},
+            },
+            upsert=True,
+        )
+        for bucket, points in sorted(buckets.items())
+    ]
+    await db.driver_trails.bulk_write(operations, ordered=False)
+
+
+async def get_trail_points_for_ride(ride_id: str) -> List[dict]:
+    """Returns the ride's bucket documents (driverId and points), oldest bucket first."""
+    try:
+        cursor = db.driver_trails.find(
+            {"rideId": ride_id},
+            {"_id": 0, "driverId": 1, "points": 1},
+        ).sort("bucket", 1)
+        return [doc async for doc in cursor]
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while fetching ride trail: {str(e)}"
+        )
@@ -13,6 +13,7 @@ from core.database import db
 from fastapi import HTTPException,status
 from typing import List,Optional
 from schemas.payout import PayoutUpdate, PayoutCreate, PayoutOut
+from core.pagination import keyset_filter
 
 async def create_payout(payout_data: PayoutCreate) -> PayoutOut:
     payout_dict = payout_data.model_dump()
@@ -41,21 +42,23 @@ async def get_payout(filter_dict: dict) -> Optional[PayoutOut]:
             detail=f"An error occurred while fetching payout: {str(e)}"
         )
     
-async def get_payouts(filter_dict: Optional[dict] = None,start=0,stop=100) -> List[PayoutOut]:
+async def get_payouts(filter_dict: Optional[dict] = None,start=0,stop=100,cursor: Optional[str] = None) -> List[PayoutOut]:
+    filter_dict = keyset_filter(filter_dict, cursor)
     try:
-        filter_dict = filter_dict or {}
         start = max(0, start or 0)
         if stop is None:
             stop = start + 100
         limit = max(0, stop - start)
 
-        cursor = (db.payouts.find(filter_dict)
-        .skip(start)
+        docs = (db.payouts.find(filter_dict)
+        .sort("_id", 1)
+        # A cursor replaces the offset: the page starts right after it.
+        .skip(0 if cursor else start)
         .limit(limit)
         )
         payout_list = []
 
-        async for doc in cursor:
+        async for doc in docs:
             payout_list.append(PayoutOut(**doc))
 
         return payout_list
@@ -13,6 +13,7 @@ from core.database import db
 from fastapi import HTTPException,status
 from typing import List,Optional
 from schemas.rating import RatingSummary, RatingUpdate, RatingCreate, RatingOut
+from core.pagination import keyset_filter
 
 async def create_rating(rating_data: RatingCreate) -> RatingOut:
     rating_dict = rating_data.model_dump()
@@ -76,21 +77,23 @@ async def get_user_rating_summary(user_id: str) -> RatingSummary:
             detail=f"Failed to retrieve user rating summary: {str(e)}"
         )
     
-async def get_ratings(filter_dict: Optional[dict] = None,start=0,stop=100) -> List[RatingOut]:
+async def get_ratings(filter_dict: Optional[dict] = None,start=0,stop=100,cursor: Optional[str] = None) -> List[RatingOut]:
+    filter_dict = keyset_filter(filter_dict, cursor)
     try:
-        filter_dict = filter_dict or {}
         start = max(0, start or 0)
         if stop is None:
             stop = start + 100
         limit = max(0, stop - start)
 
-        cursor = (db.ratings.find(filter_dict)
-        .skip(start)
+        docs = (db.ratings.find(filter_dict)
+        .sort("_id", 1)
+        # A cursor replaces the offset: the page starts right after it.
+        .skip(0 if cursor else start)
         .limit(limit)
         )
         rating_list = []
 
-        async for doc in cursor:
+        async for doc in docs:
             rating_list.append(RatingOut(**doc))
 
         return rating_list
@@ -8,11 +8,14 @@
 # DO NOT EDIT THIS FILE MANUALLY - RE-RUN THE GENERATOR INSTEAD. OR IF YOU WANT TO EDIT JUST ADD LEAVE OTHER FUNCTIONS THE WAY YOU MET THEM
 # ============================================================================
 
+from bson import ObjectId
 from pymongo import ReturnDocument
 from core.database import db
 from fastapi import HTTPException,status
 from typing import List,Optional
-from schemas.ride import RideUpdate, RideCreate, RideOut
+from schemas.imports import RideStatus
+from schemas.ride import RideUpdate, RideCreate, RideOut, RideSummaryOut
+from core.pagination import keyset_filter
 
 
 
@@ -39,19 +42,48 @@ async def create_ride(ride_data: RideCreate) -> RideOut:
     returnable_result = RideOut(**result)
     return returnable_result
 
-async def get_ride(filter_dict: dict) -> Optional[RideOut]:
+# Field sets for ride reads. "summary" is what ride lists display and is
+# returned as RideSummaryOut; "detail" leaves out the raw Stripe payloads;
+# "admin" is the whole document.
+RIDE_PROJECTIONS: dict[str, Optional[dict]] = {
+    "summary": {
+        "pickup": 1,
+        "destination": 1,
+        "stops": 1,
+        "vehicleType": 1,
+        "pickupSchedule": 1,
+        "paymentStatus": 1,
+        "price": 1,
+        "rideStatus": 1,
+        "driverId": 1,
+        "userId": 1,
+        "map.totalDistanceMeters": 1,
+        "map.totalDurationSeconds": 1,
+        "date_created": 1,
+        "last_updated": 1,
+    },
+    "detail": {"checkoutSessionObject": 0, "stripeEvent": 0},
+    "admin": None,
+}
+
+
+def _ride_out(doc: dict, fields: str):
+    return RideSummaryOut(**doc) if fields == "summary" else RideOut(**doc)
+
+
+async def get_ride(filter_dict: dict, fields: str = "admin") -> Optional[RideOut | RideSummaryOut]:
     if not filter_dict:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ride filter is required."
         )
     try:
-        result = await db.rides.find_one(filter_dict)
+        result = await db.rides.find_one(filter_dict, RIDE_PROJECTIONS[fields])
 
         if result is None:
             return None
 
-        return RideOut(**result)
+        return _ride_out(result, fields)
 
     except Exception as e:
         raise HTTPException(
@@ -59,22 +91,24 @@ async def get_ride(filter_dict: dict) -> Optional[RideOut]:
             detail=f"An error occurred while fetching ride: {str(e)}"
         )
     
-async def get_rides(filter_dict: Optional[dict] = None,start=0,stop=100) -> List[RideOut]:
+async def get_rides(filter_dict: Optional[dict] = None,start=0,stop=100,cursor: Optional[str] = None,fields: str = "admin") -> List[RideOut | RideSummaryOut]:
+    filter_dict = keyset_filter(filter_dict, cursor)
     try:
-        filter_dict = filter_dict or {}
         start = max(0, start or 0)
         if stop is None:
             stop = start + 100
         limit = max(0, stop - start)
 
-        cursor = (db.rides.find(filter_dict)
-        .skip(start)
+        docs = (db.rides.find(filter_dict, RIDE_PROJECTIONS[fields])
+        .sort("_id", 1)
+        # A cursor replaces the offset: the page starts right after it.
+        .skip(0 if cursor else start)
         .limit(limit)
         )
         ride_list = []
 
-        async for doc in cursor:
-            ride_list.append(RideOut(**doc))
+        async for doc in docs:
+            ride_list.append(_ride_out(doc, fields))
 
         return ride_list
 
@@ -108,6 +142,21 @@ async def update_ride(filter_dict: dict, ride_data: RideUpdate) -> RideOut:
     returnable_result = RideOut(**result)
     return returnable_result
 
+async def claim_ride(ride_id: ObjectId, driver_id: str, last_updated: int) -> Optional[RideOut]:
+    """Assigns driver_id in one compare-and-set; returns None if the ride was not open for a driver."""
+    result = await db.rides.find_one_and_update(
+        {"_id": ride_id, "driverId": None, "rideStatus": RideStatus.findingDriver.value},
+        {"$set": {
+            "driverId": driver_id,
+            "rideStatus": RideStatus.arrivingToPickup.value,
+            "last_updated": last_updated,
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if result is None:
+        return None
+    return RideOut(**result)
+
 async def delete_ride(filter_dict: dict):
     from bson import ObjectId
     from bson.errors import InvalidId
@@ -133,3 +182,23 @@ async def delete_ride(filter_dict: dict):
             detail="Ride not found."
         )
     return result
+
+
+async def find_rides_to_expire(filter_dict: dict, limit: int) -> List[dict]:
+    """Returns the _id, userId, driverId and rideStatus of up to limit matching rides."""
+    cursor = db.rides.find(
+        filter_dict,
+        {"_id": 1, "userId": 1, "driverId": 1, "rideStatus": 1},
+    ).limit(limit)
+    return [doc async for doc in cursor]
+
+
+async def delete_rides(filter_dict: dict) -> int:
+    """Deletes every ride matching filter_dict and returns how many were deleted."""
+    if not filter_dict:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ride filter is required."
+        )
+    result = await db.rides.delete_many(filter_dict)
+    return result.deleted_count
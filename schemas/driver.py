@@ -17,6 +17,7 @@ from security.hash import hash_password
 
 VEHICLE_MIN_YEAR = int(os.getenv("DRIVER_VEHICLE_MIN_YEAR", "2002"))
 VEHICLE_MAX_YEAR = int(os.getenv("DRIVER_VEHICLE_MAX_YEAR", str(time.gmtime().tm_year)))
+DRIVER_LOCATION_BATCH_MAX = int(os.getenv("DRIVER_LOCATION_BATCH_MAX", "500"))
 
 class DriverBase(BaseModel):
     # Add other fields here 
@@ -180,6 +181,15 @@ class DriverLocationUpdate(BaseModel):
     timestamp: int = Field(default_factory=lambda: int(time.time()))
 
 
+class DriverLocationBatch(BaseModel):
+    """GPS fixes a driver buffered while offline, oldest first."""
+    fixes: List[DriverLocationUpdate] = Field(min_length=1, max_length=DRIVER_LOCATION_BATCH_MAX)
+
+    def latest(self) -> DriverLocationUpdate:
+        # max() keeps the first of equal timestamps; prefer the last one sent.
+        return max(reversed(self.fixes), key=lambda fix: fix.timestamp)
+
+
 class DriverVehicleUpdate(BaseModel):
     vehicleType: VehicleType
     vehicleMake: str
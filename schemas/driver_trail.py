@@ -0,0 +1,21 @@
+# ============================================================================
+# DRIVER TRAIL SCHEMA
+# ============================================================================
+# Location fixes recorded while a driver is on a ride. Fixes are stored in
+# one document per driver, ride and time bucket.
+# ============================================================================
+
+from schemas.imports import *
+
+
+class TrailPoint(BaseModel):
+    latitude: float
+    longitude: float
+    timestamp: int
+    accuracy_m: Optional[float] = None
+
+
+class DriverTrailOut(BaseModel):
+    rideId: str
+    driverId: Optional[str] = None
+    points: List[TrailPoint] = Field(default_factory=list)
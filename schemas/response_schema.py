@@ -10,3 +10,8 @@ class APIResponse(GenericModel, Generic[T]):
     status_code: int
     data: Optional[T]
     detail: str
+
+
+class PaginatedAPIResponse(APIResponse[T], Generic[T]):
+    # Pass back as ?cursor= to get the next page; None on the last page.
+    next_cursor: Optional[str] = None
@@ -90,6 +90,46 @@ class RideOut(RideBase):
         }
 
 
+class RideRouteSummary(BaseModel):
+    totalDistanceMeters: int
+    totalDurationSeconds: int
+
+
+class RideSummaryOut(RideBase):
+    """A ride as shown in history lists, read with the "summary" projection."""
+    paymentStatus:bool = Field(default=False)
+    price: Optional[float] = None
+    rideStatus:Optional[RideStatus]=RideStatus.pendingPayment
+    driverId:Optional[str]=None
+    userId:str
+    map: Optional[RideRouteSummary] = None
+    id: Optional[str] = Field(
+        default=None,
+        validation_alias=AliasChoices("_id", "id"),
+        serialization_alias="id",
+    )
+    date_created: Optional[int] = Field(
+        default=None,
+        validation_alias=AliasChoices("date_created", "dateCreated"),
+        serialization_alias="dateCreated",
+    )
+    last_updated: Optional[int] = Field(
+        default=None,
+        validation_alias=AliasChoices("last_updated", "lastUpdated"),
+        serialization_alias="lastUpdated",
+    )
+
+    @model_validator(mode="before")
+    @classmethod
+    def convert_objectid(cls, values):
+        if "_id" in values and isinstance(values["_id"], ObjectId):
+            values["_id"] = str(values["_id"])
+        return values
+
+    class Config:
+        populate_by_name = True
+
+
 class RideShareLinkOut(BaseModel):
     shareId: str
     shareLink: str
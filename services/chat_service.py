@@ -8,7 +8,7 @@
 
 from bson import ObjectId
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional
 
 from repositories.chat import (
     create_chat,
@@ -113,13 +113,13 @@ async def retrieve_chat_by_chat_id(id: str) -> List[ChatOut]:
     return result
 
 
-async def retrieve_chats(start=0,stop=100) -> List[ChatOut]:
+async def retrieve_chats(start=0,stop=100,cursor: Optional[str] = None) -> List[ChatOut]:
     """Retrieves ChatOut Objects in a list
 
     Returns:
         _type_: ChatOut
     """
-    return await get_chats(start=start,stop=stop)
+    return await get_chats(start=start,stop=stop,cursor=cursor)
 
 
 async def update_chat_by_id(chat_id: str, chat_data: ChatUpdate) -> ChatOut:
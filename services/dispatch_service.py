@@ -0,0 +1,174 @@
+import os
+import time
+from typing import Optional
+
+from bson import ObjectId
+
+from core.redis_cache import async_redis
+from core.timer_wheel import timer_wheel
+from repositories.ride import get_rides
+from schemas.imports import RideStatus
+from schemas.sse import RideRequestEvent
+from services.sse_service import (
+    DRIVER_DISCOVERY_RADIUS_KM,
+    find_eligible_drivers,
+    notify_drivers_of_ride_request,
+)
+
+
+# Every ride is offered in waves while it waits for a driver; each wave only
+# reaches drivers who have not been offered the ride yet, so drivers coming
+# online near the pickup still hear about it.
+# "broadcast" offers each wave to every eligible driver within
+# DRIVER_DISCOVERY_RADIUS_KM. "nearest" offers it to the nearest
+# DISPATCH_BATCH_SIZE drivers, widening through DISPATCH_RING_RADII_KM and then
+# staying at the last ring.
+RIDE_DISPATCH_MODE = os.getenv("RIDE_DISPATCH_MODE", "broadcast").lower()
+DISPATCH_RING_RADII_KM = tuple(
+    float(radius) for radius in os.getenv("DISPATCH_RING_RADII_KM", "1,3,5,8").split(",")
+)
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "5"))
+DISPATCH_RING_INTERVAL_SECONDS = float(os.getenv("DISPATCH_RING_INTERVAL_SECONDS", "15"))
+DISPATCH_MAX_WAVES = int(os.getenv("DISPATCH_MAX_WAVES", "40"))
+DISPATCH_NOTIFIED_TTL_SECONDS = int(os.getenv("DISPATCH_NOTIFIED_TTL_SECONDS", "900"))
+DISPATCH_WAVE_TIMER = "dispatch_wave"
+
+# Rides in pendingPayment keep their waves scheduled but are only offered to
+# drivers again once payment moves them to findingDriver.
+_DISPATCHABLE_STATUSES = {RideStatus.pendingPayment, RideStatus.findingDriver}
+
+
+def _notified_key(ride_id: str) -> str:
+    return f"dispatch:notified:{ride_id}"
+
+
+def _dispatch_state_key(ride_id: str) -> str:
+    return f"dispatch:ride:{ride_id}"
+
+
+async def notify_nearest_drivers(
+    payload: RideRequestEvent,
+    pickup_location: tuple[float, float],
+    radius_km: float,
+    limit: Optional[int] = None,
+) -> int:
+    """
+    Notify the nearest eligible drivers within radius_km who have not yet been
+    offered this ride, at most limit (default DISPATCH_BATCH_SIZE, 0 for no
+    limit) of them. Returns how many were notified.
+    """
+    if limit is None:
+        limit = DISPATCH_BATCH_SIZE
+    started = time.perf_counter()
+    driver_ids = await find_eligible_drivers(
+        pickup_location,
+        payload.vehicle_type,
+        radius_km,
+        limit=limit,
+        skip_key=_notified_key(payload.ride_id),
+        skip_ttl_seconds=DISPATCH_NOTIFIED_TTL_SECONDS,
+    )
+    return await notify_drivers_of_ride_request(driver_ids, payload, started)
+
+
+async def _notify_wave(payload: RideRequestEvent, pickup_location: tuple[float, float], wave: int) -> int:
+    if RIDE_DISPATCH_MODE == "nearest":
+        radius_km = DISPATCH_RING_RADII_KM[min(wave, len(DISPATCH_RING_RADII_KM) - 1)]
+        return await notify_nearest_drivers(payload, pickup_location, radius_km)
+    return await notify_nearest_drivers(payload, pickup_location, DRIVER_DISCOVERY_RADIUS_KM, limit=0)
+
+
+async def dispatch_ride_request(
+    ride_id: str,
+    pickup: str,
+    destination: str,
+    vehicle_type: str,
+    fare_estimate: Optional[float],
+    rider_id: Optional[str],
+    pickup_location: Optional[tuple[float, float]] = None,
+) -> int:
+    """
+    Offer a new ride to drivers and schedule the following waves. Returns the
+    number of drivers notified in the first wave.
+    """
+    if not pickup_location:
+        return 0
+    payload = RideRequestEvent(
+        rideId=ride_id,
+        pickup=pickup,
+        destination=destination,
+        vehicleType=vehicle_type,
+        fareEstimate=fare_estimate,
+        riderId=rider_id,
+    )
+    state_key = _dispatch_state_key(ride_id)
+    pipe = async_redis.pipeline()
+    pipe.hset(
+        state_key,
+        mapping={
+            "payload": payload.model_dump_json(by_alias=True),
+            "latitude": pickup_location[0],
+            "longitude": pickup_location[1],
+            "wave": 0,
+        },
+    )
+    pipe.expire(state_key, DISPATCH_NOTIFIED_TTL_SECONDS)
+    await pipe.execute()
+
+    notified = await _notify_wave(payload, pickup_location, 0)
+    await timer_wheel.schedule(DISPATCH_WAVE_TIMER, ride_id, DISPATCH_RING_INTERVAL_SECONDS)
+    return notified
+
+
+async def stop_dispatch(ride_id: str) -> None:
+    """Stop offering a ride, e.g. once a driver has taken it."""
+    await timer_wheel.cancel(DISPATCH_WAVE_TIMER, ride_id)
+    await async_redis.delete(_dispatch_state_key(ride_id), _notified_key(ride_id))
+
+
+async def run_dispatch_waves(ride_ids: list[str]) -> None:
+    """
+    Timer handler: run the next wave for each ride still waiting for a driver
+    and stop dispatching the rest. Ride states are loaded with one query.
+    """
+    pipe = async_redis.pipeline()
+    for ride_id in ride_ids:
+        pipe.hgetall(_dispatch_state_key(ride_id))
+    states = await pipe.execute()
+
+    object_ids = [ObjectId(ride_id) for ride_id in ride_ids if ObjectId.is_valid(ride_id)]
+    rides = await get_rides({"_id": {"$in": object_ids}}, start=0, stop=len(object_ids), fields="summary")
+    rides_by_id = {ride.id: ride for ride in rides}
+
+    for ride_id, state in zip(ride_ids, states):
+        ride = rides_by_id.get(ride_id)
+        if (
+            not state
+            or ride is None
+            or ride.driverId
+            or ride.rideStatus not in _DISPATCHABLE_STATUSES
+        ):
+            await stop_dispatch(ride_id)
+            continue
+
+        wave = int(state.get("wave") or 0)
+        state_key = _dispatch_state_key(ride_id)
+        pipe = async_redis.pipeline()
+        if ride.rideStatus == RideStatus.findingDriver:
+            wave += 1
+            if wave >= DISPATCH_MAX_WAVES:
+                await stop_dispatch(ride_id)
+                continue
+            payload = RideRequestEvent.model_validate_json(state["payload"])
+            pickup_location = (float(state["latitude"]), float(state["longitude"]))
+            await _notify_wave(payload, pickup_location, wave)
+            pipe.hset(state_key, "wave", wave)
+        # Keep the state alive for as long as waves are scheduled; a ride can
+        # sit in pendingPayment for longer than the TTL.
+        pipe.expire(state_key, DISPATCH_NOTIFIED_TTL_SECONDS)
+        pipe.expire(_notified_key(ride_id), DISPATCH_NOTIFIED_TTL_SECONDS)
+        await pipe.execute()
+        await timer_wheel.schedule(DISPATCH_WAVE_TIMER, ride_id, DISPATCH_RING_INTERVAL_SECONDS)
+
+
+timer_wheel.register(DISPATCH_WAVE_TIMER, run_dispatch_waves)
@@ -7,10 +7,11 @@
 # ============================================================================
 
 import os
+import time
 from bson import ObjectId
 from fastapi import HTTPException
 from bson.errors import InvalidId
-from typing import List, Union
+from typing import List, Optional, Union
 
 from repositories.reset_token import(
     create_reset_token,
@@ -38,6 +39,7 @@ from schemas.driver import (
     DriverOut,
     DriverUpdatePassword,
     DriverUpdateAccountStatus,
+    DriverLocationBatch,
     DriverLocationUpdate,
     DriverUpdateProfile,
     DriverVehicleUpdate,
@@ -50,10 +52,17 @@ from authlib.integrations.starlette_client import OAuth
 
 from services.email_service import send_ban_warning, send_otp
 from services.sse_service import (
+    cached_driver_profile,
+    driver_location_is_redundant,
+    driver_location_is_stale,
+    get_driver_presence,
     publish_ride_request,
     publish_ride_request_to_driver,
+    sync_driver_presence_status,
     update_driver_presence,
 )
+from services.eta_service import push_eta_if_due
+from services.trail_service import get_driver_active_ride, record_trail_fixes
 from services.background_check_service import ensure_background_record, fetch_background_check
 
 oauth = OAuth()
@@ -128,13 +137,13 @@ async def retrieve_driver_by_driver_id(id: str) -> DriverOut:
     return result
 
 
-async def retrieve_drivers(start=0,stop=100) -> List[DriverOut]:
+async def retrieve_drivers(start=0,stop=100,cursor: Optional[str] = None) -> List[DriverOut]:
     """Retrieves DriverOut Objects in a list
 
     Returns:
         _type_: DriverOut
     """
-    return await get_drivers(start=start,stop=stop)
+    return await get_drivers(start=start,stop=stop,cursor=cursor)
 
 async def authenticate_driver(user_data:DriverBase )->DriverOut:
     user = await get_driver(filter_dict={"email":user_data.email.lower()})
@@ -324,6 +333,9 @@ async def update_driver_by_id_admin_func(
             status_code=404, detail="Driver not found or update failed"
         )
 
+    # 6️⃣ Move an online driver into or out of the discoverable GEO shard
+    await sync_driver_presence_status(driver_id, account_status=driver_data.accountStatus)
+
     return result
 
 async def update_driver_by_stripe_account_id(stripe_account_id: str, driver_data: DriverUpdate) -> DriverOut:
@@ -347,22 +359,95 @@ async def update_driver_by_stripe_account_id(stripe_account_id: str, driver_data
     return result
 
 
-async def update_driver_location(driver_id: str, location: DriverLocationUpdate) -> None:
+async def update_driver_location(driver_id: str, location: DriverLocationUpdate, track_ride: bool = True) -> bool:
+    """
+    Stores a driver's location ping. The account status, profile flag and
+    vehicle type come from the presence hash while it is fresh, so most pings
+    never touch Mongo, and pings that barely moved are dropped.
+
+    Raises:
+        HTTPException 400: Invalid driver ID format or vehicle details not set
+        HTTPException 403: Driver account is not active
+
+    Returns:
+        bool: False when the ping was dropped as redundant or older than the
+        stored one
+    """
     if not ObjectId.is_valid(driver_id):
         raise HTTPException(status_code=400, detail="Invalid driver ID format")
-    driver = await retrieve_driver_by_driver_id(id=driver_id)
-    if not getattr(driver, "profileComplete", False):
+    presence = stored_presence = await get_driver_presence(driver_id)
+    profile = cached_driver_profile(presence)
+    if profile is None:
+        driver = await retrieve_driver_by_driver_id(id=driver_id)
+        vehicle_type = getattr(driver, "vehicleType", None)
+        profile = {
+            "account_status": getattr(driver, "accountStatus", None),
+            "profile_complete": getattr(driver, "profileComplete", False),
+            "vehicle_type": str(vehicle_type) if vehicle_type else None,
+            "profile_checked_at": int(time.time()),
+        }
+        # A fresh profile is always written back, even for a redundant ping.
+        presence = {}
+    if (profile["account_status"] or "").lower() != AccountStatus.ACTIVE.value.lower():
+        raise HTTPException(status_code=403, detail="Driver account is not active")
+    if not profile["profile_complete"]:
         raise HTTPException(status_code=400, detail="Vehicle details must be set before updating location")
-    vehicle_type = getattr(driver, "vehicleType", None)
+    # Fix times come from the phone's clock; one running ahead must not
+    # store a last_seen that makes every real ping after it look stale.
+    now = int(time.time())
+    if location.timestamp > now:
+        location = location.model_copy(update={"timestamp": now})
+    # An older fix must never move the driver back in the GEO index.
+    if driver_location_is_stale(stored_presence, location.timestamp, now):
+        return False
+    if driver_location_is_redundant(presence, location.latitude, location.longitude, location.timestamp):
+        return False
     await update_driver_presence(
         driver_id=driver_id,
         latitude=location.latitude,
         longitude=location.longitude,
-        vehicle_type=str(vehicle_type) if vehicle_type else None,
-        profile_complete=getattr(driver, "profileComplete", False),
+        vehicle_type=profile["vehicle_type"],
+        profile_complete=profile["profile_complete"],
         timestamp=location.timestamp,
-        account_status=getattr(driver, "accountStatus", None),
+        account_status=profile["account_status"],
+        profile_checked_at=profile["profile_checked_at"],
+        previous_shard=stored_presence.get("geo_shard"),
     )
+    if track_ride:
+        await _track_active_ride(driver_id, [location], location)
+    return True
+
+
+async def _track_active_ride(
+    driver_id: str,
+    fixes: List[DriverLocationUpdate],
+    latest: DriverLocationUpdate,
+    push_eta: bool = True,
+) -> None:
+    """Adds fixes to the trail of the driver's active ride and pushes the rider a live ETA."""
+    try:
+        active_ride = await get_driver_active_ride(driver_id)
+        if not active_ride:
+            return
+        await record_trail_fixes(driver_id, active_ride["ride_id"], fixes)
+        if push_eta:
+            await push_eta_if_due(driver_id, active_ride, latest.latitude, latest.longitude)
+    except Exception as e:
+        print(f"Warning: Failed to track active ride for driver {driver_id}: {e}")
+
+
+async def update_driver_location_batch(driver_id: str, batch: DriverLocationBatch) -> bool:
+    """
+    Applies a burst of buffered GPS fixes in one call; only the most recent
+    fix is written to the driver's presence and GEO index, and only if it is
+    newer than the stored one. Every fix is added to the trail of the ride the
+    driver is on.
+    """
+    latest = batch.latest()
+    updated = await update_driver_location(driver_id, latest, track_ride=False)
+    # A late batch still fills in the trail; only a stored fix updates the ETA.
+    await _track_active_ride(driver_id, batch.fixes, latest, push_eta=updated)
+    return updated
 
 
 async def update_driver_vehicle(driver_id: str, vehicle_details: DriverVehicleUpdate) -> DriverOut:
@@ -372,6 +457,11 @@ async def update_driver_vehicle(driver_id: str, vehicle_details: DriverVehicleUp
     result = await update_driver(filter_dict, vehicle_details)
     if not result:
         raise HTTPException(status_code=404, detail="Driver not found or update failed")
+    await sync_driver_presence_status(
+        driver_id,
+        profile_complete=getattr(result, "profileComplete", False),
+        vehicle_type=getattr(result, "vehicleType", None),
+    )
     return result
 
 
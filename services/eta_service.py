@@ -0,0 +1,137 @@
+# ============================================================================
+# ETA SERVICE
+# ============================================================================
+# Live ETAs for riders, estimated from the assigned driver's location pings
+# and the ride's stored route without calling the Maps API.
+# ============================================================================
+
+import os
+import time
+from typing import Optional
+
+from core.geo import haversine_m
+from schemas.imports import RideStatus
+from services.sse_service import publish_ride_status_update
+from services.trail_service import update_driver_active_ride
+
+
+# Straight-line distance times this factor approximates the road distance.
+ETA_ROAD_FACTOR = float(os.getenv("ETA_ROAD_FACTOR", "1.3"))
+# Used when the ride has no stored route to take an average speed from.
+ETA_DEFAULT_SPEED_KMH = float(os.getenv("ETA_DEFAULT_SPEED_KMH", "30"))
+# A changed ETA is pushed to the rider at most this often.
+ETA_PUSH_INTERVAL_SECONDS = int(os.getenv("ETA_PUSH_INTERVAL_SECONDS", "30"))
+# A driver this close to the end of a leg has reached that stop and is on
+# the next leg.
+ETA_STOP_ARRIVAL_M = float(os.getenv("ETA_STOP_ARRIVAL_M", "150"))
+
+
+def _float(record: dict, field: str) -> Optional[float]:
+    try:
+        return float(record[field])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _speed_mps(distance_m: Optional[float], duration_s: Optional[float]) -> float:
+    if distance_m and duration_s:
+        return distance_m / duration_s
+    return ETA_DEFAULT_SPEED_KMH / 3.6
+
+
+def route_legs(active_ride: dict) -> list[tuple[float, float, float, float]]:
+    """(end latitude, end longitude, distance_m, duration_s) of each leg of the ride's route."""
+    legs = []
+    for leg in (active_ride.get("route_legs") or "").split(";"):
+        try:
+            latitude, longitude, distance_m, duration_s = (float(part) for part in leg.split(","))
+        except ValueError:
+            return []
+        legs.append((latitude, longitude, distance_m, duration_s))
+    return legs
+
+
+def current_leg(active_ride: dict, latitude: float, longitude: float) -> int:
+    """
+    Index of the leg the driver is on. It starts from the stored leg and only
+    moves forward, so a route that passes the same place twice is not
+    mistaken for an earlier leg.
+    """
+    legs = route_legs(active_ride)
+    leg = int(_float(active_ride, "leg") or 0)
+    if active_ride.get("status") != RideStatus.drivingToDestination.value:
+        return leg
+    while leg < len(legs) - 1 and haversine_m(latitude, longitude, *legs[leg][:2]) <= ETA_STOP_ARRIVAL_M:
+        leg += 1
+    return leg
+
+
+def estimate_eta_minutes(active_ride: dict, latitude: float, longitude: float) -> Optional[int]:
+    """
+    Minutes until the driver reaches the pickup (arrivingToPickup) or the
+    destination (drivingToDestination), or None when it cannot be estimated.
+
+    To the pickup, the straight-line distance is driven at the route's average
+    speed. To the destination, the distance to the end of the current leg is
+    driven at that leg's speed, plus the durations of the legs after it.
+    """
+    status = active_ride.get("status")
+    if status == RideStatus.arrivingToPickup.value:
+        pickup_latitude = _float(active_ride, "pickup_latitude")
+        pickup_longitude = _float(active_ride, "pickup_longitude")
+        if pickup_latitude is None or pickup_longitude is None:
+            return None
+        distance_m = haversine_m(latitude, longitude, pickup_latitude, pickup_longitude) * ETA_ROAD_FACTOR
+        speed_mps = _speed_mps(_float(active_ride, "route_distance_m"), _float(active_ride, "route_duration_s"))
+        remaining_s = distance_m / speed_mps
+    elif status == RideStatus.drivingToDestination.value:
+        legs = route_legs(active_ride)
+        if not legs:
+            return None
+        leg = min(current_leg(active_ride, latitude, longitude), len(legs) - 1)
+        end_latitude, end_longitude, leg_distance_m, leg_duration_s = legs[leg]
+        distance_m = haversine_m(latitude, longitude, end_latitude, end_longitude) * ETA_ROAD_FACTOR
+        remaining_s = distance_m / _speed_mps(leg_distance_m, leg_duration_s)
+        remaining_s += sum(duration_s for *_, duration_s in legs[leg + 1:])
+    else:
+        return None
+    return max(1, round(remaining_s / 60))
+
+
+async def push_eta_if_due(
+    driver_id: str,
+    active_ride: dict,
+    latitude: float,
+    longitude: float,
+    now: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Push the rider a ride_status_update with a fresh ETA when it changed and
+    the last push is at least ETA_PUSH_INTERVAL_SECONDS old. Returns the
+    minutes pushed, or None if nothing was sent.
+    """
+    leg = current_leg(active_ride, latitude, longitude)
+    if str(leg) != active_ride.get("leg", "0"):
+        await update_driver_active_ride(driver_id, {"leg": leg})
+        active_ride = {**active_ride, "leg": str(leg)}
+
+    eta_minutes = estimate_eta_minutes(active_ride, latitude, longitude)
+    if eta_minutes is None or not active_ride.get("rider_id"):
+        return None
+    now = int(time.time()) if now is None else now
+    last_minutes = active_ride.get("eta_minutes")
+    last_pushed_at = _float(active_ride, "eta_pushed_at")
+    if last_pushed_at is not None and (
+        str(eta_minutes) == last_minutes or now - last_pushed_at < ETA_PUSH_INTERVAL_SECONDS
+    ):
+        return None
+
+    await update_driver_active_ride(driver_id, {"eta_minutes": eta_minutes, "eta_pushed_at": now})
+    await publish_ride_status_update(
+        ride_id=active_ride["ride_id"],
+        status=RideStatus(active_ride["status"]),
+        rider_id=active_ride["rider_id"],
+        driver_id=None,
+        eta_minutes=eta_minutes,
+    )
+    return eta_minutes
@@ -8,7 +8,7 @@
 
 from bson import ObjectId
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional
 
 from repositories.payout import (
     create_payout,
@@ -70,7 +70,7 @@ async def retrieve_payout_by_payout_id(id: str,driverId:str) -> PayoutOut:
 
  
 
-async def retrieve_payouts(driverId:str,start=0,stop=100) -> List[PayoutOut]:
+async def retrieve_payouts(driverId:str,start=0,stop=100,cursor: Optional[str] = None) -> List[PayoutOut]:
     """Retrieves PayoutOut Objects in a list
 
     Returns:
@@ -80,7 +80,7 @@ async def retrieve_payouts(driverId:str,start=0,stop=100) -> List[PayoutOut]:
         raise HTTPException(status_code=400, detail="Invalid payout ID format")
 
     filter_dict = {"driverId":driverId}
-    result = await get_payouts(filter_dict,start=start,stop=stop)
+    result = await get_payouts(filter_dict,start=start,stop=stop,cursor=cursor)
     return result
 
 
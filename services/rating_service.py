@@ -107,13 +107,13 @@ async def retrieve_rating_by_user_id(user_id: str) -> RatingSummary:
     return result
 
 
-async def retrieve_ratings(start=0,stop=100) -> List[RatingOut]:
+async def retrieve_ratings(start=0,stop=100,cursor: Optional[str] = None) -> List[RatingOut]:
     """Retrieves RatingOut Objects in a list
 
     Returns:
         _type_: RatingOut
     """
-    return await get_ratings(start=start,stop=stop)
+    return await get_ratings(start=start,stop=stop,cursor=cursor)
 
 
 async def update_rating_by_id(rating_id: str, rating_data: RatingUpdate) -> RatingOut:
@@ -10,85 +10,174 @@ import os
 import time
 import uuid
 from decimal import Decimal
-from core.scheduler import scheduler
 from fastapi import status
 from bson import ObjectId
 from fastapi import Depends, HTTPException
-from typing import List
-from datetime import datetime, timedelta
-from datetime import timezone
-utc = timezone.utc
+from typing import List, Optional
 from core.payments import PaymentService, get_payment_service
-from services.sse_service import publish_ride_status_update, publish_ride_request
+from core.timer_wheel import timer_wheel
+from services.sse_service import publish_ride_status_update, publish_ride_status_updates
+from services.dispatch_service import dispatch_ride_request, stop_dispatch
+from services.trail_service import clear_driver_active_ride, set_driver_active_ride, update_driver_active_ride
 from core.redis_cache import async_redis
-from core.metrics import match_time_seconds, driver_acceptance_rate, driver_rejects
+from core.metrics import match_time_seconds, driver_acceptance_rate, driver_rejects, ride_claim_conflicts
 from repositories.ride import (
     check_if_user_has_an_existing_active_ride,
+    claim_ride,
     create_ride,
     get_ride,
     get_rides,
     update_ride,
     delete_ride,
+    delete_rides,
+    find_rides_to_expire,
 )
 from schemas.imports import ALLOWED_RIDE_STATUS_TRANSITIONS, RIDE_REFUND_RULES, RideStatus
-from schemas.ride import RideCreate, RideUpdate, RideOut, RideShareLinkOut
+from schemas.ride import RideCreate, RideUpdate, RideOut, RideShareLinkOut, RideSummaryOut
 
 
 FRONTEND_SHARE_RIDE_URL = os.getenv("FRONTEND_SHARE_RIDE_URL", "http://localhost:8080/share/ride")
+# Rides still waiting for payment or a driver this long after their last
+# update are deleted by sweep_expired_rides. It runs every
+# RIDE_EXPIRY_SWEEP_SECONDS as one recurring timer on the timer wheel, so only
+# the worker holding the timer's lease sweeps.
+RIDE_PENDING_PAYMENT_EXPIRY_SECONDS = int(os.getenv("RIDE_PENDING_PAYMENT_EXPIRY_SECONDS", "200"))
+RIDE_FINDING_DRIVER_EXPIRY_SECONDS = int(os.getenv("RIDE_FINDING_DRIVER_EXPIRY_SECONDS", "300"))
+RIDE_EXPIRY_SWEEP_SECONDS = int(os.getenv("RIDE_EXPIRY_SWEEP_SECONDS", "30"))
+RIDE_EXPIRY_SWEEP_BATCH_SIZE = int(os.getenv("RIDE_EXPIRY_SWEEP_BATCH_SIZE", "1000"))
+RIDE_EXPIRY_TIMER = "ride_expiry"
+RIDE_EXPIRY_SWEEP_ID = "sweep"
+RIDE_EXPIRY_MESSAGES = {
+    RideStatus.pendingPayment.value: "Ride expired before it was paid for",
+    RideStatus.findingDriver.value: "Ride expired before it could be matched with a driver",
+}
+# Only the first accept for a ride reaches Mongo; later ones are turned away by
+# this Redis lock until it expires.
+RIDE_CLAIM_LOCK_SECONDS = int(os.getenv("RIDE_CLAIM_LOCK_SECONDS", "300"))
+# Rides per page of a rider's or driver's history.
+RIDE_HISTORY_PAGE_SIZE = int(os.getenv("RIDE_HISTORY_PAGE_SIZE", "100"))
+
+
+def _ride_claim_key(ride_id: str) -> str:
+    return f"ride:claim:{ride_id}"
+
+
+
+async def stop_dispatch_unless_waiting(ride_id: str, new_status: RideStatus):
+    """Stops the driver dispatch waves once a ride no longer waits for a driver."""
+    if new_status in (RideStatus.findingDriver, RideStatus.pendingPayment):
+        return
+    try:
+        await stop_dispatch(ride_id)
+    except Exception as e:
+        print(f"Warning: Failed to stop dispatch for ride {ride_id}: {e}")
+
+
+async def sync_driver_active_ride(ride: RideOut, new_status: RideStatus):
+    """
+    Keeps the driver's active ride record (used for the location trail and
+    live ETAs) in step with the ride: created when they take it, updated as
+    the status moves on and removed once it is finished.
+    """
+    if not ride or not ride.driverId:
+        return
+    try:
+        if new_status == RideStatus.arrivingToPickup:
+            await set_driver_active_ride(ride.driverId, ride)
+        elif new_status in (RideStatus.completed, RideStatus.canceled):
+            await clear_driver_active_ride(ride.driverId)
+        else:
+            await update_driver_active_ride(ride.driverId, {"status": new_status.value})
+    except Exception as e:
+        print(f"Warning: Failed to update active ride for driver {ride.driverId}: {e}")
+
+
+def _expired_rides_filter(now: int) -> dict:
+    return {"$or": [
+        {
+            "rideStatus": RideStatus.pendingPayment.value,
+            "last_updated": {"$lt": now - RIDE_PENDING_PAYMENT_EXPIRY_SECONDS},
+            "paymentStatus": False,
+        },
+        {
+            "rideStatus": RideStatus.findingDriver.value,
+            "last_updated": {"$lt": now - RIDE_FINDING_DRIVER_EXPIRY_SECONDS},
+        },
+    ]}
+
+
+async def sweep_expired_rides() -> int:
+    """
+    Deletes rides still waiting for payment or a driver past their expiry and
+    tells their riders, a batch of RIDE_EXPIRY_SWEEP_BATCH_SIZE rides at a
+    time: one find, one delete_many and one pipelined SSE publish per batch.
+    Returns the number of rides deleted.
+    """
+    removed = 0
+    while True:
+        expired_filter = _expired_rides_filter(int(time.time()))
+        rides = await find_rides_to_expire(expired_filter, RIDE_EXPIRY_SWEEP_BATCH_SIZE)
+        if not rides:
+            return removed
+        ride_ids = [ride["_id"] for ride in rides]
+        # Repeating the expiry filter keeps rides that changed since the find.
+        deleted = await delete_rides({"_id": {"$in": ride_ids}, **expired_filter})
+        removed += deleted
+        if deleted < len(rides):
+            # Only this sweep deletes expired rides, so the ones still there
+            # are the ones that changed.
+            kept = {ride.id for ride in await get_rides({"_id": {"$in": ride_ids}}, start=0, stop=len(ride_ids), fields="summary")}
+            rides = [ride for ride in rides if str(ride["_id"]) not in kept]
+        try:
+            await publish_ride_status_updates(
+                {
+                    "ride_id": str(ride["_id"]),
+                    "status": RideStatus.canceled,
+                    "rider_id": ride.get("userId"),
+                    "driver_id": ride.get("driverId"),
+                    "message": RIDE_EXPIRY_MESSAGES.get(ride.get("rideStatus"), "Ride expired"),
+                }
+                for ride in rides
+            )
+        except Exception as e:
+            print(f"Warning: Failed to emit SSE updates for expired rides: {e}")
+        if len(ride_ids) < RIDE_EXPIRY_SWEEP_BATCH_SIZE:
+            return removed
+
+
+async def schedule_ride_expiry_sweep():
+    """
+    Makes sure the recurring expiry sweep timer exists. Every worker calls
+    this on startup; a timer that is already scheduled or being swept is left
+    alone.
+    """
+    await timer_wheel.schedule(RIDE_EXPIRY_TIMER, RIDE_EXPIRY_SWEEP_ID, 0, nx=True)
+
+
+async def run_ride_expiry_sweep(timer_ids: List[str]):
+    """
+    Timer handler: sweeps expired rides and schedules the next sweep. The
+    claimed timer is leased to this worker, so sweeps never overlap while one
+    finishes within TIMER_WHEEL_LEASE_SECONDS.
+    """
+    try:
+        await sweep_expired_rides()
+    finally:
+        await timer_wheel.schedule(RIDE_EXPIRY_TIMER, RIDE_EXPIRY_SWEEP_ID, RIDE_EXPIRY_SWEEP_SECONDS)
+
+
+timer_wheel.register(RIDE_EXPIRY_TIMER, run_ride_expiry_sweep)
 
 
+# APScheduler jobs persisted before expiry moved to the timer wheel still
+# fire; they only make sure the sweep timer exists.
 async def check_if_state_is_still_pending_payment_and_delete_ride_if_it_is_still_pending_payment(ride_id:str):
-    from celery_worker import celery_app
-    print("Currently running the scheduled task check if state still pending payment")
-    filter_dict = {"_id": ObjectId(ride_id)}
-    ride =await get_ride(filter_dict=filter_dict)
-   
-    if ride:
-        if (ride.rideStatus==RideStatus.pendingPayment) and (ride.paymentStatus==False):
-            if ride.last_updated is None:
-                return
-            if time.time() - ride.last_updated >= 200:
-              
-                celery_app.send_task(
-                "celery_worker.run_async_task",
-                args=[
-                    "delete_ride",       # function path
-                    {"ride_id": ride_id} # kwargs
-                        ]
-                    )
-            else:
-                run_time = datetime.now(utc) + timedelta(seconds=240)
-                scheduler.add_job(
-                check_if_state_is_still_pending_payment_and_delete_ride_if_it_is_still_pending_payment,
-                trigger="date",run_date=run_time, kwargs={ "ride_id": ride.id },misfire_grace_time=31536000
-                )
-                pass
-        
+    await schedule_ride_expiry_sweep()
+
+
 async def check_if_state_is_still_finding_driver_and_6_mins_have_passed_if_so_delete_the_ride(ride_id:str):
-    from celery_worker import celery_app
-    filter_dict = {"_id": ObjectId(ride_id)}
-    print("Currently running the scheduled task check if state still finding driver")
-    ride =await get_ride(filter_dict=filter_dict)
-    if ride:
-        if (ride.rideStatus==RideStatus.findingDriver):
-            if ride.last_updated is None:
-                return
-            if time.time() - ride.last_updated >= 300:
-                celery_app.send_task(
-                "celery_worker.run_async_task",
-                args=[
-                    "delete_ride",       # function path
-                    {"ride_id": ride_id} # kwargs
-                        ]
-                    )
-            else:
-                run_time = datetime.now(utc) + timedelta(seconds=240)
-                scheduler.add_job(
-                check_if_state_is_still_finding_driver_and_6_mins_have_passed_if_so_delete_the_ride,
-                trigger="date",run_date=run_time, kwargs={ "ride_id": ride.id },misfire_grace_time=31536000
-                )
-                 
-    
+    await schedule_ride_expiry_sweep()
+
 
 async def add_ride(
     ride_data: RideCreate,
@@ -124,7 +213,7 @@ async def add_ride(
         pickup_location = None
         if ride.origin:
             pickup_location = (ride.origin.latitude, ride.origin.longitude)
-        await publish_ride_request(
+        await dispatch_ride_request(
             ride_id=ride.id,
             pickup=ride.pickup,
             destination=ride.destination,
@@ -136,16 +225,6 @@ async def add_ride(
     except Exception:
         pass
     
-    pending_state_removal_run_time = datetime.now(utc) + timedelta(seconds=240)
-
-    scheduler.add_job(
-    check_if_state_is_still_pending_payment_and_delete_ride_if_it_is_still_pending_payment,
-    trigger="date",run_date=pending_state_removal_run_time, kwargs={ "ride_id": ride.id },misfire_grace_time=31536000
-    )
-    scheduler.add_job(
-    check_if_state_is_still_finding_driver_and_6_mins_have_passed_if_so_delete_the_ride,
-    trigger="date",run_date=pending_state_removal_run_time, kwargs={ "ride_id": ride.id },misfire_grace_time=31536000
-    )
     return ride
 
 
@@ -175,7 +254,7 @@ async def add_ride_admin_func(
         pickup_location = None
         if ride.origin:
             pickup_location = (ride.origin.latitude, ride.origin.longitude)
-        await publish_ride_request(
+        await dispatch_ride_request(
             ride_id=ride.id,
             pickup=ride.pickup,
             destination=ride.destination,
@@ -208,7 +287,7 @@ async def remove_ride(ride_id: str):
 
     return True
     
-async def retrieve_ride_by_ride_id(id: str) -> RideOut:
+async def retrieve_ride_by_ride_id(id: str, fields: str = "admin") -> RideOut:
     """Retrieves ride object based specific Id 
 
     Raises:
@@ -222,7 +301,7 @@ async def retrieve_ride_by_ride_id(id: str) -> RideOut:
         raise HTTPException(status_code=400, detail="Invalid ride ID format")
 
     filter_dict = {"_id": ObjectId(id)}
-    result = await get_ride(filter_dict)
+    result = await get_ride(filter_dict, fields=fields)
 
     if not result:
         raise HTTPException(status_code=404, detail="Ride not found")
@@ -231,7 +310,7 @@ async def retrieve_ride_by_ride_id(id: str) -> RideOut:
 
 
 
-async def retrieve_rides_by_user_id(user_id: str) -> List[RideOut]:
+async def retrieve_rides_by_user_id(user_id: str, cursor: Optional[str] = None, fields: str = "summary") -> List[RideSummaryOut | RideOut]:
     """Retrieves ride object based specific Id 
 
     Raises:
@@ -245,7 +324,7 @@ async def retrieve_rides_by_user_id(user_id: str) -> List[RideOut]:
         raise HTTPException(status_code=400, detail="Invalid ride ID format")
 
     filter_dict = {"userId": user_id}
-    result = await get_rides(filter_dict)
+    result = await get_rides(filter_dict, stop=RIDE_HISTORY_PAGE_SIZE, cursor=cursor, fields=fields)
 
     if not result:
         return []
@@ -253,7 +332,7 @@ async def retrieve_rides_by_user_id(user_id: str) -> List[RideOut]:
     return result
 
 
-async def retrieve_rides_by_driver_id(driver_id: str) -> List[RideOut]:
+async def retrieve_rides_by_driver_id(driver_id: str, cursor: Optional[str] = None, fields: str = "summary") -> List[RideSummaryOut | RideOut]:
     """Retrieves ride object based specific Id 
 
     Raises:
@@ -267,16 +346,16 @@ async def retrieve_rides_by_driver_id(driver_id: str) -> List[RideOut]:
         raise HTTPException(status_code=400, detail="Invalid ride ID format")
 
     filter_dict = {"driverId": driver_id}
-    result = await get_rides(filter_dict)
+    result = await get_rides(filter_dict, stop=RIDE_HISTORY_PAGE_SIZE, cursor=cursor, fields=fields)
 
-    if not result:
+    if not result and not cursor:
         raise HTTPException(status_code=404, detail="Ride not found")
 
     return result
 
 
 
-async def retrieve_rides_by_user_id_and_ride_id(user_id: str,ride_id:str) -> RideOut:
+async def retrieve_rides_by_user_id_and_ride_id(user_id: str,ride_id:str, fields: str = "admin") -> RideOut:
     """Retrieves ride object based specific Id 
 
     Raises:
@@ -293,7 +372,7 @@ async def retrieve_rides_by_user_id_and_ride_id(user_id: str,ride_id:str) -> Rid
         raise HTTPException(status_code=400, detail="Invalid ride ID format")
 
     filter_dict = {"userId": user_id,"_id":ObjectId(ride_id)}
-    result = await get_ride(filter_dict)
+    result = await get_ride(filter_dict, fields=fields)
 
     if not result:
         raise HTTPException(status_code=404, detail="Ride not found")
@@ -347,16 +426,16 @@ async def retrieve_shared_ride_by_share_id(share_id: str) -> RideOut:
     ride_id = payload.get("ride_id")
     if not ride_id:
         raise HTTPException(status_code=404, detail="Share link not found")
-    return await retrieve_ride_by_ride_id(id=ride_id)
+    return await retrieve_ride_by_ride_id(id=ride_id, fields="detail")
 
 
-async def retrieve_rides(start=0,stop=100) -> List[RideOut]:
+async def retrieve_rides(start=0,stop=100,cursor: Optional[str] = None) -> List[RideOut]:
     """Retrieves RideOut Objects in a list
 
     Returns:
         _type_: RideOut
     """
-    return await get_rides(start=start,stop=stop)
+    return await get_rides(start=start,stop=stop,cursor=cursor)
 
 
 async def update_ride_by_id(
@@ -392,15 +471,15 @@ async def update_ride_by_id(
 
     # Driver concurrency guard:
     # - If ride already has a driver and it's not this driver, block.
-    # - If ride has no driver yet, allow this driver to claim without filtering by driverId.
+    # - If ride has no driver yet, only match while it is still unassigned so a
+    #   concurrent claim cannot be overwritten.
     if driver_id:
         if ride.driverId and ride.driverId != driver_id:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Ride already assigned to another driver",
             )
-        if ride.driverId:
-            filter_dict["driverId"] = driver_id
+        filter_dict["driverId"] = ride.driverId
 
     # 4️⃣ Prevent no-op updates
     if (
@@ -479,6 +558,8 @@ async def update_ride_by_id(
 
     # 8️⃣ Emit SSE status update if status changed
     if ride_data.rideStatus is not None and ride_data.rideStatus != ride.rideStatus:
+        await stop_dispatch_unless_waiting(ride_id, ride_data.rideStatus)
+        await sync_driver_active_ride(result, ride_data.rideStatus)
         try:
             await publish_ride_status_update(
                 ride_id=ride_id,
@@ -506,6 +587,70 @@ async def update_ride_by_id(
 
 
 
+async def accept_ride_for_driver(ride_id: str, driver_id: str) -> RideOut:
+    """
+    Assign a ride that is still finding a driver to driver_id.
+
+    Concurrent accepts race on a Redis SET NX lock, so losers get a 409 after a
+    single round-trip without touching Mongo; the winner then claims the ride
+    with one compare-and-set on {driverId: null, rideStatus: findingDriver}.
+
+    Raises:
+        HTTPException 400: Invalid ride ID format
+        HTTPException 409: Ride already taken or no longer finding a driver
+    """
+    if not ObjectId.is_valid(ride_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid ride ID format",
+        )
+
+    claim_key = _ride_claim_key(ride_id)
+    if not await async_redis.set(claim_key, driver_id, nx=True, ex=RIDE_CLAIM_LOCK_SECONDS):
+        ride_claim_conflicts.labels(stage="lock").inc()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ride already assigned to another driver",
+        )
+
+    ride = None
+    try:
+        ride = await claim_ride(ObjectId(ride_id), driver_id, int(time.time()))
+    finally:
+        if ride is None:
+            # Not claimed (taken, canceled, missing or the update failed); let a
+            # later accept retry instead of holding the lock until it expires.
+            await async_redis.delete(claim_key)
+    if ride is None:
+        ride_claim_conflicts.labels(stage="database").inc()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Ride is no longer available",
+        )
+
+    await stop_dispatch_unless_waiting(ride_id, ride.rideStatus)
+    await sync_driver_active_ride(ride, ride.rideStatus)
+    try:
+        await publish_ride_status_update(
+            ride_id=ride_id,
+            status=ride.rideStatus,
+            rider_id=ride.userId,
+            driver_id=driver_id,
+            message=f"Ride status changed to {ride.rideStatus.value}",
+        )
+    except Exception as e:
+        print(f"Warning: Failed to emit SSE update for ride {ride_id}: {e}")
+
+    try:
+        if ride.date_created:
+            match_time_seconds.observe(max(time.time() - ride.date_created, 0))
+        driver_acceptance_rate.inc()
+    except Exception:
+        pass
+
+    return ride
+
+
 async def update_ride_by_id_admin_func(ride_id: str, ride_data: RideUpdate ) -> RideOut:
     """updates an entry of ride in the database
 
@@ -550,6 +695,8 @@ async def update_ride_by_id_admin_func(ride_id: str, ride_data: RideUpdate ) ->
 
     # Emit SSE status update if status changed
     if ride_data.rideStatus is not None and ride_data.rideStatus != ride.rideStatus:
+        await stop_dispatch_unless_waiting(ride_id, ride_data.rideStatus)
+        await sync_driver_active_ride(result, ride_data.rideStatus)
         try:
             await publish_ride_status_update(
                 ride_id=ride_id,
@@ -609,6 +756,8 @@ async def update_ride_with_ride_id(ride_id: str, payload: dict ) -> dict:
      
     # Emit SSE status update if status changed
     if ride_data.rideStatus is not None and current_ride and ride_data.rideStatus != current_ride.rideStatus:
+        await stop_dispatch_unless_waiting(ride_id, ride_data.rideStatus)
+        await sync_driver_active_ride(result, ride_data.rideStatus)
         try:            
             await publish_ride_status_update(
                 ride_id=ride_id,
@@ -1,23 +1,72 @@
 import asyncio
+import base64
+import json
 import os
 import time
 import uuid
+import zlib
 from typing import Iterable, Optional
 
 from fastapi import Request
 from pydantic import BaseModel
+from redis.exceptions import ResponseError
 
 from core.redis_cache import async_redis
-from core.metrics import sse_backlog
+from core.redis_scripts import (
+    ack_event_script,
+    backfill_driver_last_seen_script,
+    claim_due_events_script,
+    eligible_drivers_script,
+    publish_list_event_script,
+    publish_stream_event_script,
+    purge_stale_events_script,
+    refresh_session_script,
+    sweep_stale_drivers_script,
+)
+from core.geo import haversine_m
+from core.metrics import ride_request_first_notification_seconds, sse_backlog, sse_events_dropped
+from core.sse_hub import NOTIFY_EVENT, notify_channel, sse_hub
+from core.vehicles_config import VehicleType
 from schemas.sse import SSEEvent, RideStatusUpdate, ChatMessageEvent, RideRequestEvent, SSEEventType
 
 
 RETRY_AFTER_SECONDS = int(os.getenv("SSE_RETRY_AFTER_SECONDS", "5"))
+CLIENT_RETRY_MS = int(os.getenv("SSE_CLIENT_RETRY_MS", "3000"))
+SESSION_REFRESH_SECONDS = int(os.getenv("SSE_SESSION_REFRESH_SECONDS", "60"))
+SESSION_NOTIFY_PREFIX = "session:"
 EVENT_TTL_SECONDS = int(os.getenv("SSE_EVENT_TTL_SECONDS", "86400"))
-POLL_INTERVAL_SECONDS = float(os.getenv("SSE_POLL_INTERVAL_SECONDS", "1"))
 DRIVER_DISCOVERY_RADIUS_KM = float(os.getenv("DRIVER_DISCOVERY_RADIUS_KM", "5"))
 DRIVER_META_TTL_SECONDS = int(os.getenv("DRIVER_META_TTL_SECONDS", "120"))
 DRIVER_GEO_INDEX = os.getenv("DRIVER_GEO_INDEX", "drivers:geo_index")
+# Driver ids scored by last_seen, so the stale sweeper only reads expired ones.
+DRIVER_LAST_SEEN_INDEX = os.getenv("DRIVER_LAST_SEEN_INDEX", "drivers:last_seen")
+DRIVER_SWEEP_BATCH_SIZE = int(os.getenv("DRIVER_SWEEP_BATCH_SIZE", "1000"))
+# Where the sweeper's slow pass over the GEO index resumes on its next run.
+DRIVER_GEO_SCAN_OFFSET = f"{DRIVER_LAST_SEEN_INDEX}:geo_scan_offset"
+# Location pings closer than this to the last stored position, and sooner than
+# the interval after it, are dropped. The interval must stay below
+# DRIVER_META_TTL_SECONDS so an idle driver's presence does not expire.
+DRIVER_LOCATION_MIN_DISTANCE_M = float(os.getenv("DRIVER_LOCATION_MIN_DISTANCE_M", "15"))
+DRIVER_LOCATION_MIN_INTERVAL_SECONDS = int(os.getenv("DRIVER_LOCATION_MIN_INTERVAL_SECONDS", "30"))
+# How long the account status, profile flag and vehicle type kept in the
+# presence hash are trusted before the driver document is read again.
+DRIVER_PROFILE_CACHE_SECONDS = int(os.getenv("DRIVER_PROFILE_CACHE_SECONDS", "300"))
+# Drivers without a known vehicle type share the UNKNOWN shard.
+DRIVER_GEO_VEHICLE_SHARDS = (*(vehicle_type.value for vehicle_type in VehicleType), "UNKNOWN")
+# "list" delivers from a per-user pending list, "stream" from a per-user
+# Redis Stream read through a consumer group.
+SSE_DELIVERY_MODE = os.getenv("SSE_DELIVERY_MODE", "list").lower()
+# Oldest pending events are dropped beyond this many per user (list mode;
+# stream mode is capped by SSE_STREAM_MAXLEN). 0 disables the cap.
+MAX_BACKLOG = int(os.getenv("SSE_MAX_BACKLOG", "200"))
+# Event types where a newer event for a ride supersedes older pending ones.
+COALESCED_EVENT_TYPES = {SSEEventType.ride_status_update.value}
+STREAM_MAXLEN = int(os.getenv("SSE_STREAM_MAXLEN", "1000"))
+STREAM_READ_COUNT = int(os.getenv("SSE_STREAM_READ_COUNT", "100"))
+# Pre-rendered frames at least this large are stored zlib-compressed.
+COMPRESS_MIN_BYTES = int(os.getenv("SSE_COMPRESS_MIN_BYTES", "2048"))
+STREAM_GROUP = "sse"
+STREAM_CONSUMER = "client"
 
 
 def _pending_key(user_type: str, user_id: str) -> str:
@@ -28,6 +77,35 @@ def _event_key(event_id: str) -> str:
     return f"sse:event:{event_id}"
 
 
+# Index lists hold the subset of a user's pending ids with a given event type
+# or ride id, so filtered streams only scan matching ids. The ack script in
+# core.redis_scripts builds these keys itself and must stay in step.
+def _pending_type_key(user_type: str, user_id: str, event_type: str) -> str:
+    return f"{_pending_key(user_type, user_id)}:type:{event_type}"
+
+
+def _pending_ride_key(user_type: str, user_id: str, ride_id: str) -> str:
+    return f"{_pending_key(user_type, user_id)}:ride:{ride_id}"
+
+
+def _pending_scan_keys(
+    user_type: str,
+    user_id: str,
+    allowed_types: Optional[set[str]],
+    ride_id: Optional[str],
+) -> list[str]:
+    if ride_id:
+        return [_pending_ride_key(user_type, user_id, ride_id)]
+    if allowed_types:
+        return [_pending_type_key(user_type, user_id, t) for t in sorted(allowed_types)]
+    return [_pending_key(user_type, user_id)]
+
+
+def _stream_latest_key(user_type: str, user_id: str) -> str:
+    # Maps a ride id to the user's latest coalescable stream entry for it.
+    return f"{_stream_key(user_type, user_id)}:latest"
+
+
 def _subscribers_key(user_type: str) -> str:
     return f"sse:subscribers:{user_type}"
 
@@ -36,15 +114,96 @@ def _driver_presence_key(driver_id: str) -> str:
     return f"sse:driver_presence:{driver_id}"
 
 
+def _driver_geo_shard_key(vehicle_type: Optional[str], eligible: bool) -> str:
+    """
+    Discovery only searches the eligible shard for the requested vehicle type;
+    DRIVER_GEO_INDEX still holds every driver for cleanup and counts.
+    """
+    shard = vehicle_type if vehicle_type in DRIVER_GEO_VEHICLE_SHARDS else "UNKNOWN"
+    return f"{DRIVER_GEO_INDEX}:{shard}:{'eligible' if eligible else 'ineligible'}"
+
+
+def _driver_geo_shard_keys() -> list[str]:
+    return [
+        _driver_geo_shard_key(vehicle_type, eligible)
+        for vehicle_type in DRIVER_GEO_VEHICLE_SHARDS
+        for eligible in (True, False)
+    ]
+
+
+def _driver_is_eligible(account_status: Optional[str], profile_complete: bool) -> bool:
+    return (account_status or "").lower() == "active" and profile_complete
+
+
 def _active_session_key(user_type: str, user_id: str) -> str:
     return f"sse:session:{user_type}:{user_id}"
 
 
+def _stream_key(user_type: str, user_id: str) -> str:
+    return f"sse:stream:{user_type}:{user_id}"
+
+
+# List-mode ids start with the zero-padded publish time so index lists merge in
+# roughly publish order. They are made before the event is queued, so resuming
+# after a Last-Event-ID goes by position in the pending list, not by id.
+def _new_event_id() -> str:
+    return f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+
+def _stream_id_key(entry_id: Optional[str]) -> Optional[tuple[int, int]]:
+    if not entry_id:
+        return None
+    ms, _, seq = entry_id.partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return None
+
+
+def _coalesces(event_type: str, ride_id: Optional[str]) -> bool:
+    return bool(ride_id) and event_type in COALESCED_EVENT_TYPES
+
+
+def _record_dropped_events(coalesced: int, overflowed: int) -> None:
+    if coalesced:
+        sse_events_dropped.labels(reason="coalesced").inc(coalesced)
+    if overflowed:
+        sse_events_dropped.labels(reason="overflow").inc(overflowed)
+
+
 def _format_sse(event: SSEEvent) -> str:
     payload = event.model_dump_json(by_alias=True)
     return f"id: {event.id}\nevent: {event.event}\ndata: {payload}\n\n"
 
 
+# SSEEvent serializes "id" first, so a body rendered with an empty id can have
+# the real one spliced in front of the rest without parsing it.
+_EMPTY_ID_PREFIX = '{"id":""'
+
+
+def _encode_frame(text: str) -> tuple[str, str]:
+    """
+    Return (encoding, body) for storing a rendered frame in Redis. The client
+    decodes responses as text, so compressed bodies are base64 encoded.
+    """
+    raw = text.encode()
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return "", text
+    return "zlib", base64.b64encode(zlib.compress(raw)).decode()
+
+
+def _decode_frame(encoding: str, body: str) -> str:
+    if encoding == "zlib":
+        return zlib.decompress(base64.b64decode(body)).decode()
+    if encoding == "legacy":
+        return _format_sse(SSEEvent.model_validate_json(body))
+    return body
+
+
+def _event_ride_id(data: dict) -> Optional[str]:
+    return data.get("ride_id") or data.get("rideId")
+
+
 async def register_subscriber(user_type: str, user_id: str) -> None:
     await async_redis.sadd(_subscribers_key(user_type), user_id)
 
@@ -92,22 +251,144 @@ async def update_driver_presence(
     profile_complete: bool = False,
     timestamp: Optional[int] = None,
     account_status: Optional[str] = None,
+    profile_checked_at: Optional[int] = None,
+    previous_shard: Optional[str] = None,
 ) -> None:
+    """
+    Write a driver's position to the GEO indexes and presence hash.
+    previous_shard is the "geo_shard" field of the stored presence hash; the
+    driver is only removed from it when the shard changes. Without one (a
+    new or expired hash) every other shard is cleared.
+    """
     now = int(time.time()) if timestamp is None else int(timestamp)
-    await async_redis.geoadd(DRIVER_GEO_INDEX, {driver_id: (longitude, latitude)})
-    await set_driver_presence(
-        driver_id,
-        {
-            "vehicle_type": _normalize_vehicle_type(vehicle_type),
+    normalized_vehicle = _normalize_vehicle_type(vehicle_type)
+    normalized_status = (account_status or "").lower()
+    shard_key = _driver_geo_shard_key(
+        normalized_vehicle, _driver_is_eligible(normalized_status, profile_complete)
+    )
+    meta_key = _driver_presence_key(driver_id)
+    pipe = async_redis.pipeline()
+    pipe.geoadd(DRIVER_GEO_INDEX, (longitude, latitude, driver_id))
+    pipe.geoadd(shard_key, (longitude, latitude, driver_id))
+    pipe.zadd(DRIVER_LAST_SEEN_INDEX, {driver_id: now})
+    if previous_shard:
+        if previous_shard != shard_key:
+            pipe.zrem(previous_shard, driver_id)
+    else:
+        for other_key in _driver_geo_shard_keys():
+            if other_key != shard_key:
+                pipe.zrem(other_key, driver_id)
+    pipe.hset(
+        meta_key,
+        mapping={
+            "vehicle_type": normalized_vehicle or "",
             "latitude": latitude,
             "longitude": longitude,
             "last_seen": now,
             "profile_complete": "1" if profile_complete else "0",
-            "account_status": (account_status or "").lower(),
+            "account_status": normalized_status,
+            "geo_shard": shard_key,
+            **({"profile_checked_at": profile_checked_at} if profile_checked_at is not None else {}),
         },
     )
+    pipe.expire(meta_key, DRIVER_META_TTL_SECONDS)
+    await pipe.execute()
 
 
+def cached_driver_profile(presence: dict, now: Optional[int] = None) -> Optional[dict]:
+    """
+    Return the account status, profile flag and vehicle type cached in a
+    driver's presence hash, or None when they are missing or older than
+    DRIVER_PROFILE_CACHE_SECONDS.
+    """
+    now = int(time.time()) if now is None else now
+    try:
+        checked_at = int(float(presence["profile_checked_at"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if now - checked_at >= DRIVER_PROFILE_CACHE_SECONDS:
+        return None
+    return {
+        "account_status": presence.get("account_status") or None,
+        "profile_complete": presence.get("profile_complete") in {"1", "true", "True", "TRUE"},
+        "vehicle_type": presence.get("vehicle_type") or None,
+        "profile_checked_at": checked_at,
+    }
+
+
+def driver_location_is_stale(presence: dict, timestamp: int, now: Optional[int] = None) -> bool:
+    """
+    True when a fix is not newer than the stored one, e.g. a delayed or
+    replayed upload from an offline buffer. A stored last_seen from the
+    future (written before fixes were clamped) blocks nothing.
+    """
+    now = int(time.time()) if now is None else now
+    try:
+        last_seen = int(float(presence["last_seen"]))
+    except (KeyError, TypeError, ValueError):
+        return False
+    return last_seen <= now and timestamp <= last_seen
+
+
+def driver_location_is_redundant(presence: dict, latitude: float, longitude: float, timestamp: int) -> bool:
+    """
+    True when a ping moved less than DRIVER_LOCATION_MIN_DISTANCE_M from the
+    stored position within DRIVER_LOCATION_MIN_INTERVAL_SECONDS of it.
+    """
+    try:
+        last_latitude = float(presence["latitude"])
+        last_longitude = float(presence["longitude"])
+        last_seen = int(float(presence["last_seen"]))
+    except (KeyError, TypeError, ValueError):
+        return False
+    if timestamp - last_seen >= DRIVER_LOCATION_MIN_INTERVAL_SECONDS:
+        return False
+    return haversine_m(last_latitude, last_longitude, latitude, longitude) < DRIVER_LOCATION_MIN_DISTANCE_M
+
+
+async def sync_driver_presence_status(
+    driver_id: str,
+    account_status: Optional[str] = None,
+    profile_complete: Optional[bool] = None,
+    vehicle_type: Optional[str] = None,
+) -> None:
+    """
+    Move an online driver between GEO shards after an account status, profile
+    or vehicle change, without waiting for the next location update. Drivers
+    without live presence are left alone.
+    """
+    meta = await get_driver_presence(driver_id)
+    if not meta:
+        return
+    try:
+        latitude = float(meta["latitude"])
+        longitude = float(meta["longitude"])
+    except (KeyError, TypeError, ValueError):
+        return
+    if account_status is None:
+        account_status = meta.get("account_status")
+    if profile_complete is None:
+        profile_complete = meta.get("profile_complete") in {"1", "true", "True", "TRUE"}
+    await update_driver_presence(
+        driver_id,
+        latitude,
+        longitude,
+        vehicle_type or meta.get("vehicle_type"),
+        profile_complete=profile_complete,
+        timestamp=int(float(meta.get("last_seen") or time.time())),
+        account_status=account_status,
+        previous_shard=meta.get("geo_shard"),
+    )
+
+
+async def remove_driver_from_geo_index(driver_id: str) -> None:
+    pipe = async_redis.pipeline()
+    pipe.zrem(DRIVER_GEO_INDEX, driver_id)
+    pipe.zrem(DRIVER_LAST_SEEN_INDEX, driver_id)
+    for shard_key in _driver_geo_shard_keys():
+        pipe.zrem(shard_key, driver_id)
+    await pipe.execute()
+
 
 async def publish_event(
     user_type: str,
@@ -115,8 +396,49 @@ async def publish_event(
     event_type: str,
     data: BaseModel | dict,
 ) -> SSEEvent:
-    event_id = uuid.uuid4().hex
     payload = data.model_dump(by_alias=True) if isinstance(data, BaseModel) else data
+    if SSE_DELIVERY_MODE == "stream":
+        return await _publish_to_stream(user_type, user_id, event_type, payload)
+
+    event, keys, args = _list_event_script_args(user_type, user_id, event_type, payload)
+    coalesced, overflowed = await publish_list_event_script(keys=keys, args=args, client=async_redis)
+    _record_dropped_events(coalesced, overflowed)
+    return event
+
+
+async def publish_events(events: Iterable[tuple[str, str, str, BaseModel | dict]]) -> int:
+    """
+    Publish several (user_type, user_id, event_type, data) events in a single
+    pipelined round-trip. Returns the number of events published.
+    """
+    pipe = async_redis.pipeline(transaction=False)
+    count = 0
+    for user_type, user_id, event_type, data in events:
+        payload = data.model_dump(by_alias=True) if isinstance(data, BaseModel) else data
+        if SSE_DELIVERY_MODE == "stream":
+            _, keys, args = _stream_event_script_args(user_type, user_id, event_type, payload)
+            await publish_stream_event_script(keys=keys, args=args, client=pipe)
+        else:
+            _, keys, args = _list_event_script_args(user_type, user_id, event_type, payload)
+            await publish_list_event_script(keys=keys, args=args, client=pipe)
+        count += 1
+    if not count:
+        return 0
+    for result in await pipe.execute():
+        if SSE_DELIVERY_MODE == "stream":
+            _record_dropped_events(result[1], 0)
+        else:
+            _record_dropped_events(result[0], result[1])
+    return count
+
+
+def _list_event_script_args(
+    user_type: str,
+    user_id: str,
+    event_type: str,
+    payload: dict,
+) -> tuple[SSEEvent, list, list]:
+    event_id = _new_event_id()
     event = SSEEvent(
         id=event_id,
         event=event_type,
@@ -124,57 +446,493 @@ async def publish_event(
         created_at=int(time.time()),
     )
 
-    event_key = _event_key(event_id)
-    pending_key = _pending_key(user_type, user_id)
+    event_ride_id = _event_ride_id(payload)
+    keys = [
+        _event_key(event_id),
+        _pending_key(user_type, user_id),
+        _pending_type_key(user_type, user_id, event_type),
+    ]
+    if event_ride_id:
+        keys.append(_pending_ride_key(user_type, user_id, event_ride_id))
+    encoding, frame = _encode_frame(_format_sse(event))
+    fields = {
+        "frame": frame,
+        "encoding": encoding,
+        "user_type": user_type,
+        "user_id": user_id,
+        "event_type": event_type,
+        "ride_id": event_ride_id or "",
+        "last_sent_at": "0",
+    }
+    args = [
+        event_id,
+        _event_key(""),
+        EVENT_TTL_SECONDS,
+        MAX_BACKLOG,
+        event_type if _coalesces(event_type, event_ride_id) else "",
+        notify_channel(user_type, user_id),
+        NOTIFY_EVENT,
+        *(item for pair in fields.items() for item in pair),
+    ]
+    return event, keys, args
+
+
+async def _publish_to_stream(
+    user_type: str,
+    user_id: str,
+    event_type: str,
+    payload: dict,
+) -> SSEEvent:
+    """
+    Append an event to the user's stream. The stream entry id doubles as the
+    SSE event id, so acknowledging an event is a plain XACK on that id.
+
+    The id is only known once XADD returns, so the entry stores the rendered
+    data line without its leading id and the id is spliced in at send time.
+    """
+    created_at, keys, args = _stream_event_script_args(user_type, user_id, event_type, payload)
+    entry_id, coalesced = await publish_stream_event_script(keys=keys, args=args, client=async_redis)
+    _record_dropped_events(coalesced, 0)
+    return SSEEvent(id=entry_id, event=event_type, data=payload, created_at=created_at)
+
+
+def _stream_event_script_args(
+    user_type: str,
+    user_id: str,
+    event_type: str,
+    payload: dict,
+) -> tuple[int, list, list]:
+    created_at = int(time.time())
+    body = SSEEvent(id="", event=event_type, data=payload, created_at=created_at)
+    encoding, tail = _encode_frame(body.model_dump_json(by_alias=True)[len(_EMPTY_ID_PREFIX):])
+    event_ride_id = _event_ride_id(payload)
+    fields = {
+        "event_type": event_type,
+        "ride_id": event_ride_id or "",
+        "encoding": encoding,
+        "frame": tail,
+    }
+    keys = [_stream_key(user_type, user_id), _stream_latest_key(user_type, user_id)]
+    args = [
+        STREAM_MAXLEN,
+        EVENT_TTL_SECONDS,
+        event_ride_id if _coalesces(event_type, event_ride_id) else "",
+        notify_channel(user_type, user_id),
+        NOTIFY_EVENT,
+        *(item for pair in fields.items() for item in pair),
+    ]
+    return created_at, keys, args
+
+
+async def _ack_stream_event(user_type: str, user_id: str, event_id: str) -> bool:
+    stream_key = _stream_key(user_type, user_id)
     pipe = async_redis.pipeline()
-    pipe.hset(
-        event_key,
-        mapping={
-            "payload": event.model_dump_json(by_alias=True),
-            "user_type": user_type,
-            "user_id": user_id,
-            "event_type": event_type,
-            "created_at": str(event.created_at),
-            "last_sent_at": "0",
-        },
-    )
-    pipe.expire(event_key, EVENT_TTL_SECONDS)
-    pipe.rpush(pending_key, event_id)
-    await pipe.execute()
-    return event
+    pipe.xack(stream_key, STREAM_GROUP, event_id)
+    pipe.xdel(stream_key, event_id)
+    try:
+        acknowledged, _ = await pipe.execute()
+    except ResponseError:
+        # Malformed entry id or the stream/group has already expired.
+        return False
+    return bool(acknowledged)
 
 
 async def ack_event(user_type: str, user_id: str, event_id: str) -> bool:
-    event_key = _event_key(event_id)
-    record = await async_redis.hgetall(event_key)
-    if not record:
+    if SSE_DELIVERY_MODE == "stream":
+        return await _ack_stream_event(user_type, user_id, event_id)
+
+    acknowledged = await ack_event_script(
+        keys=[_event_key(event_id), _pending_key(user_type, user_id)],
+        args=[user_type, user_id, event_id],
+        client=async_redis,
+    )
+    return bool(acknowledged)
+
+
+class _DriverSession:
+    """
+    Tracks whether a driver connection still owns the driver's active session.
+
+    A new connection announces its session id on the driver's notify channel,
+    so older streams learn of a takeover from the wake-ups they already wait
+    on. The session key is only compared and refreshed every
+    SESSION_REFRESH_SECONDS, which also catches an announcement that was missed
+    while a hub was reconnecting.
+    """
+
+    def __init__(self, user_id: str):
+        self.session_id = uuid.uuid4().hex
+        self.active_key = _active_session_key("driver", user_id)
+        self._channel = notify_channel("driver", user_id)
+        self._next_refresh = 0.0
+
+    async def claim(self) -> None:
+        pipe = async_redis.pipeline()
+        pipe.set(self.active_key, self.session_id, ex=EVENT_TTL_SECONDS)
+        pipe.publish(self._channel, f"{SESSION_NOTIFY_PREFIX}{self.session_id}")
+        await pipe.execute()
+
+    def revoked_by(self, messages: list[str]) -> bool:
+        own = f"{SESSION_NOTIFY_PREFIX}{self.session_id}"
+        return any(
+            message.startswith(SESSION_NOTIFY_PREFIX) and message != own
+            for message in messages
+        )
+
+    async def lost(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return False
+        owned = await refresh_session_script(
+            keys=[self.active_key],
+            args=[self.session_id, EVENT_TTL_SECONDS],
+            client=async_redis,
+        )
+        self._next_refresh = now + SESSION_REFRESH_SECONDS
+        return not owned
+
+
+async def _session_lost(session: Optional[_DriverSession]) -> bool:
+    return session is not None and await session.lost()
+
+
+def _session_revoked(session: Optional[_DriverSession], messages: list[str]) -> bool:
+    return session is not None and session.revoked_by(messages)
+
+
+async def _wait_for_notification(queue: asyncio.Queue) -> list[str]:
+    """
+    Block until the hub signals new activity for this user, or until the
+    redelivery interval elapses. Returns every notification queued so far.
+    """
+    try:
+        messages = [await asyncio.wait_for(queue.get(), timeout=RETRY_AFTER_SECONDS)]
+    except asyncio.TimeoutError:
+        return []
+    while not queue.empty():
+        messages.append(queue.get_nowait())
+    return messages
+
+
+async def _claim_due_events(
+    scan_keys: list[str],
+    user_type: str,
+    user_id: str,
+    now: int,
+    allowed_types: Optional[set[str]],
+    ride_id: Optional[str],
+    resume_after: str = "",
+) -> tuple[int, int, list[str]]:
+    """
+    Pick the user's pending events that are due for (re)delivery and stamp
+    their last_sent_at in one atomic script call, so two tabs of the same user
+    cannot both claim an event inside the same redelivery interval.
+
+    scan_keys are the pending lists to read, normally from _pending_scan_keys.
+    Events queued at or before resume_after were already seen by the client
+    and are acknowledged rather than claimed.
+    Returns the number of ids scanned, the number of expired ids seen and the
+    claimed frames ready to send, in publish order.
+    """
+    result = await claim_due_events_script(
+        keys=scan_keys,
+        args=[
+            _event_key(""),
+            user_type,
+            user_id,
+            now,
+            RETRY_AFTER_SECONDS,
+            ride_id or "",
+            resume_after,
+            _pending_key(user_type, user_id),
+            *sorted(allowed_types or ()),
+        ],
+        client=async_redis,
+    )
+    backlog, stale, *claimed = result
+    frames = [
+        _decode_frame(encoding, body)
+        for encoding, body in zip(claimed[1::3], claimed[2::3])
+    ]
+    return int(backlog), int(stale), frames
+
+
+async def _pending_list_events(
+    request: Request,
+    user_type: str,
+    user_id: str,
+    allowed_types: Optional[set[str]],
+    ride_id: Optional[str],
+    session: Optional[_DriverSession],
+    queue: asyncio.Queue,
+    last_event_id: Optional[str],
+):
+    """
+    Deliver events from the user's pending lists. Redis is only read when the
+    hub signals a publish, or on the redelivery timer while events claimed
+    earlier are still unacknowledged; otherwise a timeout just sends a
+    keep-alive.
+    """
+    scan_keys = _pending_scan_keys(user_type, user_id, allowed_types, ride_id)
+    resume_after = last_event_id or ""
+    poll = True
+    while True:
+        if await request.is_disconnected():
+            break
+        if await _session_lost(session):
+            break
+
+        if not poll:
+            yield ": keep-alive\n\n"
+            messages = await _wait_for_notification(queue)
+            if _session_revoked(session, messages):
+                break
+            poll = bool(messages)
+            continue
+
+        backlog, stale, frames = await _claim_due_events(
+            scan_keys, user_type, user_id, int(time.time()), allowed_types, ride_id, resume_after
+        )
+        # The first claim acknowledges everything up to resume_after, so the
+        # pending list no longer holds it.
+        resume_after = ""
+        sse_backlog.observe(backlog)
+        if stale:
+            await purge_stale_events_script(
+                keys=scan_keys, args=[_event_key("")], client=async_redis
+            )
+
+        for frame in frames:
+            yield frame
+
+        if not frames:
+            yield ": keep-alive\n\n"
+        messages = await _wait_for_notification(queue)
+        if _session_revoked(session, messages):
+            break
+        # Live ids left in the pending lists are waiting for an ack (or for
+        # their redelivery interval) and need the timer to re-poll.
+        poll = bool(messages) or backlog > stale
+
+
+async def _ensure_stream_group(stream_key: str) -> None:
+    try:
+        await async_redis.xgroup_create(stream_key, STREAM_GROUP, id="0", mkstream=True)
+    except ResponseError as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+    await async_redis.expire(stream_key, EVENT_TTL_SECONDS)
+
+
+def _stream_entry_matches(
+    fields: Optional[dict],
+    allowed_types: Optional[set[str]],
+    ride_id: Optional[str],
+) -> bool:
+    if not fields:
         return False
-    if record.get("user_type") != user_type or record.get("user_id") != user_id:
+    if allowed_types and fields.get("event_type") not in allowed_types:
+        return False
+    if ride_id and fields.get("ride_id") != ride_id:
         return False
-
-    pipe = async_redis.pipeline()
-    pipe.lrem(_pending_key(user_type, user_id), 0, event_id)
-    pipe.delete(event_key)
-    await pipe.execute()
     return True
 
 
+def _format_stream_entry(entry_id: str, fields: dict) -> str:
+    if "frame" in fields:
+        tail = _decode_frame(fields.get("encoding", ""), fields["frame"])
+        return (
+            f"id: {entry_id}\nevent: {fields['event_type']}\n"
+            f'data: {{"id":"{entry_id}"{tail}\n\n'
+        )
+    # Entries written before frames were pre-rendered.
+    event = SSEEvent(
+        id=entry_id,
+        event=fields["event_type"],
+        data=json.loads(fields["data"]),
+        created_at=int(fields.get("created_at") or 0),
+    )
+    return _format_sse(event)
+
+
+async def _stream_entries(
+    request: Request,
+    user_type: str,
+    user_id: str,
+    allowed_types: Optional[set[str]],
+    ride_id: Optional[str],
+    session: Optional[_DriverSession],
+    queue: asyncio.Queue,
+    last_event_id: Optional[str],
+):
+    """
+    Deliver events from the user's Redis Stream through a consumer group.
+
+    Entries read but not acknowledged stay in the group's pending list and are
+    re-claimed with XAUTOCLAIM once idle for RETRY_AFTER_SECONDS, a page of
+    STREAM_READ_COUNT at a time from a cursor kept per connection. New entries
+    are read with XREADGROUP whenever the hub signals a publish. The timer
+    only re-polls while the pending list is not empty, so an idle connection
+    with nothing unacknowledged does not touch Redis at all. Entries at or
+    before the client's Last-Event-ID are skipped by comparing ids in process
+    and acknowledged.
+    """
+    stream_key = _stream_key(user_type, user_id)
+    resume_after = _stream_id_key(last_event_id)
+    # XAUTOCLAIM's cursor; "0-0" once it has walked the whole pending list.
+    claim_cursor = "0-0"
+    await _ensure_stream_group(stream_key)
+
+    poll = True
+    while True:
+        if await request.is_disconnected():
+            break
+        if await _session_lost(session):
+            break
+
+        if not poll:
+            yield ": keep-alive\n\n"
+            messages = await _wait_for_notification(queue)
+            if _session_revoked(session, messages):
+                break
+            poll = bool(messages)
+            continue
+
+        pipe = async_redis.pipeline(transaction=False)
+        pipe.xautoclaim(
+            stream_key,
+            STREAM_GROUP,
+            STREAM_CONSUMER,
+            min_idle_time=int(RETRY_AFTER_SECONDS * 1000),
+            start_id=claim_cursor,
+            count=STREAM_READ_COUNT,
+        )
+        pipe.xreadgroup(
+            STREAM_GROUP,
+            STREAM_CONSUMER,
+            {stream_key: ">"},
+            count=STREAM_READ_COUNT,
+        )
+        pipe.xlen(stream_key)
+        # After the read, so entries delivered just now count as pending.
+        pipe.xpending(stream_key, STREAM_GROUP)
+        try:
+            claimed, fresh, backlog, pending = await pipe.execute()
+        except ResponseError as exc:
+            # The stream (and its group) expired while the client was idle.
+            if "NOGROUP" not in str(exc):
+                raise
+            await _ensure_stream_group(stream_key)
+            claim_cursor = "0-0"
+            continue
+        sse_backlog.observe(backlog)
+
+        claim_cursor = claimed[0]
+        entries = list(claimed[1])
+        for _, stream_entries in fresh or []:
+            entries.extend(stream_entries)
+
+        seen = [
+            entry_id for entry_id, _ in entries
+            if resume_after and _stream_id_key(entry_id) <= resume_after
+        ]
+        if seen:
+            # Already delivered before the reconnect; acknowledge them so they
+            # are not claimed again on every tick.
+            pipe = async_redis.pipeline(transaction=False)
+            pipe.xack(stream_key, STREAM_GROUP, *seen)
+            pipe.xdel(stream_key, *seen)
+            await pipe.execute()
+
+        sent_any = False
+        for entry_id, fields in entries:
+            if resume_after and _stream_id_key(entry_id) <= resume_after:
+                continue
+            if _stream_entry_matches(fields, allowed_types, ride_id):
+                sent_any = True
+                yield _format_stream_entry(entry_id, fields)
+
+        if claim_cursor != "0-0":
+            # More idle entries are waiting past this page; claim them now.
+            continue
+        if not sent_any:
+            yield ": keep-alive\n\n"
+        messages = await _wait_for_notification(queue)
+        if _session_revoked(session, messages):
+            break
+        poll = bool(messages) or pending["pending"] > len(seen)
+
+
+async def _filtered_stream_entries(
+    request: Request,
+    user_type: str,
+    user_id: str,
+    allowed_types: Optional[set[str]],
+    ride_id: Optional[str],
+    session: Optional[_DriverSession],
+    queue: asyncio.Queue,
+    last_event_id: Optional[str],
+):
+    """
+    Deliver a filtered subscription (event types or a ride) from the user's
+    Redis Stream without the consumer group.
+
+    Entries are read with XRANGE from a cursor kept per connection and
+    matched in process, so entries this connection skips are never left in
+    the group's pending list, and redelivery stays with the user's unfiltered
+    connections. Acknowledged entries are deleted from the stream, so a
+    reconnect reads every unacknowledged entry after its Last-Event-ID.
+    Redis is only read when the hub signals a publish.
+    """
+    stream_key = _stream_key(user_type, user_id)
+    resume_after = _stream_id_key(last_event_id)
+    cursor = f"({resume_after[0]}-{resume_after[1]}" if resume_after else "-"
+
+    poll = True
+    while True:
+        if await request.is_disconnected():
+            break
+        if await _session_lost(session):
+            break
+
+        if not poll:
+            yield ": keep-alive\n\n"
+            messages = await _wait_for_notification(queue)
+            if _session_revoked(session, messages):
+                break
+            poll = bool(messages)
+            continue
+
+        entries = await async_redis.xrange(stream_key, min=cursor, max="+", count=STREAM_READ_COUNT)
+        sent_any = False
+        for entry_id, fields in entries:
+            if _stream_entry_matches(fields, allowed_types, ride_id):
+                sent_any = True
+                yield _format_stream_entry(entry_id, fields)
+        if entries:
+            cursor = f"({entries[-1][0]}"
+
+        if len(entries) == STREAM_READ_COUNT:
+            # A full page; read the rest now.
+            continue
+        if not sent_any:
+            yield ": keep-alive\n\n"
+        messages = await _wait_for_notification(queue)
+        if _session_revoked(session, messages):
+            break
+        poll = bool(messages)
+
+
 async def stream_events(
     request: Request,
     user_type: str,
     user_id: str,
     event_types: Optional[Iterable[str | SSEEventType]] = None,
     ride_id: Optional[str] = None,
+    last_event_id: Optional[str] = None,
 ):
     await register_subscriber(user_type, user_id)
-    session_id = None
-    active_key = None
-    if user_type == "driver":
-        session_id = uuid.uuid4().hex
-        active_key = _active_session_key(user_type, user_id)
-        await async_redis.set(active_key, session_id, ex=EVENT_TTL_SECONDS)
-
-    pending_key = _pending_key(user_type, user_id)
+
     if event_types:
         allowed_types = {
             event_type.value if isinstance(event_type, SSEEventType) else event_type
@@ -183,62 +941,42 @@ async def stream_events(
     else:
         allowed_types = None
 
-    try:
-        while True:
-            if await request.is_disconnected():
-                break
-            if session_id and active_key:
-                current_session = await async_redis.get(active_key)
-                if current_session != session_id:
-                    break
-                await async_redis.expire(active_key, EVENT_TTL_SECONDS)
-
-            now = int(time.time())
-            pending_ids = await async_redis.lrange(pending_key, 0, -1)
-            sse_backlog.observe(len(pending_ids))
-            sent_any = False
-
-            for event_id in pending_ids:
-                event_key = _event_key(event_id)
-                record = await async_redis.hgetall(event_key)
-                if not record:
-                    await async_redis.lrem(pending_key, 0, event_id)
-                    continue
-
-                if record.get("user_type") != user_type or record.get("user_id") != user_id:
-                    continue
-
-                last_sent_at = int(float(record.get("last_sent_at") or 0))
-                if now - last_sent_at < RETRY_AFTER_SECONDS:
-                    continue
-
-                payload = record.get("payload")
-                if not payload:
-                    await async_redis.lrem(pending_key, 0, event_id)
-                    await async_redis.delete(event_key)
-                    continue
-
-                event = SSEEvent.model_validate_json(payload)
-                if allowed_types and event.event not in allowed_types:
-                    continue
-                if ride_id:
-                    event_ride_id = event.data.get("ride_id") or event.data.get("rideId")
-                    if event_ride_id != ride_id:
-                        continue
-
-                await async_redis.hset(event_key, "last_sent_at", str(now))
-                sent_any = True
-                yield _format_sse(event)
+    if SSE_DELIVERY_MODE == "stream":
+        # Filtered connections must not consume entries through the shared
+        # group, or the entries they skip would stay pending there.
+        deliver = _filtered_stream_entries if allowed_types or ride_id else _stream_entries
+    else:
+        deliver = _pending_list_events
 
-            if not sent_any:
-                yield ": keep-alive\n\n"
-            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+    queue = sse_hub.subscribe(user_type, user_id)
+    session = _DriverSession(user_id) if user_type == "driver" else None
+    try:
+        if session:
+            # Claimed after subscribing so older streams in this worker hear the
+            # announcement too; this stream ignores its own.
+            await session.claim()
+        yield f"retry: {CLIENT_RETRY_MS}\n\n"
+        async for chunk in deliver(
+            request,
+            user_type,
+            user_id,
+            allowed_types,
+            ride_id,
+            session,
+            queue,
+            last_event_id,
+        ):
+            yield chunk
     finally:
-        if session_id and active_key:
-            current_session = await async_redis.get(active_key)
-            if current_session == session_id:
-                await async_redis.delete(active_key)
+        sse_hub.unsubscribe(user_type, user_id, queue)
+        if session:
+            current_session = await async_redis.get(session.active_key)
+            if current_session == session.session_id:
+                await async_redis.delete(session.active_key)
                 await delete_driver_presence(user_id)
+                # An offline driver must stop being offered rides right away
+                # rather than when the stale sweeper next runs.
+                await remove_driver_from_geo_index(user_id)
                 await unregister_subscriber(user_type, user_id)
         else:
             await unregister_subscriber(user_type, user_id)
@@ -264,6 +1002,26 @@ async def publish_ride_status_update(
         await publish_event("driver", driver_id, "ride_status_update", payload)
 
 
+async def publish_ride_status_updates(updates: Iterable[dict]) -> int:
+    """
+    publish_ride_status_update for many rides in one Redis round-trip; each
+    update takes the same keyword arguments.
+    """
+    events = []
+    for update in updates:
+        payload = RideStatusUpdate(
+            rideId=update["ride_id"],
+            status=update["status"],
+            message=update.get("message"),
+            etaMinutes=update.get("eta_minutes"),
+        )
+        if update.get("rider_id"):
+            events.append(("rider", update["rider_id"], "ride_status_update", payload))
+        if update.get("driver_id"):
+            events.append(("driver", update["driver_id"], "ride_status_update", payload))
+    return await publish_events(events)
+
+
 async def publish_chat_message(
     chat_id: str,
     ride_id: str,
@@ -300,54 +1058,65 @@ async def publish_ride_request_to_drivers(
     if pickup_lat is None or pickup_lng is None:
         return 0
 
-    requested_vehicle = _normalize_vehicle_type(payload.vehicle_type)
-    count = 0
-    driver_ids = await async_redis.georadius(
-        name=DRIVER_GEO_INDEX,
-        longitude=pickup_lng,
-        latitude=pickup_lat,
-        radius=DRIVER_DISCOVERY_RADIUS_KM,
-        unit="km",
+    started = time.perf_counter()
+    driver_ids = await find_eligible_drivers(
+        (pickup_lat, pickup_lng), payload.vehicle_type, DRIVER_DISCOVERY_RADIUS_KM
     )
-    for driver_id in driver_ids:
-        meta = await get_driver_presence(driver_id)
-        if not meta:
-            continue
-        if meta.get("account_status") not in {"active"}:
-            continue
-
-        if meta.get("profile_complete") not in {"1", "true", "True", "TRUE"}:
-            continue
-
-        driver_vehicle = _normalize_vehicle_type(meta.get("vehicle_type"))
-        if requested_vehicle and driver_vehicle and driver_vehicle != requested_vehicle:
-            continue
+    return await notify_drivers_of_ride_request(driver_ids, payload, started)
 
-        if requested_vehicle and not driver_vehicle:
-            continue
 
-        driver_lat = meta.get("latitude")
-        driver_lng = meta.get("longitude")
-        if pickup_lat is None or pickup_lng is None or driver_lat is None or driver_lng is None:
-            continue
-
-        try:
-            driver_lat = float(driver_lat)
-            driver_lng = float(driver_lng)
-        except (TypeError, ValueError):
-            continue
+async def find_eligible_drivers(
+    pickup_location: tuple[float, float],
+    vehicle_type: Optional[str],
+    radius_km: float,
+    limit: int = 0,
+    skip_key: Optional[str] = None,
+    skip_ttl_seconds: int = 0,
+) -> list[str]:
+    """
+    Return eligible drivers within radius_km of the pickup, nearest first, in
+    one script call. With skip_key, drivers already in that set are passed
+    over and the returned ones are added to it.
+    """
+    pickup_lat, pickup_lng = pickup_location
+    requested_vehicle = _normalize_vehicle_type(vehicle_type)
+    if requested_vehicle:
+        shard_keys = [_driver_geo_shard_key(requested_vehicle, True)]
+    else:
+        shard_keys = [_driver_geo_shard_key(v, True) for v in DRIVER_GEO_VEHICLE_SHARDS]
+    return await eligible_drivers_script(
+        keys=shard_keys,
+        args=[
+            _driver_presence_key(""),
+            pickup_lng,
+            pickup_lat,
+            radius_km,
+            requested_vehicle or "",
+            int(time.time()),
+            DRIVER_META_TTL_SECONDS,
+            limit,
+            skip_key or "",
+            skip_ttl_seconds,
+        ],
+        client=async_redis,
+    )
 
-        last_seen = meta.get("last_seen")
-        try:
-            last_seen = int(float(last_seen)) if last_seen is not None else None
-        except (TypeError, ValueError):
-            last_seen = None
-        if last_seen is None or (int(time.time()) - last_seen) > DRIVER_META_TTL_SECONDS:
-            continue
 
+async def notify_drivers_of_ride_request(
+    driver_ids: Iterable[str],
+    payload: RideRequestEvent,
+    started: float,
+) -> int:
+    """
+    Publish the ride request to each driver. started is the perf_counter
+    reading the time-to-first-notification metric is measured from.
+    """
+    count = 0
+    for driver_id in driver_ids:
         await publish_event("driver", driver_id, "ride_request", payload)
+        if count == 0:
+            ride_request_first_notification_seconds.observe(time.perf_counter() - started)
         count += 1
-
     return count
 
 
@@ -393,25 +1162,29 @@ async def publish_ride_request(
 
 async def cleanup_stale_driver_locations() -> int:
     """
-    Remove drivers from the GEO index whose presence metadata is stale.
-    Returns the number of entries removed.
+    Remove drivers not seen for DRIVER_META_TTL_SECONDS from the GEO index,
+    its shards and presence. Only expired entries of the last-seen index are
+    read, in batches of DRIVER_SWEEP_BATCH_SIZE with one script call each.
+
+    Each run first scans one page of the GEO index and backfills last-seen
+    entries for members that have none (drivers indexed before the last-seen
+    index existed, or whose stream died without cleanup), so every member is
+    eventually swept.
+    Returns the number of drivers removed.
     """
-    now = int(time.time())
+    cutoff = int(time.time()) - DRIVER_META_TTL_SECONDS
+    await backfill_driver_last_seen_script(
+        keys=[DRIVER_GEO_INDEX, DRIVER_LAST_SEEN_INDEX, DRIVER_GEO_SCAN_OFFSET],
+        args=[_driver_presence_key(""), DRIVER_SWEEP_BATCH_SIZE],
+        client=async_redis,
+    )
     removed = 0
-    driver_ids = await async_redis.zrange(DRIVER_GEO_INDEX, 0, -1)
-    for driver_id in driver_ids:
-        meta = await get_driver_presence(driver_id)
-        if not meta:
-            await async_redis.zrem(DRIVER_GEO_INDEX, driver_id)
-            removed += 1
-            continue
-        last_seen = meta.get("last_seen")
-        try:
-            last_seen = int(float(last_seen)) if last_seen is not None else None
-        except (TypeError, ValueError):
-            last_seen = None
-        if last_seen is None or (now - last_seen) > DRIVER_META_TTL_SECONDS:
-            await async_redis.zrem(DRIVER_GEO_INDEX, driver_id)
-            await delete_driver_presence(driver_id)
-            removed += 1
-    return removed
+    while True:
+        swept = await sweep_stale_drivers_script(
+            keys=[DRIVER_LAST_SEEN_INDEX, DRIVER_GEO_INDEX, *_driver_geo_shard_keys()],
+            args=[_driver_presence_key(""), cutoff, DRIVER_SWEEP_BATCH_SIZE],
+            client=async_redis,
+        )
+        removed += swept
+        if swept < DRIVER_SWEEP_BATCH_SIZE:
+            return removed
@@ -0,0 +1,118 @@
+# ============================================================================
+# DRIVER TRAIL SERVICE
+# ============================================================================
+# Records the location fixes of drivers on a ride so the route can be
+# reconstructed later. The ride a driver is on (ids, status, pickup point,
+# route totals and legs) is kept in a Redis hash so location pings can record
+# the trail and estimate ETAs without reading the ride.
+# ============================================================================
+
+import os
+from collections import defaultdict
+from typing import Iterable
+
+from googlemaps.convert import decode_polyline
+
+from core.geo import route_leg_ends
+from core.redis_cache import async_redis
+from repositories.driver_trail import append_trail_points, get_trail_points_for_ride
+from schemas.driver import DriverLocationUpdate
+from schemas.driver_trail import DriverTrailOut, TrailPoint
+from schemas.ride import RideOut
+
+
+DRIVER_TRAIL_BUCKET_SECONDS = int(os.getenv("DRIVER_TRAIL_BUCKET_SECONDS", "300"))
+# Safety net for rides that never reach a terminal status.
+DRIVER_ACTIVE_RIDE_TTL_SECONDS = int(os.getenv("DRIVER_ACTIVE_RIDE_TTL_SECONDS", str(6 * 3600)))
+
+
+def _active_ride_key(driver_id: str) -> str:
+    return f"driver:active_ride:{driver_id}"
+
+
+def _encode_route_legs(route) -> str:
+    """
+    The route's legs as "lat,lng,distance_m,duration_s" of each leg's end
+    point, joined by ";". The end points are located on the route polyline,
+    since the legs themselves only carry addresses.
+    """
+    legs = [(leg.distanceMeters, leg.durationSeconds) for leg in route.legs]
+    if not legs:
+        legs = [(route.totalDistanceMeters, route.totalDurationSeconds)]
+    try:
+        points = [(point["lat"], point["lng"]) for point in decode_polyline(route.encodedPolyline)]
+    except (IndexError, TypeError, ValueError):
+        return ""
+    ends = route_leg_ends(points, [distance for distance, _ in legs])
+    return ";".join(
+        f"{latitude},{longitude},{distance},{duration}"
+        for (latitude, longitude), (distance, duration) in zip(ends, legs)
+    )
+
+
+async def set_driver_active_ride(driver_id: str, ride: RideOut) -> None:
+    key = _active_ride_key(driver_id)
+    record = {
+        "ride_id": ride.id,
+        "rider_id": ride.userId,
+        "status": ride.rideStatus.value if ride.rideStatus else "",
+    }
+    if ride.origin:
+        record["pickup_latitude"] = ride.origin.latitude
+        record["pickup_longitude"] = ride.origin.longitude
+    if ride.map:
+        record["route_distance_m"] = ride.map.totalDistanceMeters
+        record["route_duration_s"] = ride.map.totalDurationSeconds
+        record["route_legs"] = _encode_route_legs(ride.map)
+        record["leg"] = 0
+    pipe = async_redis.pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping=record)
+    pipe.expire(key, DRIVER_ACTIVE_RIDE_TTL_SECONDS)
+    await pipe.execute()
+
+
+async def update_driver_active_ride(driver_id: str, fields: dict) -> None:
+    """Updates fields of the driver's active ride record, if they still have one."""
+    key = _active_ride_key(driver_id)
+    if await async_redis.exists(key):
+        await async_redis.hset(key, mapping=fields)
+
+
+async def get_driver_active_ride(driver_id: str) -> dict:
+    return await async_redis.hgetall(_active_ride_key(driver_id))
+
+
+async def clear_driver_active_ride(driver_id: str) -> None:
+    await async_redis.delete(_active_ride_key(driver_id))
+
+
+async def record_trail_fixes(driver_id: str, ride_id: str, fixes: Iterable[DriverLocationUpdate]) -> int:
+    """Appends fixes to the ride's trail. Returns the number of fixes recorded."""
+    buckets: dict[int, list[dict]] = defaultdict(list)
+    for fix in fixes:
+        bucket = fix.timestamp - fix.timestamp % DRIVER_TRAIL_BUCKET_SECONDS
+        buckets[bucket].append(
+            TrailPoint(
+                latitude=fix.latitude,
+                longitude=fix.longitude,
+                timestamp=fix.timestamp,
+                accuracy_m=fix.accuracy_m,
+            ).model_dump(exclude_none=True)
+        )
+    await append_trail_points(driver_id, ride_id, buckets)
+    return sum(len(points) for points in buckets.values())
+
+
+async def retrieve_ride_trail(ride_id: str) -> DriverTrailOut:
+    """Returns every recorded fix of a ride in time order."""
+    buckets = await get_trail_points_for_ride(ride_id)
+    points = sorted(
+        (point for bucket in buckets for point in bucket.get("points", [])),
+        key=lambda point: point["timestamp"],
+    )
+    return DriverTrailOut(
+        rideId=ride_id,
+        driverId=buckets[0].get("driverId") if buckets else None,
+        points=points,
+    )
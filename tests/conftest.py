@@ -0,0 +1,36 @@
+import fakeredis
+import pytest
+import pytest_asyncio
+
+import services.dispatch_service as dispatch_service
+import services.sse_service as sse_service
+from core.sse_hub import SSEHub
+
+
+class FakeRequest:
+    def __init__(self, headers: dict | None = None):
+        self.headers = headers or {}
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest_asyncio.fixture
+async def fake_redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    hub = SSEHub(
+        fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+        poll_seconds=0.01,
+    )
+    monkeypatch.setattr(sse_service, "async_redis", client)
+    monkeypatch.setattr(sse_service, "sse_hub", hub)
+    monkeypatch.setattr(dispatch_service, "async_redis", client)
+    yield client
+    await hub.stop()
+
+
+@pytest.fixture
+def fake_request():
+    return FakeRequest()
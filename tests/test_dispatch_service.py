@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+import services.dispatch_service as dispatch_service
+import services.sse_service as sse_service
+from core.timer_wheel import RedisTimerWheel
+from schemas.imports import RideStatus
+from schemas.sse import RideRequestEvent
+
+
+PICKUP = (6.5244, 3.3792)
+
+
+async def _add_drivers(count: int) -> list[str]:
+    # About 0.45km apart heading north from the pickup.
+    driver_ids = []
+    for n in range(count):
+        driver_id = f"d{n}"
+        await sse_service.update_driver_presence(
+            driver_id, PICKUP[0] + 0.004 * (n + 1), PICKUP[1], "CAR",
+            profile_complete=True, account_status="active",
+        )
+        driver_ids.append(driver_id)
+    return driver_ids
+
+
+async def _notified(fake_redis, driver_ids: list[str]) -> list[str]:
+    return [
+        driver_id for driver_id in driver_ids
+        if await fake_redis.llen(sse_service._pending_key("driver", driver_id))
+    ]
+
+
+def _payload(ride_id: str = "ride1") -> RideRequestEvent:
+    return RideRequestEvent(
+        rideId=ride_id, pickup="A", destination="B", vehicleType="CAR",
+        fareEstimate=10.0, riderId="r1",
+    )
+
+
+@pytest.mark.asyncio
+async def test_nearest_drivers_are_notified_first_and_only_once(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    driver_ids = await _add_drivers(8)
+
+    assert await dispatch_service.notify_nearest_drivers(_payload(), PICKUP, 5, limit=3) == 3
+    assert await _notified(fake_redis, driver_ids) == driver_ids[:3]
+
+    assert await dispatch_service.notify_nearest_drivers(_payload(), PICKUP, 5, limit=3) == 3
+    assert await _notified(fake_redis, driver_ids) == driver_ids[:6]
+
+
+@pytest.mark.asyncio
+async def test_waves_widen_until_the_ride_is_taken(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    monkeypatch.setattr(dispatch_service, "RIDE_DISPATCH_MODE", "nearest")
+    monkeypatch.setattr(dispatch_service, "DISPATCH_RING_RADII_KM", (1, 3, 5))
+    monkeypatch.setattr(dispatch_service, "DISPATCH_RING_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(dispatch_service, "DISPATCH_BATCH_SIZE", 3)
+    wheel = RedisTimerWheel(fake_redis)
+    wheel.register(dispatch_service.DISPATCH_WAVE_TIMER, dispatch_service.run_dispatch_waves)
+    monkeypatch.setattr(dispatch_service, "timer_wheel", wheel)
+    ride_id = str(ObjectId())
+    ride = SimpleNamespace(id=ride_id, driverId=None, rideStatus=RideStatus.findingDriver)
+    lookups = []
+
+    async def get_rides(filter_dict, start, stop, fields):
+        lookups.append(filter_dict)
+        return [ride]
+
+    monkeypatch.setattr(dispatch_service, "get_rides", get_rides)
+    driver_ids = await _add_drivers(12)
+
+    # The 1km ring reaches two drivers; the 3km ring adds the next batch of three.
+    assert await dispatch_service.dispatch_ride_request(
+        ride_id, "A", "B", "CAR", 10.0, "r1", pickup_location=PICKUP
+    ) == 2
+    assert await wheel.drain_once() == 1
+    assert await _notified(fake_redis, driver_ids) == driver_ids[:5]
+
+    # A driver coming online inside the rings hears about the ride on the next wave.
+    await sse_service.update_driver_presence(
+        "late", PICKUP[0] + 0.001, PICKUP[1], "CAR", profile_complete=True, account_status="active",
+    )
+    assert await wheel.drain_once() == 1
+    assert await _notified(fake_redis, ["late"]) == ["late"]
+    assert await _notified(fake_redis, driver_ids) == driver_ids[:7]
+
+    # Once a driver takes the ride no further wave runs.
+    ride.rideStatus = RideStatus.arrivingToPickup
+    await dispatch_service.stop_dispatch(ride_id)
+    assert await wheel.drain_once() == 0
+    assert await _notified(fake_redis, driver_ids) == driver_ids[:7]
+    assert len(lookups) == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_timer_handler_fires_again_after_its_lease(fake_redis):
+    wheel = RedisTimerWheel(fake_redis, lease_seconds=0)
+    calls = []
+
+    async def handler(item_ids):
+        calls.append(item_ids)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    wheel.register("job", handler)
+    await wheel.schedule("job", "a", 0)
+    await wheel.schedule("job", "b", 0)
+    await wheel.schedule("job", "later", 60)
+
+    assert await wheel.drain_once() == 2
+    assert await wheel.drain_once() == 2
+    assert await wheel.drain_once() == 0
+    assert [sorted(ids) for ids in calls] == [["a", "b"], ["a", "b"]]
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_payment_keeps_the_dispatch_state_alive(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    monkeypatch.setattr(dispatch_service, "DISPATCH_RING_INTERVAL_SECONDS", 0)
+    wheel = RedisTimerWheel(fake_redis)
+    wheel.register(dispatch_service.DISPATCH_WAVE_TIMER, dispatch_service.run_dispatch_waves)
+    monkeypatch.setattr(dispatch_service, "timer_wheel", wheel)
+    ride_id = str(ObjectId())
+    ride = SimpleNamespace(id=ride_id, driverId=None, rideStatus=RideStatus.pendingPayment)
+
+    async def get_rides(filter_dict, start, stop, fields):
+        return [ride]
+
+    monkeypatch.setattr(dispatch_service, "get_rides", get_rides)
+    await dispatch_service.dispatch_ride_request(ride_id, "A", "B", "CAR", 10.0, "r1", pickup_location=PICKUP)
+    state_key = dispatch_service._dispatch_state_key(ride_id)
+    await fake_redis.expire(state_key, 5)
+
+    assert await wheel.drain_once() == 1
+    assert await fake_redis.ttl(state_key) > 5
+    assert await fake_redis.hget(state_key, "wave") == "0"
@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+
+import pytest
+from googlemaps.convert import encode_polyline
+from pydantic import ValidationError
+
+import services.eta_service as eta_service
+import services.trail_service as trail_service
+from core.geo import route_leg_ends
+from schemas.imports import RideStatus
+from schemas.driver import DriverLocationBatch
+
+
+def test_batch_applies_the_most_recent_fix():
+    batch = DriverLocationBatch(fixes=[
+        {"latitude": 6.50, "longitude": 3.30, "timestamp": 100},
+        {"latitude": 6.52, "longitude": 3.32, "timestamp": 300},
+        {"latitude": 6.51, "longitude": 3.31, "timestamp": 200},
+        {"latitude": 6.53, "longitude": 3.33, "timestamp": 300},
+    ])
+
+    latest = batch.latest()
+    assert (latest.latitude, latest.timestamp) == (6.53, 300)
+
+
+def test_batch_needs_at_least_one_fix():
+    with pytest.raises(ValidationError):
+        DriverLocationBatch(fixes=[])
+
+
+@pytest.mark.asyncio
+async def test_trail_fixes_are_grouped_into_time_buckets(monkeypatch):
+    monkeypatch.setattr(trail_service, "DRIVER_TRAIL_BUCKET_SECONDS", 300)
+    writes = []
+
+    async def append_trail_points(driver_id, ride_id, buckets):
+        writes.append((driver_id, ride_id, dict(buckets)))
+
+    monkeypatch.setattr(trail_service, "append_trail_points", append_trail_points)
+    fixes = DriverLocationBatch(fixes=[
+        {"latitude": 6.50, "longitude": 3.30, "timestamp": 1190},
+        {"latitude": 6.51, "longitude": 3.31, "timestamp": 1210},
+        {"latitude": 6.52, "longitude": 3.32, "timestamp": 1500},
+    ]).fixes
+
+    assert await trail_service.record_trail_fixes("d1", "ride1", fixes) == 3
+    driver_id, ride_id, buckets = writes[0]
+    assert (driver_id, ride_id) == ("d1", "ride1")
+    assert {bucket: [p["timestamp"] for p in points] for bucket, points in buckets.items()} == {
+        900: [1190], 1200: [1210], 1500: [1500],
+    }
+
+
+@pytest.mark.asyncio
+async def test_ride_trail_is_returned_in_time_order(monkeypatch):
+    async def get_trail_points_for_ride(ride_id):
+        return [
+            {"driverId": "d1", "points": [{"latitude": 1, "longitude": 1, "timestamp": 20},
+                                          {"latitude": 0, "longitude": 0, "timestamp": 10}]},
+            {"driverId": "d1", "points": [{"latitude": 2, "longitude": 2, "timestamp": 300}]},
+        ]
+
+    monkeypatch.setattr(trail_service, "get_trail_points_for_ride", get_trail_points_for_ride)
+
+    trail = await trail_service.retrieve_ride_trail("ride1")
+    assert trail.driverId == "d1"
+    assert [point.timestamp for point in trail.points] == [10, 20, 300]
+
+
+KM_NORTH = 1000 / 111_195
+
+
+def _active_ride(status: RideStatus, **fields) -> dict:
+    return {
+        "ride_id": "ride1", "rider_id": "r1", "status": status.value,
+        "pickup_latitude": "6.5", "pickup_longitude": "3.3",
+        # 10km in 20 minutes, ending 10km north of the pickup.
+        "route_distance_m": "10000", "route_duration_s": "1200",
+        "route_legs": f"{6.5 + 10 * KM_NORTH},3.3,10000,1200", "leg": "0",
+        **fields,
+    }
+
+
+def test_eta_uses_the_route_speed_for_both_legs(monkeypatch):
+    monkeypatch.setattr(eta_service, "ETA_ROAD_FACTOR", 1.0)
+    two_km_north = 6.5 + 2 * KM_NORTH
+
+    # 2km at 30km/h to the pickup.
+    assert eta_service.estimate_eta_minutes(
+        _active_ride(RideStatus.arrivingToPickup), two_km_north, 3.3
+    ) == 4
+    # 8km left to the destination.
+    assert eta_service.estimate_eta_minutes(
+        _active_ride(RideStatus.drivingToDestination), two_km_north, 3.3
+    ) == 16
+    assert eta_service.estimate_eta_minutes(
+        _active_ride(RideStatus.completed), two_km_north, 3.3
+    ) is None
+
+
+def test_eta_to_the_destination_follows_the_legs_of_a_multi_stop_route(monkeypatch):
+    monkeypatch.setattr(eta_service, "ETA_ROAD_FACTOR", 1.0)
+    # A stop 4km north (8 minutes), then back to the pickup (10 minutes).
+    ride = _active_ride(
+        RideStatus.drivingToDestination,
+        route_legs=f"{6.5 + 4 * KM_NORTH},3.3,4000,480;6.5,3.3,4000,600",
+    )
+    near_pickup = 6.5 + 0.5 * KM_NORTH
+
+    # Leaving the pickup: 3.5km of the first leg plus the whole second one.
+    assert eta_service.estimate_eta_minutes(ride, near_pickup, 3.3) == 17
+    # Past the stop the driver is on the last leg, even back near the pickup.
+    assert eta_service.current_leg(ride, 6.5 + 4 * KM_NORTH, 3.3) == 1
+    assert eta_service.estimate_eta_minutes({**ride, "leg": "1"}, near_pickup, 3.3) == 1
+
+
+def test_leg_ends_are_located_on_the_route_polyline():
+    points = [(6.5 + n * KM_NORTH, 3.3) for n in range(9)]
+
+    assert route_leg_ends(points, [2900, 5100]) == [points[3], points[8]]
+    assert route_leg_ends(points, [8000]) == [points[8]]
+
+
+@pytest.mark.asyncio
+async def test_eta_pushes_are_throttled(fake_redis, monkeypatch):
+    monkeypatch.setattr(trail_service, "async_redis", fake_redis)
+    monkeypatch.setattr(eta_service, "ETA_PUSH_INTERVAL_SECONDS", 30)
+    pushes = []
+
+    async def publish_ride_status_update(**kwargs):
+        pushes.append((kwargs["rider_id"], kwargs["driver_id"], kwargs["eta_minutes"]))
+
+    monkeypatch.setattr(eta_service, "publish_ride_status_update", publish_ride_status_update)
+    ride = SimpleNamespace(
+        id="ride1", userId="r1", driverId="d1", rideStatus=RideStatus.arrivingToPickup,
+        origin=SimpleNamespace(latitude=6.5, longitude=3.3),
+        map=SimpleNamespace(
+            totalDistanceMeters=10000, totalDurationSeconds=1200, legs=[],
+            encodedPolyline=encode_polyline([(6.5, 3.3), (6.5 + 10 * KM_NORTH, 3.3)]),
+        ),
+    )
+    await trail_service.set_driver_active_ride("d1", ride)
+    legs = eta_service.route_legs(await trail_service.get_driver_active_ride("d1"))
+    assert [(round(lat, 3), round(lng, 3), distance) for lat, lng, distance, _ in legs] == [(6.59, 3.3, 10000)]
+
+    async def ping(latitude, now):
+        active_ride = await trail_service.get_driver_active_ride("d1")
+        return await eta_service.push_eta_if_due("d1", active_ride, latitude, 3.3, now=now)
+
+    assert await ping(6.55, 1000) is not None
+    assert await ping(6.54, 1010) is None  # changed, but too soon
+    assert await ping(6.55, 1040) is None  # unchanged
+    assert await ping(6.52, 1040) is not None
+    assert [rider_id for rider_id, _, _ in pushes] == ["r1", "r1"]
+    assert all(driver_id is None for _, driver_id, _ in pushes)
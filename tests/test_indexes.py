@@ -0,0 +1,71 @@
+import re
+from pathlib import Path
+
+import pytest
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from core.indexes import INDEXES, reconcile_indexes, summarize_unindexed_queries
+
+
+class FakeCollection:
+    def __init__(self, name, created, fail=False):
+        self.name = name
+        self.created = created
+        self.fail = fail
+
+    async def create_indexes(self, indexes):
+        if self.fail:
+            raise OperationFailure("Index already exists with a different name", code=85)
+        names = [index.document["name"] for index in indexes]
+        self.created.setdefault(self.name, []).extend(names)
+        return names
+
+
+class FakeDatabase:
+    def __init__(self, failing=()):
+        self.created = {}
+        self.failing = set(failing)
+
+    def __getitem__(self, name):
+        return FakeCollection(name, self.created, fail=name in self.failing)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_creates_declared_indexes_and_survives_conflicts():
+    database = FakeDatabase(failing={"chats"})
+    indexes = {
+        "rides": [IndexModel([("userId", 1), ("rideStatus", 1)]), IndexModel([("rideStatus", 1), ("last_updated", 1)])],
+        "chats": [IndexModel([("rideId", 1)])],
+    }
+
+    result = await reconcile_indexes(database, indexes)
+
+    assert result == {
+        "rides": ["userId_1_rideStatus_1", "rideStatus_1_last_updated_1"],
+        "chats": [],
+    }
+    assert database.created == {"rides": result["rides"]}
+
+
+def test_unindexed_queries_are_grouped_by_shape():
+    entries = [
+        {"ns": "app.rides", "command": {"find": "rides", "filter": {"userId": "a", "rideStatus": {"$in": ["x"]}}}},
+        {"ns": "app.rides", "command": {"find": "rides", "filter": {"rideStatus": {"$in": ["y"]}, "userId": "b"}}},
+        {"ns": "app.rides", "command": {"q": {"$or": [{"driverId": "d"}, {"userId": "u"}]}}},
+        {"ns": "app.chats", "command": {"aggregate": "chats", "pipeline": [{"$match": {"rideId": "r"}}]}},
+    ]
+
+    assert summarize_unindexed_queries(entries) == [
+        {"namespace": "app.rides", "fields": ["rideStatus", "userId"], "count": 2},
+        {"namespace": "app.rides", "fields": ["driverId", "userId"], "count": 1},
+        {"namespace": "app.chats", "fields": ["rideId"], "count": 1},
+    ]
+
+
+def test_every_repository_collection_is_declared():
+    used = set()
+    for path in Path(__file__).resolve().parent.parent.joinpath("repositories").glob("*.py"):
+        used |= set(re.findall(r"\bdb\.(\w+)\.", path.read_text()))
+
+    assert used and used <= set(INDEXES)
@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import repositories.ride as ride_repo
+from core.pagination import decode_cursor, encode_cursor, keyset_filter, next_cursor
+
+
+def test_cursor_round_trips_and_rejects_garbage():
+    ride_id = ObjectId()
+    cursor = encode_cursor(str(ride_id))
+
+    assert decode_cursor(cursor) == ride_id
+    assert str(ride_id) not in cursor
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor("not-a-cursor")
+    assert excinfo.value.status_code == 400
+
+
+def test_keyset_filter_and_next_cursor():
+    last = ObjectId()
+    cursor = encode_cursor(str(last))
+
+    assert keyset_filter({"userId": "u"}, None) == {"userId": "u"}
+    assert keyset_filter(None, cursor) == {"_id": {"$gt": last}}
+    assert keyset_filter({"userId": "u"}, cursor) == {"$and": [{"userId": "u"}, {"_id": {"$gt": last}}]}
+
+    page = [SimpleNamespace(id=str(ObjectId())), SimpleNamespace(id=str(last))]
+    assert next_cursor(page, 2) == cursor
+    assert next_cursor(page, 3) is None
+
+
+class FakeFind:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def sort(self, *args):
+        self.calls["sort"] = args
+        return self
+
+    def skip(self, skip):
+        self.calls["skip"] = skip
+        return self
+
+    def limit(self, limit):
+        self.calls["limit"] = limit
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+
+@pytest.mark.asyncio
+async def test_get_rides_with_cursor_seeks_instead_of_skipping(monkeypatch):
+    calls = {}
+
+    def find(filter_dict, projection):
+        calls["filter"] = filter_dict
+        return FakeFind(calls)
+
+    monkeypatch.setattr(ride_repo, "db", SimpleNamespace(rides=SimpleNamespace(find=find)))
+    last = ObjectId()
+
+    await ride_repo.get_rides({"driverId": "d"}, start=500, stop=600, cursor=encode_cursor(str(last)))
+
+    assert calls == {
+        "filter": {"$and": [{"driverId": "d"}, {"_id": {"$gt": last}}]},
+        "sort": ("_id", 1),
+        "skip": 0,
+        "limit": 100,
+    }
+
+
+@pytest.mark.asyncio
+async def test_summary_rides_read_only_the_listed_fields(monkeypatch):
+    calls = {}
+    ride_id = ObjectId()
+    doc = {
+        "_id": ride_id,
+        "pickup": "A",
+        "destination": "B",
+        "vehicleType": "CAR",
+        "userId": "u",
+        "rideStatus": "completed",
+        "map": {"totalDistanceMeters": 1200, "totalDurationSeconds": 300},
+    }
+
+    class OneDoc(FakeFind):
+        def __init__(self, calls):
+            super().__init__(calls)
+            self.docs = [doc]
+
+        async def __anext__(self):
+            if not self.docs:
+                raise StopAsyncIteration
+            return self.docs.pop()
+
+    def find(filter_dict, projection):
+        calls["projection"] = projection
+        return OneDoc(calls)
+
+    monkeypatch.setattr(ride_repo, "db", SimpleNamespace(rides=SimpleNamespace(find=find)))
+
+    [ride] = await ride_repo.get_rides({"userId": "u"}, fields="summary")
+
+    assert "stripeEvent" not in calls["projection"] and "map.encodedPolyline" not in calls["projection"]
+    assert calls["projection"]["map.totalDistanceMeters"] == 1
+    assert ride.id == str(ride_id) and ride.map.totalDurationSeconds == 300
+    assert not hasattr(ride, "stripeEvent")
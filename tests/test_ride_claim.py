@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+import services.ride_service as ride_service
+import services.trail_service as trail_service
+from schemas.imports import RideStatus
+
+
+@pytest.mark.asyncio
+async def test_concurrent_accepts_reach_the_database_once(fake_redis, monkeypatch):
+    monkeypatch.setattr(ride_service, "async_redis", fake_redis)
+    monkeypatch.setattr(trail_service, "async_redis", fake_redis)
+    claims = []
+
+    async def claim_ride(ride_id, driver_id, last_updated):
+        claims.append(driver_id)
+        await asyncio.sleep(0)
+        return SimpleNamespace(
+            id=str(ride_id), rideStatus=RideStatus.arrivingToPickup, userId="r1", driverId=driver_id,
+            date_created=None, origin=None, map=None,
+        )
+
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(ride_service, "claim_ride", claim_ride)
+    monkeypatch.setattr(ride_service, "stop_dispatch", noop)
+    monkeypatch.setattr(ride_service, "publish_ride_status_update", noop)
+    ride_id = str(ObjectId())
+
+    results = await asyncio.gather(
+        *(ride_service.accept_ride_for_driver(ride_id, f"d{n}") for n in range(5)),
+        return_exceptions=True,
+    )
+
+    winners = [result for result in results if not isinstance(result, Exception)]
+    losers = [result for result in results if isinstance(result, HTTPException)]
+    assert len(winners) == 1 and len(losers) == 4
+    assert all(loser.status_code == 409 for loser in losers)
+    assert claims == [winners[0].driverId]
+    assert await fake_redis.hget(trail_service._active_ride_key(winners[0].driverId), "ride_id") == ride_id
+
+
+@pytest.mark.asyncio
+async def test_accept_of_a_ride_no_longer_open_releases_the_lock(fake_redis, monkeypatch):
+    monkeypatch.setattr(ride_service, "async_redis", fake_redis)
+
+    async def claim_ride(ride_id, driver_id, last_updated):
+        return None
+
+    monkeypatch.setattr(ride_service, "claim_ride", claim_ride)
+    ride_id = str(ObjectId())
+
+    with pytest.raises(HTTPException) as exc:
+        await ride_service.accept_ride_for_driver(ride_id, "d1")
+    assert exc.value.status_code == 409
+    assert not await fake_redis.exists(ride_service._ride_claim_key(ride_id))
+
+
+@pytest.mark.asyncio
+async def test_failed_claim_releases_the_lock(fake_redis, monkeypatch):
+    monkeypatch.setattr(ride_service, "async_redis", fake_redis)
+
+    async def claim_ride(ride_id, driver_id, last_updated):
+        raise HTTPException(status_code=500, detail="database unavailable")
+
+    monkeypatch.setattr(ride_service, "claim_ride", claim_ride)
+    ride_id = str(ObjectId())
+
+    with pytest.raises(HTTPException) as exc:
+        await ride_service.accept_ride_for_driver(ride_id, "d1")
+    assert exc.value.status_code == 500
+    assert not await fake_redis.exists(ride_service._ride_claim_key(ride_id))
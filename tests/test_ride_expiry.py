@@ -0,0 +1,83 @@
+import time
+
+import pytest
+from bson import ObjectId
+
+import services.ride_service as ride_service
+from core.timer_wheel import RedisTimerWheel
+from schemas.imports import RideStatus
+
+
+@pytest.mark.asyncio
+async def test_sweep_deletes_expired_rides_in_bulk_and_tells_riders(monkeypatch):
+    monkeypatch.setattr(ride_service, "RIDE_EXPIRY_SWEEP_BATCH_SIZE", 2)
+    expired = [
+        {"_id": ObjectId(), "userId": f"r{n}", "driverId": None, "rideStatus": status.value}
+        for n, status in enumerate([RideStatus.findingDriver, RideStatus.findingDriver, RideStatus.pendingPayment])
+    ]
+    finds, deletes, published = [], [], []
+
+    async def find_rides_to_expire(filter_dict, limit):
+        finds.append(filter_dict)
+        batch = expired[:limit]
+        del expired[:limit]
+        return batch
+
+    async def delete_rides(filter_dict):
+        deletes.append(filter_dict)
+        return len(filter_dict["_id"]["$in"])
+
+    async def publish_ride_status_updates(updates):
+        published.extend(updates)
+
+    monkeypatch.setattr(ride_service, "find_rides_to_expire", find_rides_to_expire)
+    monkeypatch.setattr(ride_service, "delete_rides", delete_rides)
+    monkeypatch.setattr(ride_service, "publish_ride_status_updates", publish_ride_status_updates)
+
+    assert await ride_service.sweep_expired_rides() == 3
+    assert len(finds) == 2 and len(deletes) == 2
+    assert deletes[0]["$or"] == finds[0]["$or"]
+    assert [update["rider_id"] for update in published] == ["r0", "r1", "r2"]
+    assert {update["status"] for update in published} == {RideStatus.canceled}
+    assert [update["message"] for update in published] == [
+        ride_service.RIDE_EXPIRY_MESSAGES[RideStatus.findingDriver.value],
+        ride_service.RIDE_EXPIRY_MESSAGES[RideStatus.findingDriver.value],
+        ride_service.RIDE_EXPIRY_MESSAGES[RideStatus.pendingPayment.value],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_expiry_sweep_is_one_recurring_timer(fake_redis, monkeypatch):
+    wheel = RedisTimerWheel(fake_redis)
+    monkeypatch.setattr(ride_service, "timer_wheel", wheel)
+    wheel.register(ride_service.RIDE_EXPIRY_TIMER, ride_service.run_ride_expiry_sweep)
+    sweeps = []
+
+    async def sweep_expired_rides():
+        sweeps.append(time.time())
+        return 0
+
+    monkeypatch.setattr(ride_service, "sweep_expired_rides", sweep_expired_rides)
+
+    # Every worker ensures the timer on startup; there is still only one.
+    for _ in range(3):
+        await ride_service.schedule_ride_expiry_sweep()
+    assert await fake_redis.zcard("timers:due") == 1
+
+    assert await wheel.drain_once() == 1
+    assert await wheel.drain_once() == 0
+    assert len(sweeps) == 1
+    # Rescheduled for the next sweep, and startup does not pull it forward.
+    await ride_service.schedule_ride_expiry_sweep()
+    due = await fake_redis.zscore("timers:due", f"{ride_service.RIDE_EXPIRY_TIMER}:{ride_service.RIDE_EXPIRY_SWEEP_ID}")
+    assert due >= sweeps[0] + ride_service.RIDE_EXPIRY_SWEEP_SECONDS - 1
+
+
+def test_expiry_filter_uses_a_cutoff_per_status():
+    now = int(time.time())
+    pending, finding = ride_service._expired_rides_filter(now)["$or"]
+
+    assert pending["rideStatus"] == RideStatus.pendingPayment.value
+    assert pending["paymentStatus"] is False
+    assert pending["last_updated"] == {"$lt": now - ride_service.RIDE_PENDING_PAYMENT_EXPIRY_SECONDS}
+    assert finding["last_updated"] == {"$lt": now - ride_service.RIDE_FINDING_DRIVER_EXPIRY_SECONDS}
@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks.sse_benchmark import run_benchmark
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_benchmark_harness_delivers_every_event(mode):
+    result = await run_benchmark(subscribers=20, events=40, mode=mode, rate=0, timeout=10)
+
+    assert result.delivered == result.events
+    assert result.latency_ms["p50"] <= result.latency_ms["p99"]
+    assert result.round_trips_per_event > 0
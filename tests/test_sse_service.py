@@ -0,0 +1,536 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import services.sse_service as sse_service
+from schemas.imports import RideStatus
+from schemas.sse import RideRequestEvent, RideStatusUpdate
+
+
+def _frame_data(frame: str) -> dict:
+    for line in frame.splitlines():
+        if line.startswith("data: "):
+            return json.loads(line[len("data: "):])
+    raise AssertionError(f"no data line in {frame!r}")
+
+
+async def _next_event_frame(stream) -> str:
+    async for frame in stream:
+        if not frame.startswith((":", "retry:")):
+            return frame
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_published_event_is_streamed_and_acked(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    payload = RideStatusUpdate(rideId="ride1", status=RideStatus.findingDriver)
+    event = await sse_service.publish_event("rider", "r1", "ride_status_update", payload)
+
+    stream = sse_service.stream_events(fake_request, "rider", "r1")
+    frame = await _next_event_frame(stream)
+    await stream.aclose()
+
+    assert frame.startswith(f"id: {event.id}\nevent: ride_status_update\n")
+    data = _frame_data(frame)
+    assert data["id"] == event.id
+    assert data["data"]["rideId"] == "ride1"
+
+    assert await sse_service.ack_event("rider", "r1", event.id) is True
+    assert await sse_service.ack_event("rider", "r1", event.id) is False
+    assert await sse_service.ack_event("rider", "someone-else", event.id) is False
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_stream_filters_by_ride_id(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    await sse_service.publish_event(
+        "rider", "r1", "ride_status_update",
+        RideStatusUpdate(rideId="other", status=RideStatus.findingDriver),
+    )
+    wanted = await sse_service.publish_event(
+        "rider", "r1", "ride_status_update",
+        RideStatusUpdate(rideId="ride1", status=RideStatus.findingDriver),
+    )
+
+    stream = sse_service.stream_events(fake_request, "rider", "r1", ride_id="ride1")
+    frame = await _next_event_frame(stream)
+    await stream.aclose()
+
+    assert _frame_data(frame)["id"] == wanted.id
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_publish_wakes_idle_stream(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    stream = sse_service.stream_events(fake_request, "driver", "d1")
+    assert await stream.__anext__() == f"retry: {sse_service.CLIENT_RETRY_MS}\n\n"
+    assert await stream.__anext__() == ": keep-alive\n\n"
+
+    pending = asyncio.ensure_future(_next_event_frame(stream))
+    await asyncio.sleep(0.05)
+    event = await sse_service.publish_event("driver", "d1", "chat_message", {"rideId": "ride1"})
+    frame = await asyncio.wait_for(pending, timeout=sse_service.RETRY_AFTER_SECONDS / 2)
+    await stream.aclose()
+
+    assert _frame_data(frame)["id"] == event.id
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_idle_stream_only_polls_redis_while_events_are_unacked(fake_redis, fake_request, monkeypatch, mode):
+    polls = []
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    monkeypatch.setattr(sse_service, "RETRY_AFTER_SECONDS", 0.02)
+    monkeypatch.setattr(sse_service.sse_backlog, "observe", polls.append)
+    stream = sse_service.stream_events(fake_request, "driver", "d1")
+    await stream.__anext__()
+    await stream.__anext__()
+    await stream.__anext__()
+    settled = len(polls)
+
+    for _ in range(4):
+        assert await stream.__anext__() == ": keep-alive\n\n"
+    assert len(polls) == settled
+
+    pending = asyncio.ensure_future(_next_event_frame(stream))
+    await asyncio.sleep(0.01)
+    await sse_service.publish_event("driver", "d1", "chat_message", {"rideId": "ride1"})
+    await asyncio.wait_for(pending, timeout=1)
+    for _ in range(3):
+        await stream.__anext__()
+    await stream.aclose()
+
+    assert len(polls) >= settled + 3
+
+
+@pytest.mark.asyncio
+async def test_filtered_stream_skips_other_traffic_without_polling(fake_redis, fake_request, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "stream")
+    monkeypatch.setattr(sse_service, "RETRY_AFTER_SECONDS", 0.02)
+    await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride2"})
+    reads = []
+    xrange = fake_redis.xrange
+
+    async def counting_xrange(*args, **kwargs):
+        reads.append(args)
+        return await xrange(*args, **kwargs)
+
+    monkeypatch.setattr(fake_redis, "xrange", counting_xrange)
+    stream = sse_service.stream_events(fake_request, "rider", "r1", ride_id="ride1")
+    await stream.__anext__()
+    await stream.__anext__()
+    await stream.__anext__()
+    settled = len(reads)
+
+    for _ in range(4):
+        assert await stream.__anext__() == ": keep-alive\n\n"
+    assert len(reads) == settled
+
+    pending = asyncio.ensure_future(_next_event_frame(stream))
+    await asyncio.sleep(0.01)
+    await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride2"})
+    wanted = await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1"})
+    frame = await asyncio.wait_for(pending, timeout=1)
+    await stream.aclose()
+
+    assert _frame_data(frame)["id"] == wanted.id
+    # Nothing was read through the group, so an unfiltered tab gets all three.
+    stream_key = sse_service._stream_key("rider", "r1")
+    assert not any(group["pending"] for group in await fake_redis.xinfo_groups(stream_key))
+
+
+@pytest.mark.asyncio
+async def test_list_mode_backlog_is_batched_and_stale_ids_dropped(fake_redis, fake_request, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    published = [
+        await sse_service.publish_event("driver", "d1", "chat_message", {"rideId": "ride1", "n": n})
+        for n in range(50)
+    ]
+    await fake_redis.delete(sse_service._event_key(published[0].id))
+
+    stream = sse_service.stream_events(fake_request, "driver", "d1")
+    frames = [await _next_event_frame(stream) for _ in range(49)]
+    await stream.aclose()
+
+    assert [_frame_data(frame)["id"] for frame in frames] == [event.id for event in published[1:]]
+    pending = await fake_redis.lrange(sse_service._pending_key("driver", "d1"), 0, -1)
+    assert published[0].id not in pending
+    assert len(pending) == 49
+
+
+@pytest.mark.asyncio
+async def test_list_mode_event_is_claimed_by_one_tab_per_interval(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    event = await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1"})
+    scan_keys = [sse_service._pending_key("rider", "r1")]
+    now = 1_000_000
+
+    claims = await asyncio.gather(
+        sse_service._claim_due_events(scan_keys, "rider", "r1", now, None, None),
+        sse_service._claim_due_events(scan_keys, "rider", "r1", now, None, None),
+    )
+    frames = [frame for _, _, batch in claims for frame in batch]
+    assert [_frame_data(frame)["id"] for frame in frames] == [event.id]
+
+    _, _, redelivered = await sse_service._claim_due_events(
+        scan_keys, "rider", "r1", now + sse_service.RETRY_AFTER_SECONDS, None, None
+    )
+    assert len(redelivered) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_stream_resumes_after_last_event_id(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    published = [
+        await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1", "n": n})
+        for n in range(3)
+    ]
+
+    stream = sse_service.stream_events(
+        fake_request, "rider", "r1", last_event_id=published[1].id
+    )
+    frame = await _next_event_frame(stream)
+    await stream.aclose()
+
+    assert _frame_data(frame)["id"] == published[2].id
+    # The skipped events are acknowledged, so only the delivered one is pending.
+    if mode == "stream":
+        stream_key = sse_service._stream_key("rider", "r1")
+        assert [entry_id for entry_id, _ in await fake_redis.xrange(stream_key)] == [published[2].id]
+    else:
+        assert await fake_redis.lrange(sse_service._pending_key("rider", "r1"), 0, -1) == [published[2].id]
+        assert not await fake_redis.exists(sse_service._event_key(published[0].id))
+
+
+@pytest.mark.asyncio
+async def test_list_resume_goes_by_queue_position_not_id_order(fake_redis, fake_request, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    # The second event's id was made on a host whose clock runs behind.
+    ids = iter([f"{2000:020d}-aaaaaaaa", f"{1000:020d}-bbbbbbbb"])
+    monkeypatch.setattr(sse_service, "_new_event_id", lambda: next(ids))
+    first = await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1"})
+    second = await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1"})
+
+    stream = sse_service.stream_events(fake_request, "rider", "r1", last_event_id=first.id)
+    frame = await _next_event_frame(stream)
+    await stream.aclose()
+
+    assert _frame_data(frame)["id"] == second.id
+    assert await fake_redis.lrange(sse_service._pending_key("rider", "r1"), 0, -1) == [second.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_large_frames_are_stored_compressed(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    message = "x" * (sse_service.COMPRESS_MIN_BYTES * 2)
+    event = await sse_service.publish_event("rider", "r1", "chat_message", {"message": message})
+
+    if mode == "list":
+        stored = await fake_redis.hgetall(sse_service._event_key(event.id))
+    else:
+        [(_, stored)] = await fake_redis.xrange(sse_service._stream_key("rider", "r1"))
+    assert stored["encoding"] == "zlib"
+    assert len(stored["frame"]) < len(message)
+
+    stream = sse_service.stream_events(fake_request, "rider", "r1")
+    frame = await _next_event_frame(stream)
+    await stream.aclose()
+
+    assert frame.startswith(f"id: {event.id}\nevent: chat_message\n")
+    data = _frame_data(frame)
+    assert data["id"] == event.id
+    assert data["data"]["message"] == message
+
+
+@pytest.mark.asyncio
+async def test_list_mode_filtered_stream_scans_only_its_index(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    for n in range(20):
+        await sse_service.publish_event("driver", "d1", "ride_request", {"rideId": f"other{n}"})
+    chat = await sse_service.publish_event("driver", "d1", "chat_message", {"rideId": "ride1"})
+    status = await sse_service.publish_event(
+        "driver", "d1", "ride_status_update", {"rideId": "ride1", "status": "arrived"}
+    )
+
+    scan_keys = sse_service._pending_scan_keys("driver", "d1", {"chat_message"}, None)
+    scanned, _, frames = await sse_service._claim_due_events(
+        scan_keys, "driver", "d1", 1_000_000, {"chat_message"}, None
+    )
+    assert scanned == 1
+    assert [_frame_data(frame)["id"] for frame in frames] == [chat.id]
+
+    types = {"chat_message", "ride_status_update"}
+    scan_keys = sse_service._pending_scan_keys("driver", "d1", types, None)
+    scanned, _, frames = await sse_service._claim_due_events(
+        scan_keys, "driver", "d1", 2_000_000, types, None
+    )
+    assert scanned == 2
+    assert [_frame_data(frame)["id"] for frame in frames] == [chat.id, status.id]
+
+    assert await sse_service.ack_event("driver", "d1", chat.id) is True
+    assert await fake_redis.exists(
+        sse_service._pending_type_key("driver", "d1", "chat_message"),
+        sse_service._pending_ride_key("driver", "d1", "ride1"),
+    ) == 1
+    assert await fake_redis.lrange(sse_service._pending_ride_key("driver", "d1", "ride1"), 0, -1) == [status.id]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_superseded_ride_status_updates_are_coalesced(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+    for status in (RideStatus.findingDriver, RideStatus.arrivingToPickup):
+        await sse_service.publish_event(
+            "rider", "r1", "ride_status_update", RideStatusUpdate(rideId="ride1", status=status)
+        )
+    chat = await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1"})
+    latest = await sse_service.publish_event(
+        "rider", "r1", "ride_status_update",
+        RideStatusUpdate(rideId="ride1", status=RideStatus.drivingToDestination),
+    )
+
+    stream = sse_service.stream_events(fake_request, "rider", "r1")
+    frames = [await _next_event_frame(stream) for _ in range(2)]
+    await stream.aclose()
+
+    assert [_frame_data(frame)["id"] for frame in frames] == [chat.id, latest.id]
+
+
+@pytest.mark.asyncio
+async def test_list_mode_backlog_is_capped(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    monkeypatch.setattr(sse_service, "MAX_BACKLOG", 3)
+    published = [
+        await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1", "n": n})
+        for n in range(5)
+    ]
+
+    pending = await fake_redis.lrange(sse_service._pending_key("rider", "r1"), 0, -1)
+    assert pending == [event.id for event in published[2:]]
+    ride_index = await fake_redis.lrange(sse_service._pending_ride_key("rider", "r1", "ride1"), 0, -1)
+    assert ride_index == pending
+    assert not await fake_redis.exists(sse_service._event_key(published[0].id))
+
+
+@pytest.mark.asyncio
+async def test_new_driver_stream_closes_the_old_one(fake_redis, fake_request):
+    await sse_service.update_driver_presence(
+        "d1", 6.5, 3.3, "CAR", profile_complete=True, account_status="active"
+    )
+    old = sse_service.stream_events(fake_request, "driver", "d1")
+    assert (await old.__anext__()).startswith("retry:")
+    assert await old.__anext__() == ": keep-alive\n\n"
+
+    async def drain(stream):
+        return [frame async for frame in stream]
+
+    closed = asyncio.ensure_future(drain(old))
+    await asyncio.sleep(0.05)
+    new = sse_service.stream_events(fake_request, "driver", "d1")
+    assert (await new.__anext__()).startswith("retry:")
+
+    await asyncio.wait_for(closed, timeout=sse_service.RETRY_AFTER_SECONDS / 2)
+    session_id = await fake_redis.get(sse_service._active_session_key("driver", "d1"))
+    # Only the stream holding the session takes the driver offline.
+    assert await fake_redis.zscore(sse_service.DRIVER_GEO_INDEX, "d1") is not None
+    await new.aclose()
+
+    assert session_id is not None
+    assert not await fake_redis.exists(sse_service._active_session_key("driver", "d1"))
+    assert await fake_redis.zscore(sse_service.DRIVER_GEO_INDEX, "d1") is None
+    assert await fake_redis.zscore(sse_service.DRIVER_LAST_SEEN_INDEX, "d1") is None
+
+
+@pytest.mark.asyncio
+async def test_ride_request_reaches_only_eligible_drivers(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "list")
+    pickup = (6.5244, 3.3792)
+    nearby = (6.5250, 3.3800)
+
+    async def add_driver(driver_id, location=nearby, vehicle="CAR", complete=True, status="active", seen=None):
+        await sse_service.update_driver_presence(
+            driver_id, location[0], location[1], vehicle,
+            profile_complete=complete, timestamp=seen, account_status=status,
+        )
+
+    await add_driver("eligible")
+    await add_driver("also-eligible", vehicle="VehicleType.CAR")
+    await add_driver("far", location=(7.5, 4.5))
+    await add_driver("bike", vehicle="MOTOR_BIKE")
+    await add_driver("incomplete", complete=False)
+    await add_driver("suspended", status="suspended")
+    await add_driver("stale", seen=int(time.time()) - sse_service.DRIVER_META_TTL_SECONDS - 10)
+
+    payload = RideRequestEvent(
+        rideId="ride1", pickup="A", destination="B", vehicleType="car",
+        fareEstimate=10.0, riderId="r1",
+    )
+    count = await sse_service.publish_ride_request_to_drivers(payload, pickup_location=pickup)
+
+    assert count == 2
+    notified = {
+        driver_id
+        for driver_id in ("eligible", "also-eligible", "far", "bike", "incomplete", "suspended", "stale")
+        if await fake_redis.llen(sse_service._pending_key("driver", driver_id))
+    }
+    assert notified == {"eligible", "also-eligible"}
+
+
+@pytest.mark.asyncio
+async def test_driver_moves_between_geo_shards(fake_redis):
+    eligible_car = sse_service._driver_geo_shard_key("CAR", True)
+    ineligible_car = sse_service._driver_geo_shard_key("CAR", False)
+
+    await sse_service.update_driver_presence(
+        "d1", 6.5, 3.3, "CAR", profile_complete=True, account_status="active"
+    )
+    assert await fake_redis.zscore(eligible_car, "d1") is not None
+    assert await fake_redis.zscore(sse_service.DRIVER_GEO_INDEX, "d1") is not None
+    assert (await sse_service.get_driver_presence("d1"))["geo_shard"] == eligible_car
+
+    await sse_service.sync_driver_presence_status("d1", account_status="suspended")
+    assert await fake_redis.zscore(eligible_car, "d1") is None
+    assert await fake_redis.zscore(ineligible_car, "d1") is not None
+    assert (await sse_service.get_driver_presence("d1"))["geo_shard"] == ineligible_car
+
+    await sse_service.sync_driver_presence_status(
+        "d1", account_status="active", vehicle_type="MOTOR_BIKE"
+    )
+    members = {
+        key: await fake_redis.zrange(key, 0, -1) for key in sse_service._driver_geo_shard_keys()
+    }
+    assert {key for key, ids in members.items() if ids} == {
+        sse_service._driver_geo_shard_key("MOTOR_BIKE", True)
+    }
+
+
+@pytest.mark.asyncio
+async def test_sweeper_removes_only_stale_drivers(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "DRIVER_SWEEP_BATCH_SIZE", 2)
+    stale_at = int(time.time()) - sse_service.DRIVER_META_TTL_SECONDS - 10
+    for n in range(5):
+        await sse_service.update_driver_presence(
+            f"old{n}", 6.5, 3.3, "CAR", profile_complete=True, account_status="active", timestamp=stale_at
+        )
+    await sse_service.update_driver_presence(
+        "fresh", 6.5, 3.3, "CAR", profile_complete=True, account_status="active"
+    )
+
+    assert await sse_service.cleanup_stale_driver_locations() == 5
+
+    geo_keys = [sse_service.DRIVER_GEO_INDEX, sse_service.DRIVER_LAST_SEEN_INDEX, *sse_service._driver_geo_shard_keys()]
+    assert {member for key in geo_keys for member in await fake_redis.zrange(key, 0, -1)} == {"fresh"}
+    assert not await sse_service.get_driver_presence("old0")
+    assert await sse_service.get_driver_presence("fresh")
+
+
+
+@pytest.mark.asyncio
+async def test_sweeper_removes_geo_members_without_a_last_seen_entry(fake_redis, monkeypatch):
+    monkeypatch.setattr(sse_service, "DRIVER_SWEEP_BATCH_SIZE", 2)
+    for driver_id in ("phantom0", "phantom1", "phantom2", "online"):
+        await sse_service.update_driver_presence(
+            driver_id, 6.5, 3.3, "CAR", profile_complete=True, account_status="active"
+        )
+        await fake_redis.zrem(sse_service.DRIVER_LAST_SEEN_INDEX, driver_id)
+    for n in range(3):
+        await sse_service.delete_driver_presence(f"phantom{n}")
+
+    removed = 0
+    for _ in range(4):
+        removed += await sse_service.cleanup_stale_driver_locations()
+
+    assert removed == 3
+    assert await fake_redis.zrange(sse_service.DRIVER_GEO_INDEX, 0, -1) == ["online"]
+    assert await fake_redis.zscore(sse_service.DRIVER_LAST_SEEN_INDEX, "online") is not None
+
+
+@pytest.mark.asyncio
+async def test_driver_profile_is_cached_in_presence(fake_redis):
+    now = int(time.time())
+    await sse_service.update_driver_presence(
+        "d1", 6.5, 3.3, "VehicleType.CAR", profile_complete=True, account_status="active",
+        timestamp=now, profile_checked_at=now,
+    )
+    presence = await sse_service.get_driver_presence("d1")
+
+    assert sse_service.cached_driver_profile(presence, now) == {
+        "account_status": "active",
+        "profile_complete": True,
+        "vehicle_type": "CAR",
+        "profile_checked_at": now,
+    }
+    assert sse_service.cached_driver_profile(presence, now + sse_service.DRIVER_PROFILE_CACHE_SECONDS) is None
+
+    # Status changes keep the cache current.
+    await sse_service.sync_driver_presence_status("d1", account_status="suspended")
+    presence = await sse_service.get_driver_presence("d1")
+    assert sse_service.cached_driver_profile(presence, now)["account_status"] == "suspended"
+
+
+def test_small_moves_are_redundant_until_the_interval_passes():
+    presence = {"latitude": "6.5", "longitude": "3.3", "last_seen": "1000"}
+    nearby = 6.5 + 0.00005  # about 5.5 metres north
+    interval = sse_service.DRIVER_LOCATION_MIN_INTERVAL_SECONDS
+
+    assert sse_service.driver_location_is_redundant(presence, nearby, 3.3, 1001)
+    assert not sse_service.driver_location_is_redundant(presence, nearby, 3.3, 1000 + interval)
+    assert not sse_service.driver_location_is_redundant(presence, 6.501, 3.3, 1001)
+    assert not sse_service.driver_location_is_redundant({}, nearby, 3.3, 1001)
+
+
+def test_fixes_not_newer_than_the_stored_one_are_stale():
+    presence = {"latitude": "6.5", "longitude": "3.3", "last_seen": "1000"}
+
+    assert sse_service.driver_location_is_stale(presence, 900, now=2000)
+    assert sse_service.driver_location_is_stale(presence, 1000, now=2000)
+    assert not sse_service.driver_location_is_stale(presence, 1001, now=2000)
+    assert not sse_service.driver_location_is_stale({}, 900, now=2000)
+    # A last_seen from a clock running ahead does not block real pings.
+    assert not sse_service.driver_location_is_stale(presence, 900, now=950)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["list", "stream"])
+async def test_batched_status_updates_reach_every_rider(fake_redis, fake_request, monkeypatch, mode):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", mode)
+
+    assert await sse_service.publish_ride_status_updates(
+        {"ride_id": f"ride{n}", "status": RideStatus.canceled, "rider_id": f"r{n}", "driver_id": None}
+        for n in range(3)
+    ) == 3
+
+    for n in range(3):
+        stream = sse_service.stream_events(fake_request, "rider", f"r{n}")
+        data = _frame_data(await _next_event_frame(stream))
+        await stream.aclose()
+        assert data["event"] == "ride_status_update"
+        assert data["data"]["rideId"] == f"ride{n}"
+
+
+@pytest.mark.asyncio
+async def test_stream_mode_redelivers_every_page_of_idle_entries(fake_redis, fake_request, monkeypatch):
+    monkeypatch.setattr(sse_service, "SSE_DELIVERY_MODE", "stream")
+    monkeypatch.setattr(sse_service, "STREAM_READ_COUNT", 2)
+    monkeypatch.setattr(sse_service, "RETRY_AFTER_SECONDS", 0)
+    published = [
+        await sse_service.publish_event("rider", "r1", "chat_message", {"rideId": "ride1", "n": n})
+        for n in range(5)
+    ]
+    # Delivered once and never acknowledged, so all five sit in the pending list.
+    stream_key = sse_service._stream_key("rider", "r1")
+    await sse_service._ensure_stream_group(stream_key)
+    await fake_redis.xreadgroup(sse_service.STREAM_GROUP, sse_service.STREAM_CONSUMER, {stream_key: ">"})
+
+    stream = sse_service.stream_events(fake_request, "rider", "r1")
+    frames = [await _next_event_frame(stream) for _ in range(5)]
+    await stream.aclose()
+
+    assert [_frame_data(frame)["id"] for frame in frames] == [event.id for event in published]